@@ -0,0 +1,41 @@
+// Request body parsing shared by functions that accept large JSON bodies.
+// Purpose: the import scripts send bulk upserts gzip-compressed (Content-Encoding: gzip) to stay well
+// under the Functions request payload limit; Netlify hands such binary bodies over base64-encoded.
+
+const zlib = require("zlib");
+
+// Cap on the decompressed size (a few MB of gzip could otherwise inflate to gigabytes).
+const MAX_INFLATED_BYTES = 64 * 1024 * 1024;
+
+function bodyError(statusCode, message) {
+  const err = new Error(message);
+  err.statusCode = statusCode;
+  return err;
+}
+
+function readBodyText(event) {
+  // Returns the request body as text, decompressing gzip bodies.
+  const raw = event.body || "";
+  const encoding = String(event.headers?.["content-encoding"] || "")
+    .trim()
+    .toLowerCase();
+  // Not base64: something upstream (e.g. the local Express server) already decoded the body.
+  if (!event.isBase64Encoded) return raw;
+  const buf = Buffer.from(raw, "base64");
+  if (!encoding || encoding === "identity") return buf.toString("utf8");
+  if (encoding !== "gzip") throw bodyError(415, `Unsupported content-encoding: ${encoding} (use gzip or none)`);
+  try {
+    return zlib.gunzipSync(buf, { maxOutputLength: MAX_INFLATED_BYTES }).toString("utf8");
+  } catch (err) {
+    if (err?.code === "ERR_BUFFER_TOO_LARGE") {
+      throw bodyError(413, `Decompressed body exceeds ${MAX_INFLATED_BYTES} bytes`);
+    }
+    throw bodyError(400, `Invalid gzip body: ${String(err?.message || err)}`);
+  }
+}
+
+function parseJsonBody(event) {
+  return JSON.parse(readBodyText(event) || "{}");
+}
+
+module.exports = { parseJsonBody, readBodyText, MAX_INFLATED_BYTES };
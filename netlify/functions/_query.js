@@ -0,0 +1,39 @@
+// Query-string and response helpers shared by the listing/export functions (pages, pages-export, embeddings).
+// Purpose: one definition of ids, keyset cursors and limits, so the endpoints can't drift apart.
+
+const UUID_RE = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+const CURSOR_TS_RE = /^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}:?\d{2})?$/;
+
+function json(statusCode, obj) {
+  return {
+    statusCode,
+    headers: { "content-type": "application/json" },
+    body: JSON.stringify(obj),
+  };
+}
+
+function parseLimit(raw, { fallback, max }) {
+  const n = Number(raw);
+  if (!Number.isFinite(n) || n <= 0) return fallback;
+  return Math.min(max, Math.floor(n));
+}
+
+function parseKeysetCursor(raw) {
+  // Keyset cursor: "<timestamp>,<id>" of the last row already seen -> { ts, id }, or null if malformed.
+  const s = String(raw || "").trim();
+  const comma = s.lastIndexOf(",");
+  if (comma <= 0) return null;
+  // Tolerate an unencoded "+" in the UTC offset (query parsers decode it to a space).
+  const ts = s.slice(0, comma).trim().replace(/ (?=\d{2}:?\d{2}$)/, "+");
+  const id = s.slice(comma + 1).trim();
+  if (!CURSOR_TS_RE.test(ts) || !UUID_RE.test(id)) return null;
+  return { ts, id };
+}
+
+function totalFromContentRange(headers) {
+  // PostgREST count=exact: content-range looks like "0-0/1234" (or "*/0" when empty).
+  const range = String(headers?.["content-range"] || "");
+  return Number(range.split("/")[1] || "0") || 0;
+}
+
+module.exports = { UUID_RE, CURSOR_TS_RE, json, parseLimit, parseKeysetCursor, totalFromContentRange };
@@ -34,6 +34,8 @@ exports.handler = async (event) => {
     const reqIds = Array.isArray(body?.ids) ? body.ids.map(String) : [];
     const uuidRe = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
     const safeIds = reqIds.filter((id) => uuidRe.test(id)).slice(0, limit);
+    // force: re-embed the given ids even if they already have an embedding (bulk updates keep the old vector).
+    const force = body?.force === true && safeIds.length > 0;
 
     let rows = [];
     if (safeIds.length) {
@@ -43,7 +45,7 @@ exports.handler = async (event) => {
         query:
           `?select=id,content_md` +
           `&id=in.(${inList})` +
-          `&embedding=is.null` +
+          (force ? "" : `&embedding=is.null`) +
           `&limit=${encodeURIComponent(safeIds.length)}`,
       });
     } else {
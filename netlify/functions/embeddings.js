@@ -0,0 +1,74 @@
+// GET /api/embeddings
+// Purpose: incremental export of page embeddings for offline/local vector indexes (admin-only).
+// - ?since=<embedding_updated_at>,<id>  rows embedded after that cursor (oldest first), with their vectors
+// - ?stats=1                            { count, max_embedding_updated_at } over pages that have an embedding
+// - ?ids_only=1[&after=<id>]            ids of all embedded pages (id order), so clients can drop deleted pages
+
+const { requireAdmin } = require("./_auth");
+const { supabaseRequest, supabaseRequestMeta } = require("./_supabase");
+const { json, parseLimit, parseKeysetCursor, totalFromContentRange, UUID_RE } = require("./_query");
+
+exports.handler = async (event) => {
+  const auth = requireAdmin(event);
+  if (!auth.ok) return auth.response;
+
+  if (event.httpMethod !== "GET") return { statusCode: 405, body: "Method Not Allowed" };
+
+  try {
+    const qs = event.queryStringParameters || {};
+
+    if (String(qs.stats || "").trim() === "1") {
+      const meta = await supabaseRequestMeta("pages", {
+        method: "GET",
+        query: "?select=embedding_updated_at&embedding=not.is.null&order=embedding_updated_at.desc.nullslast&limit=1",
+        returnRepresentation: true,
+        count: "exact",
+      });
+      return json(200, {
+        count: totalFromContentRange(meta.headers),
+        max_embedding_updated_at: meta.data?.[0]?.embedding_updated_at || null,
+      });
+    }
+
+    if (String(qs.ids_only || "").trim() === "1") {
+      // Purpose: cheap reconciliation of deletions (36 bytes per page, no vectors).
+      const limit = parseLimit(qs.limit, { fallback: 1000, max: 1000 });
+      const after = String(qs.after || "").trim();
+      if (after && !UUID_RE.test(after)) return { statusCode: 400, body: "after must be a page id" };
+      const rows = await supabaseRequest("pages", {
+        query:
+          `?select=id&embedding=not.is.null&order=id.asc&limit=${limit}` + (after ? `&id=gt.${after}` : ""),
+      });
+      const ids = (rows || []).map((r) => r.id);
+      return json(200, { ids, next_cursor: ids.length ? ids[ids.length - 1] : null });
+    }
+
+    // Vectors are ~9 KB each as pgvector text; keep responses well under the 6 MB function limit.
+    const limit = parseLimit(qs.limit, { fallback: 200, max: 500 });
+    const filters = ["embedding=not.is.null"];
+    if (qs.since !== undefined) {
+      const cursor = parseKeysetCursor(qs.since);
+      if (!cursor) return { statusCode: 400, body: "since must be <embedding_updated_at>,<id> from a previous next_cursor" };
+      const ts = `"${cursor.ts}"`;
+      filters.push(
+        `or=${encodeURIComponent(
+          `(embedding_updated_at.gt.${ts},and(embedding_updated_at.eq.${ts},id.gt.${cursor.id}))`
+        )}`
+      );
+    }
+
+    const rows = await supabaseRequest("pages", {
+      query:
+        "?select=id,created_at,updated_at,title,tags,embedding_model,embedding_updated_at,embedding" +
+        "&order=embedding_updated_at.asc,id.asc" +
+        `&limit=${limit}` +
+        `&${filters.join("&")}`,
+    });
+
+    const last = Array.isArray(rows) && rows.length ? rows[rows.length - 1] : null;
+    const nextCursor = last?.embedding_updated_at && last?.id ? `${last.embedding_updated_at},${last.id}` : null;
+    return json(200, { pages: rows || [], next_cursor: nextCursor });
+  } catch (err) {
+    return json(500, { error: String(err?.message || err) });
+  }
+};
@@ -0,0 +1,82 @@
+// POST /api/pages-diff
+// Purpose: let import scripts ask "which of these source records changed?" without downloading every page.
+// Body: { kv_key, kv_value, key_field, hash_field, items: [ {key, hash, id?} ] }
+// Reply: { changed: [ {key, id, hash} ], duplicates: [key] }
+// - changed: keys with no page (id null), a different stored hash, or (if the caller sent an id) another page id
+// - duplicates: keys held by more than one page (the newest page is the one reported / compared)
+
+const { requireAdmin } = require("./_auth");
+const { supabaseRequest } = require("./_supabase");
+const { parseJsonBody } = require("./_body");
+
+// <= the PostgREST row cap (1000): on a first import every item comes back as changed.
+const MAX_ITEMS = 1000;
+const FIELD_RE = /^[A-Za-z0-9_]{1,100}$/;
+
+exports.handler = async (event) => {
+  const auth = requireAdmin(event);
+  if (!auth.ok) return auth.response;
+
+  if (event.httpMethod !== "POST") {
+    return { statusCode: 405, body: "Method Not Allowed" };
+  }
+
+  try {
+    // May be gzip-compressed (import scripts), see _body.js.
+    const body = parseJsonBody(event);
+    const kvKey = String(body.kv_key || "").trim();
+    const keyField = String(body.key_field || "").trim();
+    const hashField = String(body.hash_field || "").trim();
+    if (!kvKey || body.kv_value === undefined) return { statusCode: 400, body: "kv_key and kv_value are required" };
+    if (!FIELD_RE.test(keyField) || !FIELD_RE.test(hashField)) {
+      return { statusCode: 400, body: "key_field and hash_field must be kv_tags keys ([A-Za-z0-9_])" };
+    }
+    if (!Array.isArray(body.items)) return { statusCode: 400, body: "items must be an array of {key, hash}" };
+    if (body.items.length > MAX_ITEMS) return { statusCode: 400, body: `items: max ${MAX_ITEMS} per request` };
+
+    const items = new Map();
+    for (const it of body.items) {
+      const key = typeof it?.key === "string" ? it.key : "";
+      if (!key) return { statusCode: 400, body: "every item needs a non-empty string key" };
+      items.set(key, { key, hash: String(it?.hash ?? ""), id: it?.id ? String(it.id) : "" });
+    }
+    if (!items.size) {
+      return {
+        statusCode: 200,
+        headers: { "content-type": "application/json" },
+        body: JSON.stringify({ changed: [], duplicates: [] }),
+      };
+    }
+
+    // One round trip: the RPC looks every key up through the kv_tags GIN index (see supabase/schema.sql).
+    const rows = await supabaseRequest("rpc/diff_page_hashes", {
+      method: "POST",
+      body: {
+        source: { [kvKey]: body.kv_value },
+        key_field: keyField,
+        hash_field: hashField,
+        items: Array.from(items.values()),
+      },
+    });
+
+    const changed = [];
+    const duplicates = [];
+    for (const r of rows || []) {
+      const want = items.get(r.key);
+      if (!want) continue;
+      if (Number(r.copies) > 1) duplicates.push(r.key);
+      const id = r.id || null;
+      if (!id || String(r.hash || "") !== want.hash || (want.id && id !== want.id)) {
+        changed.push({ key: r.key, id, hash: id ? String(r.hash || "") : null });
+      }
+    }
+
+    return {
+      statusCode: 200,
+      headers: { "content-type": "application/json" },
+      body: JSON.stringify({ changed, duplicates }),
+    };
+  } catch (err) {
+    return { statusCode: err?.statusCode || 500, body: String(err?.message || err) };
+  }
+};
@@ -0,0 +1,115 @@
+// GET /api/pages-export
+// Purpose: backups / migrations (scripts/pages_archive.py): every page column except the embedding, admin-only.
+// - ?since=<updated_at>,<id>   rows updated after that cursor (oldest first); omit for everything
+// - ?shard=<i>/<n>             only ids in the i-th of n equal uuid ranges, so several cursors can run at once
+// - ?stats=1                   { count, max_updated_at } (of the shard, if given)
+// - ?ids_only=1[&after=<id>]   ids in id order (restores drop pages deleted since the last full backup)
+// Pages are ordered by (updated_at, id): a page edited while an export runs moves behind the cursor and is
+// read again, never skipped.
+
+const { requireAdmin } = require("./_auth");
+const { supabaseRequest, supabaseRequestMeta } = require("./_supabase");
+const { json, parseLimit, parseKeysetCursor, totalFromContentRange, UUID_RE } = require("./_query");
+
+const COLUMNS = "id,created_at,updated_at,thread_id,next_page_id,title,tags,kv_tags,content_md";
+const MAX_SHARDS = 256;
+// Netlify Functions responses are capped at 6 MB: stop adding rows past this much JSON (at least one row).
+const MAX_RESPONSE_BYTES = 4.5 * 1024 * 1024;
+
+function uuidAt(n) {
+  const h = n.toString(16).padStart(32, "0");
+  return `${h.slice(0, 8)}-${h.slice(8, 12)}-${h.slice(12, 16)}-${h.slice(16, 20)}-${h.slice(20)}`;
+}
+
+function parseShard(raw) {
+  // "i/n" -> PostgREST filters for [i * 2^128 / n, (i + 1) * 2^128 / n) (uuids compare like their hex).
+  const m = /^(\d{1,3})\/(\d{1,3})$/.exec(String(raw || "").trim());
+  if (!m) return null;
+  const i = Number(m[1]);
+  const n = Number(m[2]);
+  if (n < 1 || n > MAX_SHARDS || i >= n) return null;
+  const space = 1n << 128n;
+  const filters = [];
+  if (i > 0) filters.push(`id=gte.${uuidAt((space * BigInt(i)) / BigInt(n))}`);
+  if (i < n - 1) filters.push(`id=lt.${uuidAt((space * BigInt(i + 1)) / BigInt(n))}`);
+  return filters;
+}
+
+exports.handler = async (event) => {
+  const auth = requireAdmin(event);
+  if (!auth.ok) return auth.response;
+
+  if (event.httpMethod !== "GET") return { statusCode: 405, body: "Method Not Allowed" };
+
+  try {
+    const qs = event.queryStringParameters || {};
+    const filters = [];
+    if (qs.shard !== undefined) {
+      const shard = parseShard(qs.shard);
+      if (!shard) return { statusCode: 400, body: `shard must be <i>/<n> with 0 <= i < n <= ${MAX_SHARDS}` };
+      filters.push(...shard);
+    }
+
+    if (String(qs.stats || "").trim() === "1") {
+      const meta = await supabaseRequestMeta("pages", {
+        method: "GET",
+        query: "?select=updated_at&order=updated_at.desc&limit=1" + (filters.length ? `&${filters.join("&")}` : ""),
+        returnRepresentation: true,
+        count: "exact",
+      });
+      return json(200, {
+        count: totalFromContentRange(meta.headers),
+        max_updated_at: meta.data?.[0]?.updated_at || null,
+      });
+    }
+
+    if (String(qs.ids_only || "").trim() === "1") {
+      const limit = parseLimit(qs.limit, { fallback: 1000, max: 1000 });
+      const after = String(qs.after || "").trim();
+      if (after && !UUID_RE.test(after)) return { statusCode: 400, body: "after must be a page id" };
+      const rows = await supabaseRequest("pages", {
+        query:
+          `?select=id&order=id.asc&limit=${limit}` +
+          (after ? `&id=gt.${after}` : "") +
+          (filters.length ? `&${filters.join("&")}` : ""),
+      });
+      const ids = (rows || []).map((r) => r.id);
+      return json(200, { ids, next_cursor: ids.length ? ids[ids.length - 1] : null });
+    }
+
+    const limit = parseLimit(qs.limit, { fallback: 200, max: 500 });
+    if (qs.since !== undefined) {
+      const cursor = parseKeysetCursor(qs.since);
+      if (!cursor) return { statusCode: 400, body: "since must be <updated_at>,<id> from a previous next_cursor" };
+      const ts = `"${cursor.ts}"`;
+      filters.push(
+        `or=${encodeURIComponent(`(updated_at.gt.${ts},and(updated_at.eq.${ts},id.gt.${cursor.id}))`)}`
+      );
+    }
+
+    const rows = await supabaseRequest("pages", {
+      query:
+        `?select=${COLUMNS}` +
+        "&order=updated_at.asc,id.asc" +
+        `&limit=${limit}` +
+        (filters.length ? `&${filters.join("&")}` : ""),
+    });
+
+    // Long pages (pasted full text) can make `limit` rows too big for one response: cut, the cursor continues.
+    const pages = [];
+    let bytes = 0;
+    for (const r of rows || []) {
+      bytes += Buffer.byteLength(JSON.stringify(r));
+      if (pages.length && bytes > MAX_RESPONSE_BYTES) break;
+      pages.push(r);
+    }
+    const last = pages.length ? pages[pages.length - 1] : null;
+    return json(200, {
+      pages,
+      next_cursor: last?.updated_at && last?.id ? `${last.updated_at},${last.id}` : null,
+      truncated: pages.length < (rows || []).length,
+    });
+  } catch (err) {
+    return json(500, { error: String(err?.message || err) });
+  }
+};
@@ -6,13 +6,8 @@ const { requireAdmin } = require("./_auth");
 const { supabaseRequest, supabaseRequestMeta } = require("./_supabase");
 const { assertNoSecrets, isAllowSecrets } = require("./_secrets");
 const { makeEmbeddingFields } = require("./_embeddings");
-
-function parseLimit(raw) {
-  const n = Number(raw);
-  if (!Number.isFinite(n) || n <= 0) return 50;
-  // Allow larger reads for client-side features like wikilink picking (still keep a hard cap).
-  return Math.min(5000, Math.floor(n));
-}
+const { parseJsonBody } = require("./_body");
+const { CURSOR_TS_RE, UUID_RE, parseKeysetCursor, parseLimit, totalFromContentRange } = require("./_query");
 
 function parseOffset(raw) {
   const n = Number(raw);
@@ -21,6 +16,48 @@ function parseOffset(raw) {
   return Math.min(500000, Math.floor(n));
 }
 
+const MAX_IDS = 500;
+
+function parseIds(raw) {
+  // Purpose: comma-separated page ids (import scripts re-read / delete only the pages they care about).
+  // Returns null if any entry is not a uuid (never silently drop ids from a delete).
+  const ids = String(raw || "")
+    .split(",")
+    .map((s) => s.trim())
+    .filter(Boolean);
+  if (!ids.length || ids.some((s) => !UUID_RE.test(s))) return null;
+  return ids;
+}
+
+// Columns callers may request via ?select= (plus `kv_tags->>key` projections of single kv values).
+const SELECTABLE_COLUMNS = new Set([
+  "id",
+  "created_at",
+  "updated_at",
+  "thread_id",
+  "next_page_id",
+  "title",
+  "tags",
+  "kv_tags",
+  "content_md",
+]);
+const KV_PROJECTION_RE = /^kv_tags->>[A-Za-z0-9_]{1,100}$/;
+
+function parseSelect(raw) {
+  // Purpose: column projection for big listings (import scripts only need ids + a couple of kv values).
+  // id + created_at are always included so every row can act as a keyset cursor.
+  const cols = String(raw || "")
+    .split(",")
+    .map((s) => s.trim())
+    .filter(Boolean);
+  if (!cols.length) return null;
+  for (const c of cols) {
+    if (!SELECTABLE_COLUMNS.has(c) && !KV_PROJECTION_RE.test(c)) return null;
+  }
+  for (const c of ["created_at", "id"]) if (!cols.includes(c)) cols.unshift(c);
+  return Array.from(new Set(cols)).join(",");
+}
+
 function parseKvValueFromQuery(raw) {
   // Purpose: match the stored kv_tags JSON types (number/bool/null/string), not just strings.
   const s = String(raw ?? "").trim();
@@ -45,7 +82,8 @@ exports.handler = async (event) => {
 
   try {
     if (event.httpMethod === "GET") {
-      const limit = parseLimit(event.queryStringParameters?.limit);
+      // Allow larger reads for client-side features like wikilink picking (still keep a hard cap).
+      const limit = parseLimit(event.queryStringParameters?.limit, { fallback: 50, max: 5000 });
       const offset = parseOffset(event.queryStringParameters?.offset);
       const tag = event.queryStringParameters?.tag;
       const threadId = event.queryStringParameters?.thread_id;
@@ -54,6 +92,10 @@ exports.handler = async (event) => {
       const kvValue = event.queryStringParameters?.kv_value;
       const relatedTo = event.queryStringParameters?.related_to;
       const light = String(event.queryStringParameters?.light || "").trim() === "1";
+      const stats = String(event.queryStringParameters?.stats || "").trim() === "1";
+      const idsRaw = event.queryStringParameters?.ids;
+      const selectRaw = event.queryStringParameters?.select;
+      const afterRaw = event.queryStringParameters?.after;
 
       // Vector-related pages (server-side embeddings).
       // Used by the UI when recall search is empty and the user is typing in chat.
@@ -90,60 +132,117 @@ exports.handler = async (event) => {
         const obj = { [String(kvKey)]: parseKvValueFromQuery(kvValue) };
         filters.push(`kv_tags=cs.${encodeURIComponent(JSON.stringify(obj))}`);
       }
+      if (idsRaw !== undefined) {
+        const ids = parseIds(idsRaw);
+        if (!ids) return { statusCode: 400, body: "ids must be a comma-separated list of page ids" };
+        if (ids.length > MAX_IDS) return { statusCode: 400, body: `ids: max ${MAX_IDS} per request` };
+        filters.push(`id=in.(${ids.join(",")})`);
+      }
+
+      // Optional "stats" mode: cheap fingerprint of the filtered set (count + newest updated_at).
+      // Used by import scripts to check whether their local sync state is still valid.
+      if (stats) {
+        const meta = await supabaseRequestMeta("pages", {
+          method: "GET",
+          query: `?select=updated_at&order=updated_at.desc&limit=1` + (filters.length ? `&${filters.join("&")}` : ""),
+          returnRepresentation: true,
+          count: "exact",
+        });
+        return {
+          statusCode: 200,
+          headers: { "content-type": "application/json" },
+          body: JSON.stringify({
+            count: totalFromContentRange(meta.headers),
+            max_updated_at: meta.data?.[0]?.updated_at || null,
+          }),
+        };
+      }
 
-      // Optional "light" mode: omit content_md for big list loads (faster; much smaller payload).
-      const select = light
+      // Keyset pagination: ?after=<created_at>,<id> continues strictly after that row.
+      // Unlike offset, cost stays flat however deep the caller pages.
+      if (afterRaw !== undefined) {
+        // Rows are ordered created_at desc, id desc: the cursor is the (created_at, id) of the last row seen.
+        const cursor = parseKeysetCursor(afterRaw);
+        if (!cursor) return { statusCode: 400, body: "after must be <created_at>,<id> from a previous next_cursor" };
+        const ts = `"${cursor.ts}"`;
+        filters.push(
+          `or=${encodeURIComponent(`(created_at.lt.${ts},and(created_at.eq.${ts},id.lt.${cursor.id}))`)}`
+        );
+      }
+
+      // Projection: explicit ?select= wins; otherwise "light" mode omits content_md for big list loads.
+      let select = light
         ? `id,created_at,updated_at,thread_id,next_page_id,title,tags,kv_tags`
         : `id,created_at,updated_at,thread_id,next_page_id,title,tags,kv_tags,content_md`;
+      if (selectRaw !== undefined) {
+        select = parseSelect(selectRaw);
+        if (!select) return { statusCode: 400, body: "Invalid select (allowed: page columns or kv_tags->>key)" };
+      }
       const query =
         `?select=${select}` +
-        `&order=created_at.desc` +
+        `&order=created_at.desc,id.desc` +
         `&limit=${encodeURIComponent(limit)}` +
         (offset ? `&offset=${encodeURIComponent(offset)}` : "") +
         (filters.length ? `&${filters.join("&")}` : "");
 
       const rows = await supabaseRequest("pages", { query });
 
+      // Cursor for the next page (null when this page is empty). Callers stop on an empty or short page.
+      const last = Array.isArray(rows) && rows.length ? rows[rows.length - 1] : null;
+      const nextCursor = last?.created_at && last?.id ? `${last.created_at},${last.id}` : null;
+
       return {
         statusCode: 200,
         headers: { "content-type": "application/json" },
-        body: JSON.stringify({ pages: rows }),
+        body: JSON.stringify({ pages: rows, next_cursor: nextCursor }),
       };
     }
 
     if (event.httpMethod === "DELETE") {
       // Purpose: bulk delete (used by import scripts) without 1000s of per-page HTTP calls.
-      // Safety: require an explicit confirm flag + kv filter.
+      // Safety: require an explicit confirm flag + a kv filter and/or an explicit id list.
+      // - kv only: delete everything matching (e.g. purge all Zotero imports)
+      // - ids (+ optional kv): delete just those pages (delta sync); kv further restricts the match
       const confirm = String(event.queryStringParameters?.confirm || "").trim() === "1";
       if (!confirm) return { statusCode: 400, body: "Missing confirm=1" };
 
       const kvKey = event.queryStringParameters?.kv_key;
       const kvValue = event.queryStringParameters?.kv_value;
-      if (!kvKey || kvValue === undefined) return { statusCode: 400, body: "kv_key and kv_value are required" };
+      const idsRaw = event.queryStringParameters?.ids;
+      const hasKv = Boolean(kvKey) && kvValue !== undefined;
+      if (!hasKv && idsRaw === undefined) return { statusCode: 400, body: "kv_key and kv_value (or ids) are required" };
 
-      const obj = { [String(kvKey)]: parseKvValueFromQuery(kvValue) };
-      const query = `?kv_tags=cs.${encodeURIComponent(JSON.stringify(obj))}`;
+      const filters = [];
+      if (hasKv) {
+        const obj = { [String(kvKey)]: parseKvValueFromQuery(kvValue) };
+        filters.push(`kv_tags=cs.${encodeURIComponent(JSON.stringify(obj))}`);
+      }
+      if (idsRaw !== undefined) {
+        const ids = parseIds(idsRaw);
+        if (!ids) return { statusCode: 400, body: "ids must be a comma-separated list of page ids" };
+        if (ids.length > MAX_IDS) return { statusCode: 400, body: `ids: max ${MAX_IDS} per request` };
+        filters.push(`id=in.(${ids.join(",")})`);
+      }
+      const query = `?${filters.join("&")}`;
 
       // Get count before + after so callers can trust the result (and catch wrong env/base_url issues).
       const before = await supabaseRequestMeta("pages", {
         method: "GET",
-        query: `?select=id&limit=1&kv_tags=cs.${encodeURIComponent(JSON.stringify(obj))}`,
+        query: `?select=id&limit=1&${filters.join("&")}`,
         returnRepresentation: true,
         count: "exact",
       });
-      const beforeRange = String(before.headers?.["content-range"] || "");
-      const beforeTotal = Number(beforeRange.split("/")[1] || "0") || 0;
+      const beforeTotal = totalFromContentRange(before.headers);
 
       await supabaseRequest("pages", { method: "DELETE", query, returnRepresentation: false });
 
       const after = await supabaseRequestMeta("pages", {
         method: "GET",
-        query: `?select=id&limit=1&kv_tags=cs.${encodeURIComponent(JSON.stringify(obj))}`,
+        query: `?select=id&limit=1&${filters.join("&")}`,
         returnRepresentation: true,
         count: "exact",
       });
-      const afterRange = String(after.headers?.["content-range"] || "");
-      const afterTotal = Number(afterRange.split("/")[1] || "0") || 0;
+      const afterTotal = totalFromContentRange(after.headers);
 
       return {
         statusCode: 200,
@@ -160,13 +259,20 @@ exports.handler = async (event) => {
     if (event.httpMethod === "POST") {
       const allowSecrets = isAllowSecrets(event);
       const skipEmbeddings = String(event.headers?.["x-enkidu-skip-embeddings"] || "").trim() === "1";
-      const body = JSON.parse(event.body || "{}");
+      // Restore mode (scripts/pages_archive.py): pages come from a backup of this table, so they keep their
+      // created_at and threading, and are taken as they were (they passed the content checks when first written).
+      const restore = String(event.headers?.["x-enkidu-restore"] || "").trim() === "1";
+      // May be gzip-compressed (import scripts), see _body.js.
+      const body = parseJsonBody(event);
 
       // Bulk upsert: { pages: [ {id?, title?, content_md, tags?, kv_tags?} ] }
       // Purpose: speed up import scripts by avoiding 1000s of HTTP calls.
       if (Array.isArray(body.pages)) {
         if (!skipEmbeddings) return { statusCode: 400, body: "Bulk import requires x-enkidu-skip-embeddings: 1" };
         if (body.pages.length > 500) return { statusCode: 400, body: "Bulk import max 500 pages per request" };
+        if (restore && body.pages.some((p) => !UUID_RE.test(String(p?.id || "")))) {
+          return { statusCode: 400, body: "Restore needs the page id of every page" };
+        }
 
         const pages = body.pages.map((p) => ({
           // If id is present, PostgREST upsert (on_conflict=id) will update that row.
@@ -176,10 +282,19 @@ exports.handler = async (event) => {
           tags: Array.isArray(p?.tags) ? p.tags.map(String) : [],
           kv_tags: p?.kv_tags && typeof p.kv_tags === "object" ? p.kv_tags : {},
           // Intentionally omit thread_id/next_page_id in bulk mode (keep imports from stomping manual threading).
+          ...(restore
+            ? {
+                created_at: CURSOR_TS_RE.test(String(p?.created_at || "")) ? p.created_at : new Date().toISOString(),
+                thread_id: p?.thread_id ?? null,
+                next_page_id: p?.next_page_id ?? null,
+              }
+            : {}),
         }));
 
         for (const p of pages) {
-          if (!p.content_md.trim()) return { statusCode: 400, body: "content_md is required (bulk)" };
+          // Restores bring pages back as they were exported (empty content included); the secret guard still
+          // applies unless x-enkidu-allow-secrets is sent as well.
+          if (!restore && !p.content_md.trim()) return { statusCode: 400, body: "content_md is required (bulk)" };
           assertNoSecrets(p.content_md, { allow: allowSecrets });
         }
 
@@ -235,7 +350,7 @@ exports.handler = async (event) => {
 
     return { statusCode: 405, body: "Method Not Allowed" };
   } catch (err) {
-    return { statusCode: 500, body: String(err?.message || err) };
+    return { statusCode: err?.statusCode || 500, body: String(err?.message || err) };
   }
 };
 
@@ -0,0 +1,295 @@
+"""
+Attachment full-text extraction for the import scripts (process pool + SQLite cache keyed by content hash).
+
+Why: Zotero entries point at local PDFs, but only a file:// link used to reach content_md, so the paper
+text was never searchable or embedded. Extracting text is slow (seconds per PDF), so it runs across a
+process pool, and every result is cached by the file's SHA-256: a PDF is only parsed again when its
+bytes change (moving/renaming it, or touching its mtime, costs one re-hash at most).
+
+Supported: .pdf (needs pypdf: pip install pypdf), .txt/.md, .html/.htm (snapshots; stdlib parser).
+Other attachment types and missing files are ignored.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html.parser
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+try:
+    import pypdf
+except ImportError:  # pragma: no cover - optional dependency
+    pypdf = None  # type: ignore[assignment]
+
+# Bump when extraction output changes, so cached texts from the old extractor are redone.
+EXTRACTOR_VERSION = 1
+SUPPORTED_SUFFIXES = {".pdf", ".txt", ".md", ".html", ".htm"}
+_READ_BLOCK = 1024 * 1024
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def require_pypdf() -> None:
+    if pypdf is None:
+        raise RuntimeError("Attachment text extraction needs pypdf for PDFs: pip install pypdf")
+
+
+@dataclass(frozen=True)
+class Attachment:
+    path: str
+    sha256: str
+    text: str  # normalized extracted text, capped at the caller's max_chars ('' if nothing extractable)
+    chars: int  # length of the full extracted text (before the cap)
+
+
+@dataclass
+class AttachmentStats:
+    files: int = 0
+    cached: int = 0  # text reused from the cache (no extraction)
+    extracted: int = 0
+    errors: int = 0  # unreadable / broken files (cached too, until the file changes)
+    missing: int = 0
+    seconds: float = 0.0  # extraction time summed over workers
+
+
+def file_sha256(path: str) -> str:
+    # Streaming: constant memory however large the PDF.
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(_READ_BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+
+class _HtmlText(html.parser.HTMLParser):
+    # Visible text of an HTML snapshot (script/style dropped, block tags become paragraph breaks).
+    _SKIP = {"script", "style", "noscript", "template"}
+    _BLOCK = {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "section", "article", "blockquote"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self.parts.append(data)
+
+
+def _pdf_text(path: str) -> str:
+    require_pypdf()
+    reader = pypdf.PdfReader(path)
+    return "\n\n".join((page.extract_text() or "") for page in reader.pages)
+
+
+def _html_text(path: str) -> str:
+    p = _HtmlText()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        p.feed(f.read())
+    p.close()
+    return "".join(p.parts)
+
+
+def _plain_text(path: str) -> str:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+_EXTRACTORS: dict[str, Callable[[str], str]] = {
+    ".pdf": _pdf_text,
+    ".txt": _plain_text,
+    ".md": _plain_text,
+    ".html": _html_text,
+    ".htm": _html_text,
+}
+
+
+def normalize_text(text: str) -> str:
+    # Paragraphs kept, whitespace inside them collapsed (PDF line breaks / hyphenation columns are noise).
+    paras = (" ".join(p.split()) for p in _PARAGRAPH_RE.split(text.replace("\x00", "")))
+    return "\n\n".join(p for p in paras if p)
+
+
+def extract_text(path: str) -> str:
+    return normalize_text(_EXTRACTORS[Path(path).suffix.lower()](path))
+
+
+# Worker-side read-only cache connection (one per process, opened lazily).
+_worker_db: sqlite3.Connection | None = None
+
+
+def _cached_in_worker(cache_path: str, sha: str) -> bool:
+    global _worker_db
+    if _worker_db is None:
+        _worker_db = sqlite3.connect(Path(cache_path).resolve().as_uri() + "?mode=ro", uri=True)
+    row = _worker_db.execute("select 1 from texts where sha256 = ? and version = ?", (sha, EXTRACTOR_VERSION)).fetchone()
+    return row is not None
+
+
+def _hash_and_extract(cache_path: str, path: str) -> tuple[str, str | None, str, float]:
+    # Worker job for one file: (sha256, text or None if the cache already has this content, error, seconds).
+    t0 = time.perf_counter()
+    sha = file_sha256(path)
+    if _cached_in_worker(cache_path, sha):
+        return sha, None, "", time.perf_counter() - t0
+    try:
+        return sha, extract_text(path), "", time.perf_counter() - t0
+    except Exception as e:  # noqa: BLE001 - a broken PDF must not stop the import
+        return sha, "", f"{type(e).__name__}: {e}"[:500], time.perf_counter() - t0
+
+
+class AttachmentCache:
+    """path -> (size, mtime, sha256) and sha256 -> extracted text, in one SQLite file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.executescript(
+            """
+            pragma journal_mode = wal;
+            pragma synchronous = normal;
+            create table if not exists files (
+              path text primary key,
+              size integer not null,
+              mtime_ns integer not null,
+              sha256 text not null
+            );
+            create table if not exists texts (
+              sha256 text primary key,
+              version integer not null,
+              text text not null,
+              error text not null default '',
+              extracted_at real not null
+            );
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> AttachmentCache:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def sha_for(self, path: str, st: os.stat_result) -> str:
+        # Known content hash if the file looks untouched since we last hashed it ('' otherwise).
+        row = self.db.execute("select size, mtime_ns, sha256 from files where path = ?", (path,)).fetchone()
+        return row[2] if row and row[0] == st.st_size and row[1] == st.st_mtime_ns else ""
+
+    def text_for(self, sha: str) -> str | None:
+        row = self.db.execute("select text from texts where sha256 = ? and version = ?", (sha, EXTRACTOR_VERSION)).fetchone()
+        return row[0] if row else None
+
+    def record(self, path: str, st: os.stat_result, sha: str, text: str | None, error: str = "") -> None:
+        # text None: only the path -> sha mapping changed (the text for that content is already cached).
+        with self._lock, self.db:
+            self.db.execute(
+                "insert into files (path, size, mtime_ns, sha256) values (?, ?, ?, ?) on conflict(path) do update set "
+                "size = excluded.size, mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256",
+                (path, st.st_size, st.st_mtime_ns, sha),
+            )
+            if text is not None:
+                self.db.execute(
+                    "insert or replace into texts (sha256, version, text, error, extracted_at) values (?, ?, ?, ?, ?)",
+                    (sha, EXTRACTOR_VERSION, text, error, time.time()),
+                )
+
+
+def attachment_stage(
+    cache: AttachmentCache,
+    paths_of: Callable[[Any], Iterable[str]],
+    attach: Callable[[Any, tuple[Attachment, ...]], Any],
+    *,
+    workers: int,
+    max_chars: int,
+    stats: AttachmentStats | None = None,
+) -> Callable[[Iterator[Any]], Iterator[Any]]:
+    # Pipeline stage: record -> attach(record, attachments). Cache hits resolve in the stage thread; misses
+    # (new or changed files) are hashed + extracted in a process pool, started only when the first miss shows
+    # up. Records leave in input order; at most `window` records wait on extractions at a time.
+    stats = stats if stats is not None else AttachmentStats()
+    window = max(64, 8 * workers)
+
+    def _finish(record: Any, slots: list[tuple[str, os.stat_result, Any, bool]]) -> Any:
+        out: list[Attachment] = []
+        for path, st, res, known in slots:
+            sha, text, error, seconds = res.result() if isinstance(res, Future) else res
+            stats.seconds += seconds
+            if known:
+                stats.cached += 1
+            elif text is None:
+                # Moved, renamed or touched, but same bytes: only the path -> sha mapping is new.
+                stats.cached += 1
+                cache.record(path, st, sha, None)
+                text = cache.text_for(sha) or ""
+            else:
+                stats.extracted += 1
+                stats.errors += bool(error)
+                cache.record(path, st, sha, text, error)
+            out.append(Attachment(path=path, sha256=sha, text=text[:max_chars], chars=len(text)))
+        return attach(record, tuple(out))
+
+    def _stage(records: Iterator[Any]) -> Iterator[Any]:
+        pool: ProcessPoolExecutor | None = None
+        pending: deque[tuple[Any, list[tuple[str, os.stat_result, Any, bool]]]] = deque()
+        cache_path = str(cache.path)
+        try:
+            for record in records:
+                slots: list[tuple[str, os.stat_result, Any, bool]] = []
+                for path in paths_of(record):
+                    if Path(path).suffix.lower() not in SUPPORTED_SUFFIXES:
+                        continue
+                    stats.files += 1
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        stats.missing += 1
+                        continue
+                    sha = cache.sha_for(path, st)
+                    text = cache.text_for(sha) if sha else None
+                    if text is not None:
+                        slots.append((path, st, (sha, text, "", 0.0), True))
+                    elif workers <= 1:
+                        slots.append((path, st, _hash_and_extract(cache_path, path), False))
+                    else:
+                        if pool is None:
+                            # spawn, not fork: the importer process already has pipeline and HTTP threads running.
+                            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                        slots.append((path, st, pool.submit(_hash_and_extract, cache_path, path), False))
+                pending.append((record, slots))
+                # Hand records on as soon as everything in front of them is done (keeps uploads streaming).
+                while pending and (
+                    len(pending) > window or all(not isinstance(r, Future) or r.done() for _p, _s, r, _k in pending[0][1])
+                ):
+                    yield _finish(*pending.popleft())
+            while pending:
+                yield _finish(*pending.popleft())
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    return _stage
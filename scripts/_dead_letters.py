@@ -0,0 +1,101 @@
+"""
+Dead-letter file for bulk imports: pages the server refused on their own, kept so they can be replayed.
+
+Why: failed chunks are bisected (see _enkidu_api.upload_chunks_iter), so a bad record no longer costs the
+pages around it. The bad record itself still needs a home: each one is appended here as one NDJSON line
+holding the exact page body that was sent (ids and merged kv_tags included) and the server's error.
+replay_dead_letters.py sends the file again on its own, without re-reading the source.
+
+Record: {"key": <source key>, "error": "...", "failed_at": "<ISO time>", "page": {...}}
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+
+class DeadLetterFile:
+    # Append-only; the file is only created once there is something to put in it.
+    # replace=True (one run = one file): records go to `<path>.partial`, and commit() puts that in place of the
+    # previous run's file (or removes the old file when nothing failed). A run that dies before commit() leaves
+    # the previous file alone: it stays the record of those pages until a run gets through.
+
+    def __init__(self, path: Path, *, replace: bool = False):
+        self.path = path
+        self.replace = replace
+        self.count = 0
+        self._write_path = path.with_name(path.name + ".partial") if replace else path
+        self._f: Any = None
+        self._lock = threading.Lock()
+
+    def add(self, page: dict[str, Any], error: str, *, key: str = "") -> None:
+        rec = {
+            "key": key,
+            "error": error,
+            "failed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "page": page,
+        }
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._f is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # ("w": a .partial left by a run that died is not ours to extend.)
+                self._f = self._write_path.open("w" if self.replace else "a", encoding="utf-8")
+            self._f.write(line)
+            self._f.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+    def commit(self) -> None:
+        # The run got through: this run's dead letters replace the previous run's.
+        self.close()
+        if not self.replace:
+            return
+        if self.count:
+            os.replace(self._write_path, self.path)
+        else:
+            self.path.unlink(missing_ok=True)
+            self._write_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> DeadLetterFile:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def read_dead_letters(path: Path) -> Iterator[dict[str, Any]]:
+    # Records in file order; a torn last line (crash mid-write) is skipped.
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(rec, dict) and isinstance(rec.get("page"), dict):
+                yield rec
+
+
+def rewrite_dead_letters(path: Path, records: list[dict[str, Any]]) -> None:
+    # Replace the file with `records` (atomically), or remove it when nothing is left.
+    if not records:
+        path.unlink(missing_ok=True)
+        return
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+    os.replace(tmp, path)
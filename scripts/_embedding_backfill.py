@@ -0,0 +1,208 @@
+"""
+Client-driven embedding backfill for pages an import just wrote (POST /api/backfill-embeddings).
+
+Why: bulk imports must skip inline embeddings, so new pages stay invisible to `related_to` search until
+the 15-minute cron catches up (25 pages per run). Here we call the backfill endpoint ourselves with just
+the written ids, several batches at once, and pace ourselves to Gemini's rate limits:
+- additive increase: every clean batch allows one more batch in flight (up to `max_concurrency`)
+- multiplicative decrease: a rate-limited batch halves the window and pauses new batches (growing cooldown)
+Rate-limited / timed-out ids are re-queued; other failures (a page with empty content, a 400/401 for the
+whole batch) are reported in the result. Request errors never escape: the pages are already written.
+"""
+
+from __future__ import annotations
+
+import http.client
+import re
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from _enkidu_api import ApiError, EnkiduClient
+
+# The server caps one call at 200 ids (parseLimit in backfill-embeddings.js).
+MAX_BATCH = 200
+
+# Statuses no later batch can get past (bad token, endpoint not deployed): the rest is reported unsent.
+_FATAL_STATUSES = {401, 403, 404, 405}
+
+# Per-page failures worth retrying later (Gemini quota/rate limits, overload, timeouts).
+_THROTTLED_RE = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|rate limit|quota|\b503\b|UNAVAILABLE|timed out", re.I)
+
+
+@dataclass
+class BackfillResult:
+    requested: int = 0
+    embedded: int = 0
+    skipped: int = 0  # already embedded (without force) or no longer present
+    failed: dict[str, str] = field(default_factory=dict)  # page id -> last error
+    throttled: int = 0  # batches that hit rate limits
+    seconds: float = 0.0
+
+
+class _Pacer:
+    # AIMD window for batches in flight, plus a cooldown after throttling.
+    def __init__(self, max_concurrency: int, *, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max = max(1, int(max_concurrency))
+        self.window = min(2, self.max)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = base_delay
+        self.resume_at = 0.0
+
+    def on_success(self) -> None:
+        self.window = min(self.max, self.window + 1)
+        # The cooldown only keeps growing across back-to-back throttling.
+        self.delay = self.base_delay
+
+    def on_throttle(self) -> None:
+        # Batches already in flight report the same congestion; react once per cooldown, not per batch.
+        if time.monotonic() < self.resume_at:
+            return
+        self.window = max(1, self.window // 2)
+        self.resume_at = max(self.resume_at, time.monotonic() + self.delay)
+        self.delay = min(self.max_delay, self.delay * 2)
+
+
+def _fmt_duration(seconds: float) -> str:
+    s = int(max(0, seconds))
+    if s >= 3600:
+        return f"{s // 3600}h{(s % 3600) // 60:02d}m"
+    if s >= 60:
+        return f"{s // 60}m{s % 60:02d}s"
+    return f"{s}s"
+
+
+def backfill_embeddings(
+    client: EnkiduClient,
+    page_ids: list[str],
+    *,
+    batch_size: int = 50,
+    max_concurrency: int = 4,
+    force: bool = False,
+    max_attempts: int = 6,
+    progress: Callable[[str], None] | None = print,
+) -> BackfillResult:
+    # Purpose: embed exactly `page_ids` as fast as the embedding quota allows.
+    # force=True re-embeds pages that already have a (possibly stale) embedding, e.g. after bulk updates.
+    started = time.perf_counter()
+    res = BackfillResult(requested=len(page_ids))
+    pacer = _Pacer(max_concurrency)
+    size = max(1, min(MAX_BATCH, int(batch_size)))
+    attempts: dict[str, int] = {}
+    todo: deque[list[str]] = deque(page_ids[i : i + size] for i in range(0, len(page_ids), size))
+
+    def _call(batch: list[str]) -> Any:
+        body: dict[str, Any] = {"ids": batch}
+        if force:
+            body["force"] = True
+        return client.request("POST", f"/api/backfill-embeddings?limit={len(batch)}", body_obj=body)
+
+    def _requeue(ids: list[str], error: str) -> None:
+        retry = []
+        for pid in ids:
+            attempts[pid] = attempts.get(pid, 0) + 1
+            if attempts[pid] >= max_attempts:
+                res.failed[pid] = error
+            else:
+                retry.append(pid)
+        if retry:
+            todo.append(retry)
+
+    def _report() -> None:
+        if not progress:
+            return
+        done = res.embedded + res.skipped + len(res.failed)
+        elapsed = time.perf_counter() - started
+        rate = res.embedded / elapsed if elapsed > 0 else 0.0
+        eta = (res.requested - done) / rate if rate > 0 else 0.0
+        pct = 100.0 * done / res.requested if res.requested else 100.0
+        progress(
+            f"Embeddings: {done}/{res.requested} ({pct:.0f}%), {rate:.1f} pages/s, "
+            f"ETA {_fmt_duration(eta) if rate > 0 else '?'}, up to {pacer.window} batch(es) in flight"
+        )
+
+    def _handle(batch: list[str], fut: Future) -> None:
+        try:
+            data = fut.result() or {}
+        except ApiError as e:
+            if e.status in (502, 504) and len(batch) > 1:
+                # Function timeout: the batch took too long to embed; split it and slow down.
+                pacer.on_throttle()
+                res.throttled += 1
+                mid = len(batch) // 2
+                todo.append(batch[:mid])
+                todo.append(batch[mid:])
+                return
+            if e.status == 429 or e.status in (500, 502, 503, 504):
+                pacer.on_throttle()
+                res.throttled += 1
+                _requeue(batch, str(e))
+                return
+            # A resend can't fix this batch (e.g. 400); with a bad token or no endpoint, nothing else either.
+            lost = [batch]
+            if e.status in _FATAL_STATUSES:
+                lost.extend(todo)
+                todo.clear()
+            for ids in lost:
+                for pid in ids:
+                    res.failed[pid] = str(e)
+            return
+        except (OSError, http.client.HTTPException) as e:
+            # Timeout / dropped connection: the client does not resend POSTs, so we do (force makes it harmless).
+            pacer.on_throttle()
+            res.throttled += 1
+            _requeue(batch, str(e) or type(e).__name__)
+            return
+        except ValueError as e:
+            # Not JSON (e.g. a proxy error page).
+            for pid in batch:
+                res.failed[pid] = f"unexpected response: {e}"
+            return
+
+        embedded = {str(x) for x in data.get("ids") or []}
+        retry: list[str] = []
+        retry_error = ""
+        failed_ids: set[str] = set()
+        for f in data.get("failed") or []:
+            pid = str((f or {}).get("id") or "")
+            err = str((f or {}).get("error") or "")
+            if not pid:
+                continue
+            failed_ids.add(pid)
+            if _THROTTLED_RE.search(err):
+                retry.append(pid)
+                retry_error = err
+            else:
+                res.failed[pid] = err
+        res.embedded += len(embedded)
+        res.skipped += sum(1 for pid in batch if pid not in embedded and pid not in failed_ids)
+        if retry:
+            pacer.on_throttle()
+            res.throttled += 1
+            _requeue(retry, retry_error)
+        else:
+            pacer.on_success()
+
+    with ThreadPoolExecutor(max_workers=pacer.max, thread_name_prefix="embed") as ex:
+        in_flight: dict[Future, list[str]] = {}
+        while todo or in_flight:
+            now = time.monotonic()
+            while todo and len(in_flight) < pacer.window and now >= pacer.resume_at:
+                batch = todo.popleft()
+                in_flight[ex.submit(_call, batch)] = batch
+            if not in_flight:
+                # Cooling down after a rate limit with nothing running.
+                time.sleep(max(0.0, pacer.resume_at - time.monotonic()))
+                continue
+            timeout = max(0.05, pacer.resume_at - now) if todo and now < pacer.resume_at else None
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                _handle(in_flight.pop(fut), fut)
+            if done:
+                _report()
+
+    res.seconds = time.perf_counter() - started
+    return res
@@ -0,0 +1,453 @@
+"""
+Pooled keep-alive HTTP client for the Enkidu API (shared by the Python scripts).
+
+Why: urllib.request opens a fresh connection (and TLS handshake) per call. Bulk imports send
+hundreds of chunked POST /api/pages requests, so we keep a small pool of persistent HTTP/1.1
+connections and send several chunks at once from a thread pool.
+
+No third-party deps (http.client + concurrent.futures only).
+"""
+
+from __future__ import annotations
+
+import gzip
+import http.client
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator
+
+# Statuses worth retrying (rate limits + transient gateway/function errors).
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods that are safe to retry even if the request may already have reached the server.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+# Netlify Functions reject request payloads above 6 MB (413); bulk upload chunks stay well below.
+MAX_REQUEST_BYTES = 6 * 1024 * 1024
+# Default byte budget per bulk upsert chunk (compact JSON, before compression). Also keeps the local
+# Express server (express.text limit: 5mb, measured after inflating) happy.
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+# pages.js caps bulk upserts at 500 pages per request.
+MAX_BULK_PAGES = 500
+# Failures that every half of a chunk would hit too (auth, wrong route, rate limit, outage): not worth bisecting.
+NO_BISECT_STATUSES = {401, 403, 404, 405, 429, 503}
+
+
+def encode_json(obj: Any) -> bytes:
+    # Compact separators + raw UTF-8 (no \uXXXX escapes): ~10-20% smaller than json.dumps() defaults.
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class ApiError(RuntimeError):
+    # Keep the message format of the old urllib helper ("API error <code>: <body>") so callers can match on it.
+    def __init__(self, status: int, text: str, *, retry_after: float | None = None):
+        super().__init__(f"API error {status}: {text}")
+        self.status = status
+        self.text = text
+        self.retry_after = retry_after
+
+
+class ConnectionPool:
+    # Thread-safe pool of persistent connections to one origin (at most `size` in use at once).
+
+    def __init__(self, base_url: str, *, size: int = 4, timeout: float = 60.0):
+        u = urllib.parse.urlsplit(base_url)
+        if u.scheme not in ("http", "https") or not u.hostname:
+            raise ValueError(f"Unsupported base URL: {base_url!r}")
+        self.scheme = u.scheme
+        self.host = u.hostname
+        self.port = u.port
+        self.base_path = u.path.rstrip("/")
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def _new_conn(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, dict[str, str], bytes]:
+        # Purpose: send one request on a pooled connection; reconnect once if a reused connection went stale.
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._new_conn()
+
+            while True:
+                try:
+                    conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    conn.close()
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection; retry once on a fresh one.
+                    conn = self._new_conn()
+                    reused = False
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+                break
+
+            resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+            if resp.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+            return resp.status, resp_headers, data
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._idle = self._idle, []
+        for c in conns:
+            c.close()
+
+
+class RateLimiter:
+    # Token bucket for a request budget shared by every thread (and every import) using one client:
+    # at most `rate` requests per second on average, bursts of up to `burst`. A 429 pauses everyone.
+
+    def __init__(self, rate: float, *, burst: int | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be > 0 requests/s")
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self.waited = 0.0  # total seconds callers spent waiting for a token
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        # The server asked us to slow down: nobody sends for `seconds` (the retrying request waits anyway).
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def _parse_retry_after(v: str | None) -> float | None:
+    try:
+        return max(0.0, float(str(v).strip())) if v else None
+    except ValueError:
+        return None
+
+
+class EnkiduClient:
+    # JSON client for /api/* with shared auth headers, pooled connections and retry/backoff.
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        pool_size: int = 4,
+        timeout: float = 60.0,
+        retries: int = 4,
+        backoff: float = 0.5,
+        observer: Any = None,
+        gzip_min_bytes: int = 1024,
+        accept_gzip: bool = False,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        self.pool = ConnectionPool(base_url, size=pool_size, timeout=timeout)
+        self.headers = dict(headers or {})
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        # Optional metrics sink (e.g. _metrics.RunMetrics): gets observe_request(...) per attempt and
+        # observe_retry(...) per retry. Called from worker threads.
+        self.observer = observer
+        # Request bodies sent with request(..., compress=True) are gzipped from this size up (0 = never).
+        # Switched off automatically if the backend turns out not to understand gzip bodies.
+        self.gzip_min_bytes = max(0, int(gzip_min_bytes))
+        # Ask for gzip responses (big listings/exports; the Netlify CDN compresses them). Observers see wire bytes.
+        self.accept_gzip = accept_gzip
+        # Optional request budget; every attempt (retries included) takes a token before it gets a connection.
+        self.rate_limiter = rate_limiter
+
+    def __enter__(self) -> EnkiduClient:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _send_once(self, method: str, path: str, body: bytes | None, content_encoding: str, parse_json: bool) -> Any:
+        headers = {**self.headers, "accept-encoding": "gzip" if self.accept_gzip else "identity"}
+        if body is not None:
+            headers["content-type"] = "application/json"
+            if content_encoding:
+                headers["content-encoding"] = content_encoding
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        t0 = time.perf_counter()
+        try:
+            status, resp_headers, data = self.pool.request(method, path, body=body, headers=headers)
+        except Exception:
+            if self.observer is not None:
+                self.observer.observe_request(method, path, 0, time.perf_counter() - t0, len(body or b""), 0)
+            raise
+        if self.observer is not None:
+            self.observer.observe_request(method, path, status, time.perf_counter() - t0, len(body or b""), len(data))
+        if resp_headers.get("content-encoding", "").strip().lower() == "gzip":
+            data = gzip.decompress(data)
+        raw = data.decode("utf-8", errors="replace").strip()
+        if status in (301, 302, 303, 307, 308):
+            loc = resp_headers.get("location", "")
+            raise ApiError(status, f"redirected to {loc} (point ENKIDU_BASE_URL at the final API origin)")
+        if status >= 400:
+            raise ApiError(status, raw, retry_after=_parse_retry_after(resp_headers.get("retry-after")))
+        if not parse_json:
+            return raw
+        return json.loads(raw) if raw else None
+
+    def _encode_body(self, body_obj: Any, compress: bool) -> tuple[bytes | None, str]:
+        if body_obj is None:
+            return None, ""
+        body = encode_json(body_obj)
+        if compress and self.gzip_min_bytes and len(body) >= self.gzip_min_bytes:
+            # Level 3: ~6x smaller page JSON at under half the CPU of the zlib default (6), which only
+            # shaves another ~15% off; uploads run on the same cores as parsing.
+            return gzip.compress(body, compresslevel=3, mtime=0), "gzip"
+        return body, ""
+
+    @staticmethod
+    def _gzip_suspect(err: BaseException) -> bool:
+        # Older pages.js feeds the (base64) gzip bytes straight to JSON.parse -> 500 "Unexpected token...".
+        # A malformed body fails the same way, so this only means "try the request again uncompressed".
+        if not isinstance(err, ApiError):
+            return False
+        return err.status == 415 or (err.status in (400, 500) and ("JSON" in err.text or "Unexpected token" in err.text))
+
+    def _disable_gzip(self) -> None:
+        if self.gzip_min_bytes:
+            self.gzip_min_bytes = 0
+            print(
+                "WARNING: the backend does not accept gzip request bodies; sending uncompressed "
+                "(redeploy the Netlify Functions to get compressed uploads).",
+                file=sys.stderr,
+            )
+
+    def _is_retryable(self, method: str, err: BaseException) -> bool:
+        if isinstance(err, ApiError):
+            # pages.js reports secret-detection rejections as 500; resending can never succeed.
+            if "possible secret detected" in err.text:
+                return False
+            return err.status in RETRY_STATUSES
+        if isinstance(err, (socket.timeout, TimeoutError)):
+            # The server may have processed a timed-out write; only resend when that is harmless.
+            return method.upper() in IDEMPOTENT_METHODS
+        return isinstance(err, (OSError, http.client.HTTPException))
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        body_obj: Any = None,
+        parse_json: bool = True,
+        compress: bool = False,
+        on_retry: Callable[[int, BaseException, float], None] | None = None,
+    ) -> Any:
+        # Purpose: one logical API call (retries transient failures with exponential backoff + jitter).
+        # The body is serialized once (compact JSON, gzipped if `compress` and big enough) and reused on retries.
+        body, encoding = self._encode_body(body_obj, compress)
+        attempt = 0
+        gzip_suspect = False  # the gzipped body failed like an old backend would; resent uncompressed
+        while True:
+            try:
+                result = self._send_once(method, path, body, encoding, parse_json)
+            except Exception as e:  # noqa: BLE001 - classify below, re-raise the rest
+                if encoding and self._gzip_suspect(e):
+                    # 415 is unambiguous. A JSON parse error may be our body's fault: gzip is only switched
+                    # off if the same request then goes through uncompressed.
+                    if isinstance(e, ApiError) and e.status == 415:
+                        self._disable_gzip()
+                    else:
+                        gzip_suspect = True
+                    body, encoding = self._encode_body(body_obj, False)
+                    continue
+                if attempt >= self.retries or not self._is_retryable(method, e):
+                    raise
+                delay = self.backoff * (2**attempt) * (1 + random.random())
+                if isinstance(e, ApiError) and e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if self.rate_limiter is not None and isinstance(e, ApiError) and e.status == 429:
+                    self.rate_limiter.pause(delay)
+                attempt += 1
+                if self.observer is not None:
+                    self.observer.observe_retry(method, path)
+                if on_retry:
+                    on_retry(attempt, e, delay)
+                time.sleep(delay)
+            else:
+                if gzip_suspect:
+                    self._disable_gzip()
+                return result
+
+
+@dataclass
+class ChunkResult:
+    index: int  # 1-based position in the submitted chunk list
+    size: int
+    ok: bool
+    attempts: int  # HTTP requests made for this chunk (retries and bisection included)
+    seconds: float
+    response: Any = None
+    error: str = ""
+    # With bisect: position in the chunk -> error for pages not written. `rejected` pages failed on their own
+    # (a bad page); `unsent` ones were caught in a failure bisection can't get around (see _bisectable).
+    rejected: dict[int, str] = field(default_factory=dict)
+    unsent: dict[int, str] = field(default_factory=dict)
+
+    def failed_positions(self) -> dict[int, str]:
+        # Every page of the chunk that was not written (all of them unless bisection salvaged some).
+        if self.ok:
+            return {}
+        if self.rejected or self.unsent:
+            return {**self.unsent, **self.rejected}
+        return dict.fromkeys(range(self.size), self.error)
+
+
+def _bisectable(err: BaseException) -> bool:
+    # A smaller request can get past one bad/oversized page (4xx, pages.js 500) or a timeout.
+    if isinstance(err, ApiError):
+        return err.status not in NO_BISECT_STATUSES
+    return isinstance(err, (socket.timeout, TimeoutError))
+
+
+def _bisect(
+    post: Callable[[list[dict[str, Any]]], Any],
+    pages: list[dict[str, Any]],
+    offset: int,
+    err: BaseException,
+    result: ChunkResult,
+) -> None:
+    # `pages` (at `offset` in the chunk) failed with `err`: send each half again, recursively, until the
+    # pages that fail on their own are isolated. A bad page among n costs about 2*log2(n) extra requests.
+    if not _bisectable(err) or result.unsent:
+        # Once the server fails for reasons unrelated to the pages, stop sending the rest of the chunk.
+        result.unsent.update(dict.fromkeys(range(offset, offset + len(pages)), str(err)))
+        return
+    if len(pages) == 1:
+        result.rejected[offset] = str(err)
+        return
+    mid = (len(pages) + 1) // 2
+    for start, part in ((0, pages[:mid]), (mid, pages[mid:])):
+        if result.unsent:
+            _bisect(post, part, offset + start, err, result)
+            continue
+        try:
+            post(part)
+        except Exception as e:  # noqa: BLE001 - classified by _bisectable
+            _bisect(post, part, offset + start, e, result)
+
+
+def _post_chunk(
+    client: EnkiduClient, path: str, idx: int, chunk: list[dict[str, Any]], *, bisect: bool = False
+) -> ChunkResult:
+    attempts = 0
+    started = time.perf_counter()
+
+    def _count_retry(_n: int, _err: BaseException, _delay: float) -> None:
+        nonlocal attempts
+        attempts += 1
+
+    def _post(pages: list[dict[str, Any]]) -> Any:
+        nonlocal attempts
+        attempts += 1
+        return client.request("POST", path, body_obj={"pages": pages}, compress=True, on_retry=_count_retry)
+
+    try:
+        res = _post(chunk)
+        return ChunkResult(idx, len(chunk), True, attempts, time.perf_counter() - started, response=res)
+    except Exception as e:  # noqa: BLE001 - surfaced in the per-chunk result
+        r = ChunkResult(idx, len(chunk), False, attempts, 0.0, error=str(e))
+        if bisect:
+            # Upserts by page id, so resending pages of a chunk that timed out (and may have landed) is harmless.
+            _bisect(_post, chunk, 0, e, r)
+            r.ok = not r.rejected and not r.unsent
+            r.error = "" if r.ok else r.error
+        r.attempts = attempts
+        r.seconds = time.perf_counter() - started
+        return r
+
+
+def upload_chunks_iter(
+    client: EnkiduClient,
+    chunks: Iterable[list[dict[str, Any]]],
+    *,
+    path: str = "/api/pages",
+    concurrency: int = 4,
+    bisect: bool = False,
+) -> Iterator[ChunkResult]:
+    # Streaming variant: pulls chunks lazily (at most `concurrency` in flight) and yields results as they finish.
+    # Never raises for a failed chunk: failures are reported per chunk so callers can decide what to do.
+    # bisect=True splits a failed chunk to write every page that can be written (pages must carry their id).
+    limit = max(1, int(concurrency))
+    with ThreadPoolExecutor(max_workers=limit) as ex:
+        pending: set[Future] = set()
+        for idx, chunk in enumerate(chunks, start=1):
+            pending.add(ex.submit(_post_chunk, client, path, idx, chunk, bisect=bisect))
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        for fut in as_completed(pending):
+            yield fut.result()
+
+
+def upload_chunks(
+    client: EnkiduClient,
+    chunks: list[list[dict[str, Any]]],
+    *,
+    path: str = "/api/pages",
+    concurrency: int = 4,
+    bisect: bool = False,
+    on_result: Callable[[ChunkResult], None] | None = None,
+) -> list[ChunkResult]:
+    # POST each chunk as {pages:[...]} with up to `concurrency` requests in flight.
+    # Results are returned in chunk order; `on_result` is called as each chunk completes.
+    results: list[ChunkResult | None] = [None] * len(chunks)
+    for r in upload_chunks_iter(client, chunks, path=path, concurrency=concurrency, bisect=bisect):
+        results[r.index - 1] = r
+        if on_result:
+            on_result(r)
+    return [r for r in results if r is not None]
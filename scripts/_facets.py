@@ -0,0 +1,365 @@
+"""
+Columnar snapshot of page tags + kv_tags for instant faceting (counts, co-occurrence, drill-downs).
+
+Why: every facet question ("how many pages per journaltitle? per year among these keywords?") is a full
+scan of kv_tags in Postgres, and the Zotero importer stores every BibTeX field there. Here each facet
+field becomes two int32 arrays, one entry per (page, value) pair, sorted by page:
+- rows   page number (0..n-1)
+- codes  the value interned as an integer (index into the field's vocabulary)
+plus `indptr` (CSR row offsets) and each value's number (NaN if not numeric) for range filters. Counts
+are a bincount, filters a boolean page mask, co-occurrence a CSR join: all vectorized, no Python loops
+per page, ~ms at 100k pages. Saved as .npy files and memory-mapped on load.
+
+Field names: `tags` for page tags, the kv_tags key otherwise (`kv.tags` if a kv key is called "tags").
+List values count once per element; `keywords` and `author`/`editor` strings are split (BibTeX packs
+several values into one field). Values longer than `max_value_chars` (abstracts, notes) are not facets.
+
+Requires numpy (optional dependency: the rest of the scripts do not need it).
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import re
+import time
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None  # type: ignore[assignment]
+
+FORMAT_VERSION = 1
+MAX_VALUE_CHARS = 200
+# kv keys holding several values in one string (BibTeX conventions).
+DEFAULT_SPLIT = {
+    "keywords": r"\s*[,;]\s*",
+    "author": r"\s+and\s+",
+    "editor": r"\s+and\s+",
+}
+# A --where clause: field, operator, value ("year>=2015", "keywords=causal mapping|realist", "doi=*").
+_WHERE_RE = re.compile(r"^\s*([^=!<>]+?)\s*(!=|>=|<=|=|>|<)\s*(.*?)\s*$")
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("The facet engine needs numpy: pip install numpy")
+
+
+def value_label(v: Any) -> str:
+    # One display/filter string per value: strings as-is, everything else as compact JSON.
+    if isinstance(v, str):
+        return " ".join(v.split())
+    return json.dumps(v, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _as_number(label: str) -> float:
+    try:
+        x = float(label)
+    except ValueError:
+        return math.nan
+    return x if math.isfinite(x) else math.nan
+
+
+@dataclass
+class Where:
+    field: str
+    op: str  # "=", "!=", ">=", "<=", ">", "<"
+    values: list[str]  # "=" / "!=": any of these ("*" = any value)
+
+    @classmethod
+    def parse(cls, text: str) -> Where:
+        m = _WHERE_RE.match(text)
+        if not m or not m.group(3):
+            raise ValueError(f"Bad filter {text!r} (use field=value, field!=value, field>=number, field=*)")
+        field, op, raw = m.groups()
+        values = [v.strip() for v in raw.split("|")] if op in ("=", "!=") else [raw]
+        if op not in ("=", "!=") and math.isnan(_as_number(raw)):
+            raise ValueError(f"{text!r}: {op} needs a number")
+        return cls(field, op, values)
+
+
+class FacetColumn:
+    def __init__(self, name: str, rows: Any, codes: Any, indptr: Any, numbers: Any, vocab: list[str] | Path):
+        self.name = name
+        self.rows = rows
+        self.codes = codes
+        self.indptr = indptr
+        self.numbers = numbers
+        self._vocab = vocab  # list, or the JSON file to read it from on first use
+
+    @property
+    def vocab(self) -> list[str]:
+        if isinstance(self._vocab, Path):
+            self._vocab = json.loads(self._vocab.read_text(encoding="utf-8"))
+        return self._vocab
+
+    @property
+    def distinct(self) -> int:
+        return int(self.numbers.shape[0])
+
+    def codes_for(self, w: Where) -> Any:
+        # Value codes selected by one clause (before negation).
+        if w.op in ("=", "!="):
+            if "*" in w.values:
+                return np.arange(self.distinct)
+            lookup = {v: i for i, v in enumerate(self.vocab)}
+            return np.array([lookup[v] for v in w.values if v in lookup], dtype=np.int32)
+        x = float(w.values[0])
+        num = self.numbers
+        sel = {">=": num >= x, "<=": num <= x, ">": num > x, "<": num < x}[w.op]
+        return np.nonzero(sel)[0]
+
+    def page_mask(self, codes: Any, n: int) -> Any:
+        mask = np.zeros(n, dtype=bool)
+        if len(codes) == self.distinct:
+            mask[self.rows] = True
+        elif len(codes):
+            mask[self.rows[np.isin(self.codes, codes)]] = True
+        return mask
+
+
+@dataclass
+class FieldInfo:
+    name: str
+    distinct: int
+    pages: int  # pages with at least one value
+
+
+class FacetSnapshot:
+    """All facet columns of one page dump; `ids`/`titles` map page numbers back to pages."""
+
+    def __init__(
+        self,
+        n: int,
+        columns: dict[str, FacetColumn],
+        ids: list[str],
+        titles: list[str],
+        meta: dict[str, Any],
+        pages_file: Path | None = None,
+    ):
+        self.n = n
+        self.columns = columns
+        self.ids = ids
+        self.titles = titles
+        self.meta = meta
+        self._pages_file = pages_file  # ids/titles of a loaded snapshot, read on first drill-down
+
+    # -------------------------
+    # Build / save / load
+    # -------------------------
+
+    @classmethod
+    def build(
+        cls,
+        pages: Iterable[dict[str, Any]],
+        *,
+        split: dict[str, str] | None = None,
+        max_value_chars: int = MAX_VALUE_CHARS,
+        source: str = "",
+    ) -> FacetSnapshot:
+        require_numpy()
+        started = time.perf_counter()
+        splitters = {k: re.compile(v) for k, v in (DEFAULT_SPLIT if split is None else split).items()}
+        rows: dict[str, array] = {}
+        codes: dict[str, array] = {}
+        interned: dict[str, dict[str, int]] = {}
+        ids: list[str] = []
+        titles: list[str] = []
+
+        def add(field: str, row: int, labels: set[str]) -> None:
+            if field not in rows:
+                rows[field], codes[field], interned[field] = array("i"), array("i"), {}
+            table = interned[field]
+            for label in sorted(labels):
+                code = table.setdefault(label, len(table))
+                rows[field].append(row)
+                codes[field].append(code)
+
+        for page in pages:
+            row = len(ids)
+            ids.append(str(page.get("id") or ""))
+            titles.append(str(page.get("title") or ""))
+            tags = {value_label(t) for t in page.get("tags") or []}
+            if tags:
+                add("tags", row, tags)
+            kv = page.get("kv_tags") if isinstance(page.get("kv_tags"), dict) else {}
+            for key, v in kv.items():
+                field = "kv.tags" if key == "tags" else key
+                items = v if isinstance(v, list) else [v]
+                labels: set[str] = set()
+                for item in items:
+                    if isinstance(item, str) and key in splitters:
+                        labels.update(s for s in (" ".join(p.split()) for p in splitters[key].split(item)) if s)
+                    else:
+                        labels.add(value_label(item))
+                labels = {s for s in labels if s and len(s) <= max_value_chars}
+                if labels:
+                    add(field, row, labels)
+
+        n = len(ids)
+        columns: dict[str, FacetColumn] = {}
+        for field in sorted(rows):
+            r = np.frombuffer(rows[field], dtype=np.int32)
+            vocab = list(interned[field])
+            columns[field] = FacetColumn(
+                field,
+                r,
+                np.frombuffer(codes[field], dtype=np.int32),
+                np.searchsorted(r, np.arange(n + 1), side="left").astype(np.int64),
+                np.array([_as_number(v) for v in vocab], dtype=np.float64),
+                vocab,
+            )
+        meta = {"version": FORMAT_VERSION, "pages": n, "source": source, "built_at": time.time(),
+                "build_seconds": round(time.perf_counter() - started, 3)}
+        return cls(n, columns, ids, titles, meta)
+
+    def save(self, root: Path) -> None:
+        # Columns are written next to the old ones, then meta.json switches over (readers never see a mix).
+        root.mkdir(parents=True, exist_ok=True)
+        stamp = str(int(time.time() * 1000))
+        fields = []
+        for i, (name, col) in enumerate(self.columns.items()):
+            base = f"{stamp}-{i}"
+            np.save(root / f"{base}.rows.npy", col.rows)
+            np.save(root / f"{base}.codes.npy", col.codes)
+            np.save(root / f"{base}.indptr.npy", col.indptr)
+            np.save(root / f"{base}.numbers.npy", col.numbers)
+            (root / f"{base}.vocab.json").write_text(json.dumps(col.vocab, ensure_ascii=False), encoding="utf-8")
+            fields.append({"name": name, "file": base})
+        (root / f"{stamp}.pages.json").write_text(
+            json.dumps({"ids": self.ids, "titles": self.titles}, ensure_ascii=False), encoding="utf-8"
+        )
+        tmp = root / "meta.json.tmp"
+        tmp.write_text(json.dumps({**self.meta, "stamp": stamp, "fields": fields}, indent=2), encoding="utf-8")
+        old = _read_meta(root)
+        tmp.replace(root / "meta.json")
+        if old and old.get("stamp") != stamp:
+            for p in root.glob(f"{old['stamp']}*"):
+                p.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, root: Path) -> FacetSnapshot:
+        require_numpy()
+        meta = _read_meta(root)
+        if not meta:
+            raise RuntimeError(f"No facet snapshot in {root} (run build first)")
+        if int(meta.get("version") or 0) != FORMAT_VERSION:
+            raise RuntimeError(f"Facet snapshot in {root} has an old format; run build again")
+        columns = {}
+        for f in meta["fields"]:
+            base = root / f["file"]
+            columns[f["name"]] = FacetColumn(
+                f["name"],
+                np.load(f"{base}.rows.npy", mmap_mode="r"),
+                np.load(f"{base}.codes.npy", mmap_mode="r"),
+                np.load(f"{base}.indptr.npy", mmap_mode="r"),
+                np.load(f"{base}.numbers.npy", mmap_mode="r"),
+                Path(f"{base}.vocab.json"),
+            )
+        return cls(int(meta["pages"]), columns, [], [], meta, root / f"{meta['stamp']}.pages.json")
+
+    def _page_names(self) -> tuple[list[str], list[str]]:
+        if not self.ids and self._pages_file:
+            data = json.loads(self._pages_file.read_text(encoding="utf-8"))
+            self.ids, self.titles = data["ids"], data["titles"]
+        return self.ids, self.titles
+
+    # -------------------------
+    # Queries
+    # -------------------------
+
+    def column(self, field: str) -> FacetColumn:
+        col = self.columns.get(field)
+        if col is None:
+            raise ValueError(f"Unknown field {field!r} (see `fields`)")
+        return col
+
+    def fields(self) -> list[FieldInfo]:
+        out = [
+            FieldInfo(name, col.distinct, int(np.count_nonzero(np.diff(col.indptr))))
+            for name, col in self.columns.items()
+        ]
+        return sorted(out, key=lambda f: (-f.pages, f.name))
+
+    def mask(self, where: Iterable[Where]) -> Any:
+        # Pages matching every clause (None = no filter).
+        out = None
+        for w in where:
+            col = self.column(w.field)
+            m = col.page_mask(col.codes_for(w), self.n)
+            if w.op == "!=":
+                m = ~m
+            out = m if out is None else out & m
+        return out
+
+    def counts(self, field: str, mask: Any = None, *, top: int = 20) -> list[tuple[str, int]]:
+        # Pages per value of `field` (within `mask`), most frequent first.
+        col = self.column(field)
+        codes = col.codes if mask is None else col.codes[mask[col.rows]]
+        return self._top(np.bincount(codes, minlength=col.distinct), top, lambda i: col.vocab[i])
+
+    def cooccurrence(self, field_a: str, field_b: str, mask: Any = None, *, top: int = 20) -> list[tuple[str, str, int]]:
+        # Pages per (value of a, value of b) pair, most frequent first. Within one field, unordered pairs.
+        a, b = self.column(field_a), self.column(field_b)
+        rows, ca = a.rows, a.codes
+        if mask is not None:
+            keep = mask[rows]
+            rows, ca = rows[keep], ca[keep]
+        # CSR join: every (page, a) pair meets each b value of the same page.
+        starts = b.indptr[rows]
+        lens = b.indptr[rows + 1] - starts
+        total = int(lens.sum())
+        if not total:
+            return []
+        offsets = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+        ca = np.repeat(ca, lens).astype(np.int64)
+        cb = b.codes[offsets].astype(np.int64)
+        if field_a == field_b:
+            keep = ca < cb
+            ca, cb = ca[keep], cb[keep]
+        keys = ca * b.distinct + cb
+        if a.distinct * b.distinct <= 4_000_000:
+            counts = np.bincount(keys, minlength=a.distinct * b.distinct)
+            return self._top(counts, top, lambda k: (a.vocab[k // b.distinct], b.vocab[k % b.distinct]))
+        uniq, n = np.unique(keys, return_counts=True)
+        return [(a.vocab[k // b.distinct], b.vocab[k % b.distinct], c) for k, c in self._top_pairs(uniq, n, top)]
+
+    def pages(self, mask: Any = None, *, limit: int = 20) -> tuple[int, list[tuple[str, str]]]:
+        # Drill-down: how many pages match, and the first `limit` of them (id, title).
+        idx = np.arange(self.n) if mask is None else np.nonzero(mask)[0]
+        ids, titles = self._page_names()
+        return int(idx.shape[0]), [(ids[i], titles[i]) for i in idx[:limit].tolist()]
+
+    @staticmethod
+    def _top(counts: Any, top: int, label: Any) -> list[Any]:
+        nz = np.count_nonzero(counts)
+        k = min(max(1, top), int(nz))
+        if not k:
+            return []
+        idx = np.argpartition(-counts, k - 1)[:k] if k < counts.shape[0] else np.arange(counts.shape[0])
+        idx = idx[np.lexsort((idx, -counts[idx]))]
+        out = []
+        for i in idx.tolist():
+            if counts[i]:
+                lab = label(i)
+                out.append((*lab, int(counts[i])) if isinstance(lab, tuple) else (lab, int(counts[i])))
+        return out
+
+    @staticmethod
+    def _top_pairs(keys: Any, counts: Any, top: int) -> list[tuple[int, int]]:
+        k = min(max(1, top), int(counts.shape[0]))
+        idx = np.argpartition(-counts, k - 1)[:k] if k < counts.shape[0] else np.arange(counts.shape[0])
+        idx = idx[np.lexsort((keys[idx], -counts[idx]))]
+        return [(int(keys[i]), int(counts[i])) for i in idx.tolist()]
+
+
+def _read_meta(root: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads((root / "meta.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,78 @@
+"""
+Keyset paging over the incremental listing endpoints, shared by the local indexes and the page archives.
+
+Why: GET /api/pages-export (by updated_at) and GET /api/embeddings (by embedding_updated_at) page the same
+way: `since=<timestamp>,<id>` walks rows oldest first and every response carries `next_cursor`;
+`ids_only=1&after=<id>` lists every page id. The search index, the vector index and pages_archive.py each
+had their own copy of the client side, and the copies had started to drift (one ignored `truncated`, one
+could loop on a response without a cursor). The server side lives in netlify/functions/_query.js.
+"""
+
+from __future__ import annotations
+
+import urllib.parse
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+from _enkidu_api import EnkiduClient
+
+# Re-read this much history on every sync: a slow transaction can commit rows whose timestamp is older
+# than rows we already saw (and embedding_updated_at is stamped before the row is written).
+SYNC_OVERLAP = timedelta(minutes=10)
+
+ZERO_UUID = "00000000-0000-0000-0000-000000000000"
+ID_PAGE_SIZE = 1000  # ids_only cap in pages-export.js / embeddings.js
+
+
+def since_cursor(last_ts: str) -> str:
+    # Cursor for "everything from SYNC_OVERLAP before last_ts on" ("" = from the start, also if unparseable).
+    if not last_ts:
+        return ""
+    try:
+        start = datetime.fromisoformat(last_ts) - SYNC_OVERLAP
+    except ValueError:
+        return ""
+    return f"{start.isoformat()},{ZERO_UUID}"
+
+
+def later(a: str, b: str) -> str:
+    # Later of two ISO timestamps (keeps `a` if `b` is empty or unparseable).
+    if not b:
+        return a
+    if not a:
+        return b
+    try:
+        return b if datetime.fromisoformat(b) > datetime.fromisoformat(a) else a
+    except (TypeError, ValueError):
+        return a
+
+
+def iter_since(
+    client: EnkiduClient, path: str, since: str = "", *, page_size: int, **params: Any
+) -> Iterator[list[dict[str, Any]]]:
+    # One keyset cursor, oldest first: yields each non-empty batch of rows. A short batch ends the walk
+    # unless the server cut it for size (`truncated`); so does a missing or repeated cursor.
+    cursor = since
+    while True:
+        query = {**params, "limit": page_size, **({"since": cursor} if cursor else {})}
+        data = client.request("GET", f"{path}?{urllib.parse.urlencode(query)}") or {}
+        rows = data.get("pages") or []
+        if rows:
+            yield rows
+        next_cursor = str(data.get("next_cursor") or "")
+        if not rows or (len(rows) < page_size and not data.get("truncated")) or not next_cursor or next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+def iter_ids(client: EnkiduClient, path: str, **params: Any) -> Iterator[str]:
+    # Every id the endpoint lists (`ids_only=1`), in id order.
+    after = ""
+    while True:
+        query = {**params, "ids_only": 1, "limit": ID_PAGE_SIZE, **({"after": after} if after else {})}
+        data = client.request("GET", f"{path}?{urllib.parse.urlencode(query)}") or {}
+        ids = data.get("ids") or []
+        yield from ids
+        if len(ids) < ID_PAGE_SIZE:
+            return
+        after = ids[-1]
@@ -0,0 +1,243 @@
+"""
+Run metrics for the import scripts: phase timings, per-request latency histograms, bytes, retries, counts.
+
+Why: when an import is slow, "Bulk upsert i/n" lines don't say whether the time went into parsing,
+paging through existing pages, diffing or the bulk POSTs. RunMetrics collects that in one place and
+writes it as a JSON report (--stats-json) and/or a Prometheus textfile (--prom-textfile) for the
+node_exporter textfile collector, so cron-driven imports can feed dashboards.
+
+Stdlib only; thread-safe (requests are recorded from the upload/backfill worker threads).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+# Request latency histogram buckets (seconds), Prometheus-style upper bounds.
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Counts that are page outcomes (enkidu_import_pages{outcome=...}); every other count is enkidu_import_count{name=...}.
+PAGE_OUTCOMES = ("inserted", "updated", "unchanged", "deleted", "failed", "dead_letters", "duplicate_keys", "secrets_held")
+
+_ID_SEGMENT_RE = re.compile(r"/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I)
+
+
+def route_of(path: str) -> str:
+    # "/api/pages?limit=1000&after=..." -> "/api/pages" (low-cardinality label).
+    return _ID_SEGMENT_RE.sub("/:id", path.split("?", 1)[0])
+
+
+@dataclass
+class RequestStats:
+    count: int = 0
+    errors: int = 0  # status >= 400 or no response
+    seconds_sum: float = 0.0
+    bucket_counts: list[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    statuses: dict[str, int] = field(default_factory=dict)
+    retries: int = 0
+
+
+class RunMetrics:
+    """Collects one run's metrics; pass it to EnkiduClient(observer=...) to record every HTTP request."""
+
+    def __init__(self, job: str):
+        self.job = job
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.requests: dict[tuple[str, str], RequestStats] = {}
+        self.pipeline: list[dict[str, Any]] = []
+        self.exit_code: int | None = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # Wall time of a phase (phases run back to back, except list_existing which overlaps parsing).
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t0
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def set_counts(self, **values: int) -> None:
+        with self._lock:
+            self.counts.update(values)
+
+    def observe_request(self, method: str, path: str, status: int, seconds: float, bytes_sent: int, bytes_received: int) -> None:
+        # status 0 = no response (connection error / timeout).
+        with self._lock:
+            st = self.requests.setdefault((method.upper(), route_of(path)), RequestStats())
+            st.count += 1
+            st.seconds_sum += seconds
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if seconds <= le:
+                    st.bucket_counts[i] += 1
+                    break
+            st.bytes_sent += bytes_sent
+            st.bytes_received += bytes_received
+            key = str(status) if status else "error"
+            st.statuses[key] = st.statuses.get(key, 0) + 1
+            if not status or status >= 400:
+                st.errors += 1
+
+    def observe_retry(self, method: str, path: str) -> None:
+        with self._lock:
+            self.requests.setdefault((method.upper(), route_of(path)), RequestStats()).retries += 1
+
+    def set_pipeline(self, stats: Any) -> None:
+        # Copy of _pipeline.PipelineStats: per-stage items out, first/last output and time spent waiting.
+        self.pipeline = [
+            {
+                "stage": st.name,
+                "items_out": st.items_out,
+                "first_out_s": st.first_out_s,
+                "done_s": st.done_s,
+                "wait_in_s": round(st.wait_in_s, 6),
+                "wait_out_s": round(st.wait_out_s, 6),
+            }
+            for st in stats.stages
+        ]
+
+    # -------------------------
+    # Output
+    # -------------------------
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            requests = []
+            for (method, route), st in sorted(self.requests.items()):
+                cumulative, buckets = 0, {}
+                for le, n in zip(LATENCY_BUCKETS, st.bucket_counts):
+                    cumulative += n
+                    buckets[f"{le:g}"] = cumulative
+                buckets["+Inf"] = st.count
+                requests.append(
+                    {
+                        "method": method,
+                        "route": route,
+                        "count": st.count,
+                        "errors": st.errors,
+                        "retries": st.retries,
+                        "seconds_sum": round(st.seconds_sum, 6),
+                        "latency_buckets": buckets,
+                        "bytes_sent": st.bytes_sent,
+                        "bytes_received": st.bytes_received,
+                        "statuses": dict(sorted(st.statuses.items())),
+                    }
+                )
+            return {
+                "job": self.job,
+                "started_at": self.started_at,
+                "duration_s": round(time.perf_counter() - self._t0, 6),
+                "exit_code": self.exit_code,
+                "phases_s": {k: round(v, 6) for k, v in self.phases.items()},
+                "counts": dict(self.counts),
+                "requests": requests,
+                "pipeline": self.pipeline,
+            }
+
+    def write_json(self, path: Path) -> None:
+        _atomic_write(path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path: Path) -> None:
+        # Textfile-collector format; written atomically so node_exporter never reads half a file.
+        d = self.to_dict()
+        job = _label(self.job)
+        lines: list[str] = []
+
+        def metric(name: str, mtype: str, help_text: str, samples: list[tuple[str, float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {mtype}")
+            for labels, value in samples:
+                lines.append(f"{name}{{{labels}}} {_num(value)}")
+
+        metric("enkidu_import_last_run_timestamp_seconds", "gauge", "Unix time the run started.", [(f'job="{job}"', d["started_at"])])
+        metric("enkidu_import_duration_seconds", "gauge", "Wall time of the whole run.", [(f'job="{job}"', d["duration_s"])])
+        if d["exit_code"] is not None:
+            metric("enkidu_import_exit_code", "gauge", "Exit code of the run (0 = success).", [(f'job="{job}"', d["exit_code"])])
+        metric(
+            "enkidu_import_phase_seconds",
+            "gauge",
+            "Wall time per phase.",
+            [(f'job="{job}",phase="{_label(k)}"', v) for k, v in d["phases_s"].items()],
+        )
+        metric(
+            "enkidu_import_pages",
+            "gauge",
+            "Pages by outcome (inserted, updated, unchanged, deleted, failed...).",
+            [(f'job="{job}",outcome="{k}"', v) for k, v in d["counts"].items() if k in PAGE_OUTCOMES],
+        )
+        other = [(f'job="{job}",name="{_label(k)}"', v) for k, v in d["counts"].items() if k not in PAGE_OUTCOMES]
+        if other:
+            metric("enkidu_import_count", "gauge", "Other run counts (attachments, near-dups, embeddings, sources...).", other)
+
+        hist: list[tuple[str, float]] = []
+        totals: dict[str, list[tuple[str, float]]] = {"sum": [], "count": []}
+        sent: list[tuple[str, float]] = []
+        received: list[tuple[str, float]] = []
+        retries: list[tuple[str, float]] = []
+        statuses: list[tuple[str, float]] = []
+        for r in d["requests"]:
+            base = f'job="{job}",method="{r["method"]}",route="{_label(r["route"])}"'
+            for le, n in r["latency_buckets"].items():
+                hist.append((f'{base},le="{le}"', n))
+            totals["sum"].append((base, r["seconds_sum"]))
+            totals["count"].append((base, r["count"]))
+            sent.append((base, r["bytes_sent"]))
+            received.append((base, r["bytes_received"]))
+            retries.append((base, r["retries"]))
+            statuses.extend((f'{base},status="{s}"', n) for s, n in r["statuses"].items())
+        if hist:
+            name = "enkidu_import_request_duration_seconds"
+            lines.append(f"# HELP {name} API request latency (each attempt, including retried ones).")
+            lines.append(f"# TYPE {name} histogram")
+            lines.extend(f"{name}_bucket{{{labels}}} {_num(v)}" for labels, v in hist)
+            lines.extend(f"{name}_sum{{{labels}}} {_num(v)}" for labels, v in totals["sum"])
+            lines.extend(f"{name}_count{{{labels}}} {_num(v)}" for labels, v in totals["count"])
+            metric("enkidu_import_request_bytes_sent", "gauge", "Request body bytes sent.", sent)
+            metric("enkidu_import_request_bytes_received", "gauge", "Response body bytes received.", received)
+            metric("enkidu_import_request_retries", "gauge", "Requests retried after a transient failure.", retries)
+            metric("enkidu_import_requests", "gauge", "Requests by response status.", statuses)
+        if d["pipeline"]:
+            metric(
+                "enkidu_import_stage_busy_seconds",
+                "gauge",
+                "Time a pipeline stage spent working (not waiting on its neighbours).",
+                [
+                    (f'job="{job}",stage="{_label(st["stage"])}"', max(0.0, (st["done_s"] or 0.0) - st["wait_in_s"] - st["wait_out_s"]))
+                    for st in d["pipeline"]
+                ],
+            )
+        _atomic_write(path, "\n".join(lines) + "\n")
+
+
+def _num(v: float) -> str:
+    # Full precision (":g" would turn a Unix timestamp into 1.79e+09).
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _label(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
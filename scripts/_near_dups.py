@@ -0,0 +1,212 @@
+"""
+Near-duplicate detection for import pipelines (MinHash + LSH, numpy-vectorized).
+
+Why: Zotero libraries and Raindrop exports often hold the same paper/article under different citekeys or
+URLs. Exact keys can't catch that, so every copy gets stored, embedded, and later found (at LLM cost) by
+the dream job. Here each page's title + markdown is reduced to a MinHash signature; LSH banding finds
+candidate pairs in roughly linear time, and candidates are confirmed by their estimated Jaccard similarity.
+
+It runs as a pipeline stage in front of the diff: the first copy seen wins, later copies are recorded
+(and optionally dropped, so they are never uploaded or embedded).
+"""
+
+from __future__ import annotations
+
+import csv
+import re
+import zlib
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from _pipeline import SourceItem, batched
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore[assignment]
+
+NUM_PERM = 128
+BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 Jaccard collide in at least one band with high probability
+_MAX_HASH = (1 << 32) - 1
+SHINGLE = 3  # words per shingle
+# Don't verify against more than this many earlier members of one LSH bucket (boilerplate-only pages).
+_MAX_BUCKET = 64
+# Shingles permuted per step: the (num_perm x slice) uint64 temporaries stay at ~16 MB even for a batch of
+# pages with attachment full text (about a million shingles).
+_SLICE = 1 << 14
+
+# Markdown noise that differs between copies of the same item (link targets, raw Zotero file fields).
+_LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")
+_CODE_SPAN_RE = re.compile(r"`[^`]*`")
+_WORD_RE = re.compile(r"\w+")
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("Near-duplicate detection needs numpy: pip install numpy")
+
+
+def words(text: str) -> list[str]:
+    # Normalized words of a page (markdown link targets / code spans removed).
+    return _WORD_RE.findall(_CODE_SPAN_RE.sub(" ", _LINK_TARGET_RE.sub("]", text)).lower())
+
+
+@dataclass
+class NearDup:
+    key: str  # the later copy
+    kept_key: str  # the first copy seen (what the later copy duplicates)
+    similarity: float  # estimated Jaccard similarity of the two pages
+    title: str
+    kept_title: str
+
+
+@dataclass
+class NearDupReport:
+    checked: int = 0
+    skipped: int = 0  # later copies dropped from the import (mode="skip")
+    skipped_keys: set[str] = field(default_factory=set)  # their keys (still in the source: never delete them)
+    pairs: list[NearDup] = field(default_factory=list)
+
+    def write_csv(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["key", "duplicate_of", "similarity", "title", "duplicate_of_title"])
+            for d in self.pairs:
+                w.writerow([d.key, d.kept_key, f"{d.similarity:.3f}", d.title, d.kept_title])
+
+
+class NearDupIndex:
+    """Streaming MinHash/LSH index: `add_batch` signs a batch at once and reports earlier near-duplicates."""
+
+    def __init__(self, *, threshold: float = 0.8, num_perm: int = NUM_PERM, bands: int = BANDS, seed: int = 1):
+        require_numpy()
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**64, size=(num_perm, 1), dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self._b = rng.integers(0, 2**64, size=(num_perm, 1), dtype=np.uint64, endpoint=False)
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._sigs: list[Any] = []  # one (num_perm,) uint32 row per indexed item
+        self.keys: list[str] = []
+        self.titles: list[str] = []
+        self._word_hash: dict[str, int] = {}
+
+    def _shingles(self, page_words: list[str]) -> Any:
+        # Word 3-grams as uint64 hashes: CRC32 per distinct word (cached), combined per gram in numpy.
+        # CRC32 keeps signatures stable across runs and machines (unlike hash()).
+        cache = self._word_hash
+        for w in set(page_words).difference(cache):
+            cache[w] = zlib.crc32(w.encode("utf-8"))
+        h = np.fromiter(map(cache.__getitem__, page_words), dtype=np.uint64, count=len(page_words))
+        if h.shape[0] < SHINGLE:
+            return h
+        with np.errstate(over="ignore"):
+            return (h[:-2] * np.uint64(0x9E3779B1) + h[1:-1]) * np.uint64(0x85EBCA77) + h[2:]
+
+    def signatures(self, pages_words: list[list[str]]) -> Any:
+        # Purpose: vectorized over the whole batch: permute every shingle hash with every (a, b) pair, then
+        # take the per-item minimum over contiguous segments (np.minimum.reduceat). The shingles of the batch
+        # go through in slices of _SLICE (a page may span several; minimums combine), so memory stays flat.
+        # Repeated shingles don't change a minimum, so there is no need to dedupe them first.
+        # Hash family: multiply-shift, (a*x + b) >> 32 with odd 64-bit a (wrapping uint64 arithmetic is intended).
+        sigs = np.full((len(pages_words), self._a.shape[0]), _MAX_HASH, dtype=np.uint32)
+        grams = [self._shingles(w) for w in pages_words]
+        nonempty = [i for i, g in enumerate(grams) if g.shape[0]]
+        if not nonempty:
+            return sigs
+        flat = np.concatenate([grams[i] for i in nonempty])
+        owner = np.repeat(np.arange(len(nonempty)), [grams[i].shape[0] for i in nonempty])
+        mins = np.full((self._a.shape[0], len(nonempty)), _MAX_HASH, dtype=np.uint64)
+        for lo in range(0, flat.shape[0], _SLICE):
+            part, seg = flat[lo : lo + _SLICE], owner[lo : lo + _SLICE]
+            starts = np.concatenate(([0], np.flatnonzero(seg[1:] != seg[:-1]) + 1))
+            with np.errstate(over="ignore"):
+                permuted = (self._a * part[None, :] + self._b) >> np.uint64(32)
+            cols = seg[starts]
+            mins[:, cols] = np.minimum(mins[:, cols], np.minimum.reduceat(permuted, starts, axis=1))
+        sigs[nonempty] = mins.T.astype(np.uint32)
+        return sigs
+
+    def add_batch(self, keys: list[str], titles: list[str], pages_words: list[list[str]]) -> list[tuple[int, float] | None]:
+        # Returns, per item, (index of the earlier item it duplicates, similarity) or None.
+        # Items are compared with everything added before them, including earlier items of this batch.
+        sigs = self.signatures(pages_words)
+        out: list[tuple[int, float] | None] = []
+        for key, title, sig, pw in zip(keys, titles, sigs, pages_words):
+            best: tuple[int, float] | None = None
+            band_keys = [sig[b * self.rows : (b + 1) * self.rows].tobytes() for b in range(self.bands)]
+            if pw:
+                seen: set[int] = set()
+                for b, bk in enumerate(band_keys):
+                    for j in self._buckets[b].get(bk, ())[:_MAX_BUCKET]:
+                        if j in seen:
+                            continue
+                        seen.add(j)
+                        sim = float(np.count_nonzero(self._sigs[j] == sig)) / sig.shape[0]
+                        if sim >= self.threshold and (best is None or sim > best[1]):
+                            best = (j, sim)
+            out.append(best)
+            idx = len(self.keys)
+            self.keys.append(key)
+            self.titles.append(title)
+            self._sigs.append(sig)
+            if pw and best is None:
+                # Only first copies are indexed, so a cluster always points at the page that was kept.
+                for b, bk in enumerate(band_keys):
+                    self._buckets[b].setdefault(bk, []).append(idx)
+        return out
+
+
+def near_dup_stage(
+    report: NearDupReport, *, skip: bool, threshold: float = 0.8, batch_size: int = 64
+) -> Callable[[Iterator[SourceItem]], Iterator[SourceItem]]:
+    # Pipeline stage (SourceItem -> SourceItem): flag later copies of the same page; with skip=True drop them.
+    # Builds each page once to read its title/markdown; the built page is reused by the diff stage.
+    index = NearDupIndex(threshold=threshold)
+
+    def _stage(items: Iterator[SourceItem]) -> Iterator[SourceItem]:
+        seen_keys: set[str] = set()
+        for batch in batched(items, batch_size):
+            built: list[SourceItem] = []
+            texts: list[list[str]] = []
+            titles: list[str] = []
+            for item in batch:
+                page = item.build()
+                built.append(replace(item, build=lambda page=page: page))
+                titles.append(str(page.get("title") or ""))
+                texts.append(words(titles[-1] + "\n" + str(page.get("content_md") or "")))
+            matches = index.add_batch([it.key for it in built], titles, texts)
+            report.checked += len(built)
+            for item, title, match in zip(built, titles, matches):
+                if match is not None and item.key not in seen_keys:
+                    # (A repeated key is an exact duplicate; the diff stage already handles those.)
+                    j, sim = match
+                    report.pairs.append(
+                        NearDup(key=item.key, kept_key=index.keys[j], similarity=sim, title=title, kept_title=index.titles[j])
+                    )
+                    if skip:
+                        report.skipped += 1
+                        report.skipped_keys.add(item.key)
+                        continue
+                seen_keys.add(item.key)
+                yield item
+
+    return _stage
+
+
+def print_near_dup_summary(report: NearDupReport, report_path: Path | None, *, limit: int = 5) -> None:
+    if not report.pairs:
+        print(f"Near-duplicates: none found among {report.checked} items.")
+        return
+    action = f"{report.skipped} skipped" if report.skipped else "all imported"
+    print(f"Near-duplicates: {len(report.pairs)} of {report.checked} items look like copies of earlier ones ({action}).")
+    for d in report.pairs[:limit]:
+        print(f"- {d.key} ~ {d.kept_key} ({d.similarity:.2f}): {d.title[:100]}")
+    if report_path:
+        report.write_csv(report_path)
+        print(f"Near-duplicate report: {report_path}")
+
@@ -0,0 +1,258 @@
+"""
+Page archives for backups and migrations: gzip-compressed NDJSON, one page per line.
+
+Why: `public.pages` had no export short of a Supabase dump. An archive streams (constant memory to
+write and to read), compresses ~5x, and can be replayed through the bulk POST /api/pages path into any
+backend. Incremental archives hold only pages updated since their base archive, plus the list of
+page ids that existed at the time, so a restore also drops pages deleted in between.
+
+Format (one JSON object per line):
+- {"kind": "header", "format": "enkidu-pages", "version": 1, "archive_id", "created_at", "base_url",
+   "base": null | {"archive_id", "max_updated_at"}, "since": null | "<updated_at>,<id>"}
+- {"kind": "page", "hash": "<sha256 of the content fields>", "page": {...all columns but the embedding}}
+  A page edited while the export ran can appear twice; the later line wins.
+- {"kind": "ids", "ids": [...]}  incremental archives only: every page id on the server (several lines)
+- {"kind": "end", "pages", "ids", "max_updated_at"}  written last; an archive without it is incomplete
+
+Stdlib only.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from _enkidu_api import encode_json
+from _keyset import later
+
+FORMAT = "enkidu-pages"
+VERSION = 1
+SUFFIX = ".ndjson.gz"
+PAGE_FIELDS = ("id", "created_at", "updated_at", "thread_id", "next_page_id", "title", "tags", "kv_tags", "content_md")
+# What a restore must reproduce exactly (timestamps are set by the database and may be formatted differently).
+CONTENT_FIELDS = ("title", "content_md", "tags", "kv_tags", "thread_id", "next_page_id")
+_IDS_PER_LINE = 10_000
+
+
+def page_hash(page: dict[str, Any]) -> str:
+    # Canonical JSON of the content fields; the same function hashes archived and re-read pages.
+    payload = {k: page.get(k) for k in CONTENT_FIELDS}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+@dataclass
+class ArchiveInfo:
+    path: Path
+    archive_id: str
+    created_at: str
+    base_url: str
+    base_id: str  # '' for a full archive
+    since: str
+    complete: bool = False
+    pages: int = 0
+    max_updated_at: str = ""
+
+    @property
+    def incremental(self) -> bool:
+        return bool(self.base_id)
+
+
+class ArchiveWriter:
+    """Writes `<path>.partial`, renamed to `path` only once the end record is written."""
+
+    def __init__(self, path: Path, *, base_url: str, base: ArchiveInfo | None = None, since: str = ""):
+        self.path = path
+        self.archive_id = str(uuid.uuid4())
+        self.pages = 0
+        self.ids = 0
+        self.max_updated_at = base.max_updated_at if base else ""
+        self._tmp = path.with_name(path.name + ".partial")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = gzip.open(self._tmp, "wb", compresslevel=6)
+        self._line(
+            {
+                "kind": "header",
+                "format": FORMAT,
+                "version": VERSION,
+                "archive_id": self.archive_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "base_url": base_url,
+                "base": {"archive_id": base.archive_id, "max_updated_at": base.max_updated_at} if base else None,
+                "since": since or None,
+            }
+        )
+
+    def _line(self, obj: dict[str, Any]) -> int:
+        data = encode_json(obj) + b"\n"
+        self._f.write(data)
+        return len(data)
+
+    def page(self, page: dict[str, Any]) -> int:
+        # Returns the uncompressed bytes written.
+        row = {k: page.get(k) for k in PAGE_FIELDS}
+        self.pages += 1
+        self.max_updated_at = later(self.max_updated_at, str(row.get("updated_at") or ""))
+        return self._line({"kind": "page", "hash": page_hash(row), "page": row})
+
+    def page_ids(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), _IDS_PER_LINE):
+            self._line({"kind": "ids", "ids": ids[i : i + _IDS_PER_LINE]})
+        self.ids += len(ids)
+
+    def finish(self) -> None:
+        self._line({"kind": "end", "pages": self.pages, "ids": self.ids, "max_updated_at": self.max_updated_at or None})
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        # Keep the partial file for inspection; it is never picked up as an archive.
+        self._f.close()
+
+
+def iter_records(path: Path) -> Iterator[dict[str, Any]]:
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_info(path: Path) -> ArchiveInfo:
+    # Header + end record (reads the whole file: gzip can't seek to the end).
+    records = iter_records(path)
+    head = next(records, None)
+    if not head or head.get("kind") != "header" or head.get("format") != FORMAT:
+        raise ValueError(f"{path} is not an Enkidu pages archive")
+    if int(head.get("version") or 0) > VERSION:
+        raise ValueError(f"{path}: archive version {head.get('version')} is newer than this script ({VERSION})")
+    base = head.get("base") or {}
+    info = ArchiveInfo(
+        path=path,
+        archive_id=str(head.get("archive_id") or ""),
+        created_at=str(head.get("created_at") or ""),
+        base_url=str(head.get("base_url") or ""),
+        base_id=str(base.get("archive_id") or ""),
+        since=str(head.get("since") or ""),
+    )
+    for rec in records:
+        if rec.get("kind") == "end":
+            info.complete = True
+            info.pages = int(rec.get("pages") or 0)
+            info.max_updated_at = str(rec.get("max_updated_at") or "")
+    return info
+
+
+def archive_path(directory: Path, *, incremental: bool) -> Path:
+    # Sorts chronologically; full/incremental visible at a glance. Never reuses a name (two runs in one second).
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    kind = "incr" if incremental else "full"
+    path, n = directory / f"pages-{stamp}-{kind}{SUFFIX}", 1
+    while path.exists():
+        n += 1
+        path = directory / f"pages-{stamp}-{kind}-{n}{SUFFIX}"
+    return path
+
+
+def list_archives(directory: Path) -> list[ArchiveInfo]:
+    # Complete archives in a backup directory, oldest first.
+    infos = []
+    for p in sorted(directory.glob(f"*{SUFFIX}")):
+        try:
+            info = read_info(p)
+        except (OSError, ValueError, EOFError):
+            continue
+        if info.complete:
+            infos.append(info)
+    return sorted(infos, key=lambda i: i.created_at)
+
+
+def resolve_chain(paths: Iterable[Path]) -> list[ArchiveInfo]:
+    # Archives to restore, oldest first: a directory means "the newest archive in it, back to its full base";
+    # files are taken as given and must form one chain (full, then each incremental on top of the previous).
+    infos: list[ArchiveInfo] = []
+    for p in paths:
+        if p.is_dir():
+            found = list_archives(p)
+            if not found:
+                raise ValueError(f"No complete archives in {p}")
+            by_id = {i.archive_id: i for i in found}
+            chain = [found[-1]]
+            while chain[-1].incremental:
+                base = by_id.get(chain[-1].base_id)
+                if base is None:
+                    raise ValueError(f"{chain[-1].path.name}: its base archive {chain[-1].base_id} is not in {p}")
+                chain.append(base)
+            infos.extend(reversed(chain))
+        else:
+            info = read_info(p)
+            if not info.complete:
+                raise ValueError(f"{p} is incomplete (the export did not finish)")
+            infos.append(info)
+    if not infos:
+        raise ValueError("Nothing to restore")
+    if infos[0].incremental:
+        raise ValueError(f"{infos[0].path.name} is incremental; start with its full archive")
+    for prev, cur in zip(infos, infos[1:]):
+        if cur.base_id != prev.archive_id:
+            raise ValueError(f"{cur.path.name} is not based on {prev.path.name}")
+    return infos
+
+
+@dataclass
+class RestorePlan:
+    chain: list[ArchiveInfo]
+    # page id -> (archive index, line number, content hash) of the version to restore
+    winners: dict[str, tuple[int, int, str]] = field(default_factory=dict)
+    linked: int = 0  # pages with a next_page_id (written twice: the link target may come later)
+
+    def __len__(self) -> int:
+        return len(self.winners)
+
+
+def plan_restore(chain: list[ArchiveInfo]) -> RestorePlan:
+    # First pass: the newest version of every page (later archive, then later line, wins), limited to the
+    # ids the newest archive says exist. Memory: one small tuple per page, no content.
+    plan = RestorePlan(chain=chain)
+    live: set[str] | None = None
+    links: set[str] = set()
+    for ai, info in enumerate(chain):
+        ids: set[str] = set()
+        for ln, rec in enumerate(iter_records(info.path)):
+            kind = rec.get("kind")
+            if kind == "page":
+                page = rec["page"]
+                plan.winners[page["id"]] = (ai, ln, str(rec.get("hash") or ""))
+                if page.get("next_page_id"):
+                    links.add(page["id"])
+                else:
+                    links.discard(page["id"])
+            elif kind == "ids":
+                ids.update(rec.get("ids") or [])
+        if info.incremental:
+            live = ids
+        else:
+            live = None  # a full archive: exactly its own pages
+            plan.winners = {k: v for k, v in plan.winners.items() if v[0] == ai}
+    if live is not None:
+        plan.winners = {k: v for k, v in plan.winners.items() if k in live}
+    plan.linked = len(links & plan.winners.keys())
+    return plan
+
+
+def iter_restore_pages(plan: RestorePlan, *, linked_only: bool = False) -> Iterator[dict[str, Any]]:
+    # Second pass: stream the winning version of each page (in archive order).
+    for ai, info in enumerate(plan.chain):
+        for ln, rec in enumerate(iter_records(info.path)):
+            if rec.get("kind") != "page":
+                continue
+            page = rec["page"]
+            w = plan.winners.get(page["id"])
+            if w and w[0] == ai and w[1] == ln and (page.get("next_page_id") or not linked_only):
+                yield page
@@ -0,0 +1,597 @@
+"""
+Small streaming pipeline for the import scripts (threads + bounded queues, stdlib only).
+
+Why: importers used to run strictly in phases (parse everything -> list existing -> diff -> upload),
+so the network idled while we parsed and the CPU idled while we uploaded. Here each stage runs in its
+own thread and hands items downstream through a bounded queue, so uploads start as soon as the first
+chunk is ready and only a few batches are ever in memory between stages.
+
+A stage is a generator transform: `fn(items: Iterator[A]) -> Iterable[B]` (map, filter, batch and
+flat-map are all just generators). Page-import stages shared by the Zotero and Raindrop sources live
+at the bottom of this file.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator
+
+from _enkidu_api import (
+    DEFAULT_CHUNK_BYTES,
+    MAX_BULK_PAGES,
+    ApiError,
+    ChunkResult,
+    EnkiduClient,
+    encode_json,
+    upload_chunks_iter,
+)
+
+# -------------------------
+# Framework
+# -------------------------
+
+_END = object()
+
+
+class _Failure:
+    # Carries an upstream exception to downstream stages (re-raised where it is consumed).
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class ListingError(RuntimeError):
+    # The existing-pages listing cannot be trusted (old backend, looping cursor); callers must not write.
+    pass
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Iterator[Any]], Iterable[Any]]
+    batch_size: int | None = None  # items per hand-off downstream (default: run_pipeline's batch_size)
+
+
+@dataclass
+class StageStats:
+    name: str
+    items_out: int = 0
+    first_out_s: float | None = None  # seconds after pipeline start
+    done_s: float | None = None
+    wait_in_s: float = 0.0  # blocked waiting for upstream
+    wait_out_s: float = 0.0  # blocked on a full downstream queue
+
+
+@dataclass
+class PipelineStats:
+    started: float = field(default_factory=time.perf_counter)
+    stages: list[StageStats] = field(default_factory=list)
+
+    def summary(self) -> str:
+        parts = []
+        for st in self.stages:
+            first = f"{st.first_out_s:.2f}s" if st.first_out_s is not None else "-"
+            done = f"{st.done_s:.2f}s" if st.done_s is not None else "-"
+            parts.append(f"{st.name}: {st.items_out} out (first {first}, done {done})")
+        return "; ".join(parts)
+
+
+def batched_by_size(
+    items: Iterable[Any], size_of: Callable[[Any], int], *, max_bytes: int, max_items: int
+) -> Iterator[list[Any]]:
+    # Purpose: group items so each batch stays under a byte budget (and an item cap).
+    # An item bigger than the whole budget travels alone rather than being dropped.
+    buf: list[Any] = []
+    used = 0
+    for it in items:
+        n = size_of(it)
+        if buf and (used + n > max_bytes or len(buf) >= max_items):
+            yield buf
+            buf, used = [], 0
+        buf.append(it)
+        used += n
+    if buf:
+        yield buf
+
+
+def batched(items: Iterable[Any], n: int) -> Iterator[list[Any]]:
+    buf: list[Any] = []
+    for it in items:
+        buf.append(it)
+        if len(buf) >= n:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def process_map(
+    fn: Callable[[list[Any]], list[Any]],
+    items: Iterable[Any],
+    *,
+    workers: int,
+    batch_size: int = 128,
+    executor: ProcessPoolExecutor | None = None,
+) -> Iterator[Any]:
+    # Purpose: run a CPU-bound batch transform on every core, for use inside a stage.
+    # `fn(batch) -> results` must be a module-level function with picklable inputs/outputs. Batches are
+    # yielded back in submission order, so the output is identical to the serial `workers=1` path.
+    # `executor`: a pool shared with other stages (e.g. several sources at once); left running afterwards.
+    if workers <= 1 and executor is None:
+        for batch in batched(items, batch_size):
+            yield from fn(batch)
+        return
+    # spawn, not fork: the importer process already has pipeline and HTTP threads running.
+    ex = executor or ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending: deque[Future] = deque()
+        for batch in batched(items, batch_size):
+            pending.append(ex.submit(fn, batch))
+            # Keep every worker busy with one batch queued behind it; bounds memory like the stage queues.
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        if executor is None:
+            ex.shutdown(wait=True, cancel_futures=True)
+        else:
+            for fut in pending:
+                fut.cancel()
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: list[Stage],
+    *,
+    queue_size: int = 4,
+    batch_size: int = 256,
+    stats: PipelineStats | None = None,
+) -> Iterator[Any]:
+    # Purpose: run source + stages concurrently; yields the last stage's outputs in the caller's thread.
+    # Items cross thread boundaries in small batches (cheaper than one queue op per item); a stage flushes
+    # early whenever its input queue is empty, so a slow upstream never holds back finished items.
+    stats = stats or PipelineStats()
+    stop = threading.Event()
+    all_stages = [Stage("source", lambda _items: source), *stages]
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in all_stages]
+
+    def _put(q: queue.Queue, item: Any) -> None:
+        while True:
+            if stop.is_set():
+                raise PipelineCancelled()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(q: queue.Queue) -> Any:
+        while True:
+            if stop.is_set():
+                raise PipelineCancelled()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _run_stage(idx: int) -> None:
+        stage = all_stages[idx]
+        st = stats.stages[idx]
+        q_in = queues[idx - 1] if idx > 0 else None
+        q_out = queues[idx]
+        flush_at = stage.batch_size or batch_size
+        buf: list[Any] = []
+
+        def _flush() -> None:
+            nonlocal buf
+            if buf:
+                t0 = time.perf_counter()
+                _put(q_out, buf)
+                st.wait_out_s += time.perf_counter() - t0
+                buf = []
+
+        def _inputs() -> Iterator[Any]:
+            if q_in is None:
+                return
+            while True:
+                if q_in.empty():
+                    _flush()
+                t0 = time.perf_counter()
+                batch = _get(q_in)
+                st.wait_in_s += time.perf_counter() - t0
+                if batch is _END:
+                    return
+                if isinstance(batch, _Failure):
+                    raise batch.exc
+                yield from batch
+
+        try:
+            for out in stage.fn(_inputs()):
+                if st.first_out_s is None:
+                    st.first_out_s = time.perf_counter() - stats.started
+                st.items_out += 1
+                buf.append(out)
+                if len(buf) >= flush_at:
+                    _flush()
+            _flush()
+            st.done_s = time.perf_counter() - stats.started
+            _put(q_out, _END)
+        except PipelineCancelled:
+            return
+        except BaseException as e:  # noqa: BLE001 - forwarded downstream and re-raised by the consumer
+            try:
+                _put(q_out, _Failure(e))
+            except PipelineCancelled:
+                return
+
+    stats.stages = [StageStats(s.name) for s in all_stages]
+    threads = [
+        threading.Thread(target=_run_stage, args=(i,), name=f"pipeline-{s.name}", daemon=True)
+        for i, s in enumerate(all_stages)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            batch = _get(queues[-1])
+            if batch is _END:
+                break
+            if isinstance(batch, _Failure):
+                raise batch.exc
+            yield from batch
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=5)
+
+
+# -------------------------
+# Page import stages (shared by source adapters)
+# -------------------------
+
+
+@dataclass
+class SourceItem:
+    # One record from a source (BibTeX entry, Raindrop link...), before we know whether it must be written.
+    key: str  # stable identity within the source (stored in kv_tags[key_field])
+    source_hash: str  # changes whenever the page must be rewritten (stored in kv_tags[hash_field])
+    new_id: str  # deterministic page id used when inserting
+    build: Callable[[], dict[str, Any]]  # -> {title, content_md, tags, kv_tags}; only called if needed
+
+
+@dataclass
+class PlannedPage:
+    key: str
+    source_hash: str
+    is_new: bool
+    page: dict[str, Any]
+
+
+@dataclass
+class SyncPlan:
+    # Filled in by the stages while the pipeline runs.
+    inserts: int = 0
+    updates: int = 0
+    unchanged: int = 0
+    duplicates: int = 0  # repeated keys within the source (first one wins)
+    seen_keys: set[str] = field(default_factory=set)
+    server_duplicates: set[str] = field(default_factory=set)  # keys several server pages share (remote diff)
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    # How a source's pages are identified on the server.
+    kv_key: str  # e.g. "source"
+    kv_value: str  # e.g. "zotero"
+    key_field: str  # e.g. "zotero_citekey"
+    hash_field: str  # e.g. "zotero_source_hash"
+
+    def filter_qs(self) -> str:
+        return f"kv_key={urllib.parse.quote(self.kv_key)}&kv_value={urllib.parse.quote(self.kv_value)}"
+
+
+def stable_page_id(namespace: uuid.UUID, name: str) -> str:
+    return str(uuid.uuid5(namespace, name))
+
+
+def _first_sighting(item: SourceItem, plan: SyncPlan) -> bool:
+    # Same key twice would upsert the same row twice in one request (Postgres rejects that).
+    if item.key in plan.seen_keys:
+        plan.duplicates += 1
+        return False
+    plan.seen_keys.add(item.key)
+    return True
+
+
+def _plan_item(item: SourceItem, prev: tuple[str, str] | None, plan: SyncPlan) -> PlannedPage | None:
+    # insert (no prev), update (hash differs) or unchanged (None).
+    if prev and prev[1].strip() == item.source_hash:
+        plan.unchanged += 1
+        return None
+    page = item.build()
+    page["id"] = prev[0] if prev else item.new_id
+    if prev:
+        plan.updates += 1
+    else:
+        plan.inserts += 1
+    return PlannedPage(key=item.key, source_hash=item.source_hash, is_new=not prev, page=page)
+
+
+def diff_stage(existing: Future, plan: SyncPlan) -> Callable[[Iterator[SourceItem]], Iterator[PlannedPage]]:
+    # Purpose: classify items as insert/update/unchanged against `existing` (key -> (page id, hash)).
+    # `existing` is a Future so listing the server can overlap with parsing; we only block on the first item.
+    def _stage(items: Iterator[SourceItem]) -> Iterator[PlannedPage]:
+        known: dict[str, tuple[str, str]] | None = None
+        for item in items:
+            if known is None:
+                known = existing.result()
+            if not _first_sighting(item, plan):
+                continue
+            pp = _plan_item(item, known.get(item.key), plan)
+            if pp:
+                yield pp
+
+    return _stage
+
+
+# Server cap on items per POST /api/pages-diff (every item may come back, and PostgREST returns <= 1000 rows).
+MAX_DIFF_ITEMS = 1000
+
+
+def _diff_body(spec: SourceSpec, items: list[SourceItem]) -> dict[str, Any]:
+    return {
+        "kv_key": spec.kv_key,
+        "kv_value": spec.kv_value,
+        "key_field": spec.key_field,
+        "hash_field": spec.hash_field,
+        "items": [{"key": it.key, "hash": it.source_hash, "id": it.new_id} for it in items],
+    }
+
+
+def supports_remote_diff(client: EnkiduClient, spec: SourceSpec) -> bool:
+    # Purpose: probe POST /api/pages-diff once (older backends answer 404) before relying on it.
+    try:
+        data = client.request("POST", "/api/pages-diff", body_obj=_diff_body(spec, []))
+    except ApiError as e:
+        if e.status in (404, 405):
+            return False
+        raise
+    return isinstance(data, dict) and "changed" in data
+
+
+def diff_with_server(
+    client: EnkiduClient, spec: SourceSpec, items: list[SourceItem]
+) -> tuple[dict[str, tuple[str, str] | None], set[str]]:
+    # One POST /api/pages-diff for <= MAX_DIFF_ITEMS items. We send (key, hash, expected id) and get back only
+    # the keys where the server disagrees: key -> (page id, stored hash), or None if no page has that key.
+    # Keys that don't come back exist with exactly that id and hash. Second value: keys several pages share.
+    data = client.request("POST", "/api/pages-diff", body_obj=_diff_body(spec, items), compress=True)
+    if not isinstance(data, dict) or not isinstance(data.get("changed"), list):
+        raise ListingError(f"unexpected POST /api/pages-diff response: {str(data)[:200]!r}")
+    changed: dict[str, tuple[str, str] | None] = {}
+    for row in data["changed"]:
+        page_id = str(row.get("id") or "").strip()
+        changed[str(row.get("key"))] = (page_id, str(row.get("hash") or "")) if page_id else None
+    return changed, {str(k) for k in data.get("duplicates") or []}
+
+
+def remote_diff_stage(
+    client: EnkiduClient,
+    spec: SourceSpec,
+    plan: SyncPlan,
+    *,
+    on_known: Callable[[list[tuple[str, str, str]]], None] | None = None,
+    confirmed: Future | None = None,
+) -> Callable[[Iterator[SourceItem]], Iterator[PlannedPage]]:
+    # Purpose: diff_stage without the full listing: ask the server about each batch of keys instead, so a
+    # sync moves ~100 bytes per record up and only the changed keys down. on_known(rows) receives
+    # (key, page id, hash) for every key of the batch that exists on the server (e.g. to seed local state).
+    # confirmed (Future of key -> (page id, hash)): keys already known to be on the server with that hash
+    # (e.g. acked by an interrupted run) count as unchanged without asking.
+    def _stage(items: Iterator[SourceItem]) -> Iterator[PlannedPage]:
+        local: dict[str, tuple[str, str]] = confirmed.result() if confirmed else {}
+
+        def _ask(item: SourceItem) -> bool:
+            prev = local.get(item.key)
+            if prev and prev[1].strip() and prev[1].strip() == item.source_hash:
+                plan.unchanged += 1
+                return False
+            return True
+
+        fresh = (item for item in items if _first_sighting(item, plan) and _ask(item))
+        for batch in batched(fresh, MAX_DIFF_ITEMS):
+            changed, duplicates = diff_with_server(client, spec, batch)
+            plan.server_duplicates |= duplicates
+            prevs = [changed[it.key] if it.key in changed else (it.new_id, it.source_hash) for it in batch]
+            if on_known:
+                on_known([(it.key, prev[0], prev[1]) for it, prev in zip(batch, prevs) if prev])
+            for item, prev in zip(batch, prevs):
+                pp = _plan_item(item, prev, plan)
+                if pp:
+                    yield pp
+
+    return _stage
+
+
+def merge_kv_stage(client: EnkiduClient) -> Callable[[Iterator[list[PlannedPage]]], Iterator[list[PlannedPage]]]:
+    # Purpose: for updates, merge our kv_tags over the server copy so user-added keys survive.
+    def _stage(chunks: Iterator[list[PlannedPage]]) -> Iterator[list[PlannedPage]]:
+        for chunk in chunks:
+            updates = [pp for pp in chunk if not pp.is_new]
+            if updates:
+                server_kv = fetch_kv_tags_by_id(client, [pp.page["id"] for pp in updates])
+                for pp in updates:
+                    merged = dict(server_kv.get(pp.page["id"]) or {})
+                    merged.update(pp.page["kv_tags"])
+                    pp.page["kv_tags"] = merged
+            yield chunk
+
+    return _stage
+
+
+def upload_stage(
+    client: EnkiduClient,
+    *,
+    concurrency: int,
+    before_upload: Callable[[int, list[PlannedPage]], None] | None = None,
+) -> Callable[[Iterator[list[PlannedPage]]], Iterator[tuple[list[PlannedPage], ChunkResult]]]:
+    # Purpose: bulk upsert chunks as they arrive (several in flight); yields (chunk, result) as they finish.
+    # before_upload(index, chunk) runs as each chunk is handed to a sender (index == ChunkResult.index).
+    # A failed chunk is bisected, so one bad page only costs itself (result.failed_positions() lists the rest).
+    def _stage(chunks: Iterator[list[PlannedPage]]) -> Iterator[tuple[list[PlannedPage], ChunkResult]]:
+        by_index: dict[int, list[PlannedPage]] = {}
+
+        def _bodies() -> Iterator[list[dict[str, Any]]]:
+            # Pulled lazily by upload_chunks_iter, one chunk per free sender slot.
+            for i, chunk in enumerate(chunks, start=1):
+                by_index[i] = chunk
+                if before_upload:
+                    before_upload(i, chunk)
+                yield [pp.page for pp in chunk]
+
+        for r in upload_chunks_iter(client, _bodies(), concurrency=concurrency, bisect=True):
+            yield by_index.pop(r.index), r
+
+    return _stage
+
+
+def settle_chunk(
+    chunk: list[PlannedPage], r: ChunkResult
+) -> tuple[list[PlannedPage], list[PlannedPage], list[tuple[PlannedPage, str]]]:
+    # Split an upload result into (pages written, pages to send again, pages refused on their own + error).
+    lost = r.failed_positions()
+    written = [pp for i, pp in enumerate(chunk) if i not in lost]
+    retry = [chunk[i] for i in sorted(lost) if i not in r.rejected]
+    return written, retry, [(chunk[i], err) for i, err in sorted(r.rejected.items())]
+
+
+def list_existing_pages(client: EnkiduClient, spec: SourceSpec) -> tuple[dict[str, tuple[str, str]], set[str]]:
+    # Build a compact map of a source's existing pages: key -> (page id, source hash).
+    # Streams through every page with keyset cursors and a column projection, so memory/transfer
+    # stay flat however large the library gets (no content_md, no full kv_tags).
+    # Note: GET /api/pages returns newest first, so we keep the first page for any duplicate key.
+    existing: dict[str, tuple[str, str]] = {}
+    duplicates: set[str] = set()
+
+    # Keep <= the PostgREST row cap (1000): a short page means we reached the end.
+    PAGE_SIZE = 1000
+    columns = ["id", "created_at", f"kv_tags->>{spec.key_field}"]
+    if spec.hash_field != spec.key_field:
+        columns.append(f"kv_tags->>{spec.hash_field}")
+    select = ",".join(columns)
+    cursor = ""
+
+    while True:
+        data = client.request(
+            "GET",
+            f"/api/pages?limit={PAGE_SIZE}&select={urllib.parse.quote(select, safe=',')}"
+            + (f"&after={urllib.parse.quote(cursor, safe='')}" if cursor else "")
+            + f"&{spec.filter_qs()}",
+        )
+        if not isinstance(data, dict) or "next_cursor" not in data:
+            raise ListingError(
+                "backend does not support keyset pagination (GET /api/pages returned no next_cursor).\n"
+                "You likely need to redeploy the updated Netlify Functions (or point ENKIDU_BASE_URL at your local netlify dev).\n"
+                "Refusing to continue to avoid creating duplicates / partial purges."
+            )
+        pages = data.get("pages") or []
+        for page in pages:
+            key = page.get(spec.key_field)
+            page_id = str(page.get("id") or "").strip()
+            if isinstance(key, str) and key.strip() and page_id:
+                key = key.strip()
+                if key in existing:
+                    duplicates.add(key)
+                    continue
+                existing[key] = (page_id, str(page.get(spec.hash_field) or ""))
+
+        next_cursor = str(data.get("next_cursor") or "")
+        if len(pages) < PAGE_SIZE or not next_cursor:
+            break
+        if next_cursor == cursor:
+            raise ListingError("backend returned the same cursor twice; refusing to loop forever.")
+        cursor = next_cursor
+
+    return existing, duplicates
+
+
+def fetch_kv_tags_by_id(client: EnkiduClient, page_ids: list[str]) -> dict[str, dict[str, Any]]:
+    # Purpose: re-read current kv_tags for just the pages we are about to update.
+    out: dict[str, dict[str, Any]] = {}
+    for batch in batched(page_ids, 100):
+        data = client.request("GET", f"/api/pages?light=1&limit={len(batch)}&ids={','.join(batch)}")
+        for page in (data or {}).get("pages", []) or []:
+            pid = str(page.get("id") or "").strip()
+            if pid:
+                out[pid] = page.get("kv_tags") or {}
+    return out
+
+
+def delete_pages(client: EnkiduClient, spec: SourceSpec, page_ids: list[str]) -> int:
+    # Purpose: delta-sync deletes as batched id-list requests (restricted to the source's pages server-side too).
+    # Keep batches well under the 500-id server cap so the URL stays short.
+    deleted = 0
+    batches = list(batched(page_ids, 100))
+    for idx, batch in enumerate(batches, start=1):
+        res = client.request("DELETE", f"/api/pages?confirm=1&{spec.filter_qs()}&ids={','.join(batch)}") or {}
+        deleted += int(res.get("deleted") or 0) if isinstance(res, dict) else 0
+        print(f"Delete {idx}/{len(batches)}: removed {len(batch)} pages...")
+    return deleted
+
+
+def _page_json_bytes(pp: PlannedPage) -> int:
+    # Compact JSON size of one page inside {"pages":[...]} (+1 for the separating comma).
+    return len(encode_json(pp.page)) + 1
+
+
+def page_import_stages(
+    client: EnkiduClient,
+    existing: Future | None,
+    plan: SyncPlan,
+    *,
+    remote_diff: SourceSpec | None = None,
+    on_known: Callable[[list[tuple[str, str, str]]], None] | None = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    chunk_pages: int = MAX_BULK_PAGES,
+    concurrency: int = 4,
+    before_upload: Callable[[int, list[PlannedPage]], None] | None = None,
+    screen: Callable[[Iterator[PlannedPage]], Iterator[PlannedPage]] | None = None,
+) -> list[Stage]:
+    # The standard SourceItem -> server chain: diff -> (screen) -> chunk -> merge kv -> upload.
+    # The diff runs against `existing` (listing Future), or asks the server per batch if remote_diff is set
+    # (then only about the keys `existing` does not already confirm; usually it is empty).
+    # Chunks are cut by JSON size, not page count: 500 stub entries and 40 pages of pasted full text both
+    # make one request. merge_kv can add a few server-side kv_tags later, hence the headroom below 6 MB.
+    # before_upload(index, chunk) runs just before each chunk is sent (e.g. to journal it).
+    # screen (PlannedPage -> PlannedPage) can hold pages back before they are chunked (see _secret_scan.py).
+    return [
+        Stage(
+            "diff",
+            remote_diff_stage(client, remote_diff, plan, on_known=on_known, confirmed=existing)
+            if remote_diff
+            else diff_stage(existing, plan),
+        ),
+        *([Stage("screen", screen)] if screen else []),
+        Stage(
+            "chunk",
+            lambda items: batched_by_size(
+                items, _page_json_bytes, max_bytes=chunk_bytes, max_items=min(chunk_pages, MAX_BULK_PAGES)
+            ),
+        ),
+        Stage("merge_kv", merge_kv_stage(client)),
+        # One result per hand-off: the consumer acknowledges (journals) each chunk as soon as it lands.
+        Stage("upload", upload_stage(client, concurrency=concurrency, before_upload=before_upload), batch_size=1),
+    ]
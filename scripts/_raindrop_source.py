@@ -0,0 +1,130 @@
+"""
+Raindrop HTML export as a pipeline source (mirrors scripts/import_raindrop_html_to_pages.mjs).
+
+One page per link that has at least one note block (<DD><blockquote>...</blockquote>):
+- title: the link title
+- content_md: "[title](href)" + the note text(s)
+- kv_tags: { source: "raindrop", spaced_repetition: 5, raindrop_import_id: sha1(href + "\\n---\\n" + notes) }
+
+The import id is content-derived, so it is both the key and the change hash: an edited note is a new page,
+exactly like the Node importer.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from _pipeline import SourceItem, SourceSpec, stable_page_id
+
+RAINDROP_SOURCE = SourceSpec(
+    kv_key="source",
+    kv_value="raindrop",
+    key_field="raindrop_import_id",
+    hash_field="raindrop_import_id",
+)
+
+_PAGE_ID_NAMESPACE = uuid.UUID("5d2b3c51-3f0e-5f7a-8c61-9e4a7b0d2f13")
+
+LINK_RE = re.compile(r'<DT><A\b[^>]*HREF="([^"]+)"[^>]*>([\s\S]*?)</A>', re.IGNORECASE)
+NOTE_START_RE = re.compile(r"<DD><blockquote\b[^>]*>([\s\S]*)", re.IGNORECASE)
+NOTE_END_RE = re.compile(r"</blockquote>", re.IGNORECASE)
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_NUM_ENTITY_RE = re.compile(r"&#(\d+);")
+_ENTITIES = {"&amp;": "&", "&lt;": "<", "&gt;": ">", "&quot;": '"', "&#39;": "'"}
+_NAMED_ENTITY_RE = re.compile("|".join(map(re.escape, _ENTITIES)))
+
+
+def _decode_entities(s: str) -> str:
+    # Same minimal decoding as the Node importer (not html.unescape: that decodes far more).
+    s = _NAMED_ENTITY_RE.sub(lambda m: _ENTITIES[m.group(0)], s or "")
+
+    def _num(m: re.Match[str]) -> str:
+        try:
+            cp = int(m.group(1))
+            # Lone surrogates cannot be encoded; Node turns them into U+FFFD when hashing/sending.
+            return "\ufffd" if 0xD800 <= cp <= 0xDFFF else chr(cp)
+        except (ValueError, OverflowError):
+            return m.group(0)
+
+    return _NUM_ENTITY_RE.sub(_num, s)
+
+
+def _html_to_text(fragment: str) -> str:
+    stripped = _TAG_RE.sub("", _BR_RE.sub("\n", fragment or ""))
+    return _decode_entities(stripped).replace("\r\n", "\n").strip()
+
+
+def raindrop_import_id(href: str, note_text: str) -> str:
+    return hashlib.sha1(f"{href}\n---\n{note_text}".encode("utf-8")).hexdigest()
+
+
+def _item(href: str, title: str, notes: list[str]) -> SourceItem | None:
+    note_text = "\n\n".join(notes).strip()
+    if not href or not title or not note_text:
+        return None
+    import_id = raindrop_import_id(href, note_text)
+
+    def _build() -> dict[str, Any]:
+        return {
+            "title": title,
+            "content_md": f"[{title}]({href})\n\n{note_text}",
+            "tags": [],
+            "kv_tags": {"source": "raindrop", "spaced_repetition": 5, "raindrop_import_id": import_id},
+        }
+
+    return SourceItem(
+        key=import_id,
+        source_hash=import_id,
+        new_id=stable_page_id(_PAGE_ID_NAMESPACE, f"raindrop:{import_id}"),
+        build=_build,
+    )
+
+
+def iter_raindrop_items(lines: Iterable[str]) -> Iterator[SourceItem]:
+    # Streaming: only the current link and its notes are held in memory.
+    it = iter(lines)
+    href = title = ""
+    notes: list[str] = []
+    for line in it:
+        line = line.rstrip("\r\n")
+        m = LINK_RE.search(line)
+        if m:
+            # New link starts: emit the previous link's accumulated notes as ONE page.
+            item = _item(href, title, notes)
+            if item:
+                yield item
+            href, title, notes = m.group(1), _decode_entities(m.group(2)).strip(), []
+            continue
+
+        start = NOTE_START_RE.search(line)
+        if not start or not href or not title:
+            continue
+
+        # Capture until </blockquote> (may span multiple lines).
+        parts = [start.group(1)]
+        while not NOTE_END_RE.search(parts[-1]):
+            nxt = next(it, None)
+            if nxt is None:
+                break
+            parts.append(nxt.rstrip("\r\n"))
+        note_html = "\n".join(parts)
+        end = NOTE_END_RE.search(note_html)
+        if end:
+            note_html = note_html[: end.start()]
+        text = _html_to_text(note_html)
+        if text:
+            notes.append(text)
+
+    item = _item(href, title, notes)
+    if item:
+        yield item
+
+
+def iter_raindrop_file(path: Path) -> Iterator[SourceItem]:
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        yield from iter_raindrop_items(f)
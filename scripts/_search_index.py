@@ -0,0 +1,383 @@
+"""
+Local full-text index over pages (SQLite FTS5), for keyword search without a network.
+
+Why: keyword recall goes to Postgres on every query (`q=` is an ilike scan unless the query is written to
+match the `pages_content_fts_idx` expression), and nothing works offline. Here we mirror title, content_md,
+tags and kv_tags into one SQLite file:
+- pages       page id, timestamps, thread, tags/kv_tags as JSON (the filters of GET /api/pages)
+- pages_fts   FTS5 table over title, content_md, tags, kv_tags (unicode61, diacritics folded, 2/3-char
+              prefix indexes), ranked with bm25 weighted towards titles and tags
+- meta        sync cursor, base url
+
+Sync is incremental by `updated_at` (GET /api/pages-export). Search takes the same parameters as
+GET /api/pages (q, tag, thread_id, kv_key/kv_value, ids, limit, offset); `q` becomes a phrase whose last
+word may be a prefix, the nearest ranked equivalent of the server's substring match. Stdlib only (needs a
+Python whose SQLite has FTS5, which is every python.org / pyenv build).
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from _enkidu_api import EnkiduClient
+from _keyset import iter_ids, iter_since, later, since_cursor
+
+# bm25 column weights: title, content_md, tags, kv_tags.
+RANK = "bm25(10.0, 1.0, 5.0, 2.0)"
+MAX_LIMIT = 5000  # parseLimit() in pages.js
+_WORD_RE = re.compile(r"\w", re.UNICODE)
+
+
+def require_fts5() -> None:
+    try:
+        con = sqlite3.connect(":memory:")
+        con.execute("create virtual table t using fts5(x)")
+        con.close()
+    except sqlite3.OperationalError as e:
+        raise RuntimeError(f"This Python's SQLite ({sqlite3.sqlite_version}) has no FTS5; use a python.org build") from e
+
+
+def parse_kv_value(raw: str) -> Any:
+    # Same rules as parseKvValueFromQuery() in pages.js: numbers, JSON literals, else the string itself.
+    s = str(raw).strip()
+    if s in ("true", "false"):
+        return s == "true"
+    if s == "null":
+        return None
+    if re.match(r"^-?\d+(\.\d+)?$", s):
+        return float(s) if "." in s else int(s)
+    if s.startswith(("{", "[")) or (s.startswith('"') and s.endswith('"')):
+        try:
+            return json.loads(s)
+        except ValueError:
+            pass
+    return s
+
+
+def _jsonb_contains(have: Any, want: Any) -> bool:
+    # Postgres `@>` on jsonb: objects by key subset, arrays by element subset, scalars by equality.
+    if isinstance(want, dict):
+        return isinstance(have, dict) and all(k in have and _jsonb_contains(have[k], v) for k, v in want.items())
+    if isinstance(want, list):
+        if not isinstance(have, list):
+            return False
+        return all(any(_jsonb_contains(h, w) for h in have) for w in want)
+    if isinstance(want, bool) or isinstance(have, bool):
+        return type(want) is type(have) and want == have
+    return have == want
+
+
+def _kv_contains(kv_json: str, key: str, want_json: str) -> int:
+    try:
+        kv = json.loads(kv_json or "{}")
+    except ValueError:
+        return 0
+    return int(isinstance(kv, dict) and key in kv and _jsonb_contains(kv[key], json.loads(want_json)))
+
+
+def _kv_filter(key: str, want: Any) -> tuple[str, list[Any]]:
+    # SQL for "kv_tags contains {key: want}". Scalars compare in SQLite's JSON functions (fast); arrays and
+    # objects need containment rules, so only rows with the right JSON type reach the Python check.
+    if '"' in key or "\\" in key:
+        return "kv_contains(p.kv_tags, ?, ?)", [key, json.dumps(want)]
+    path = f'$."{key}"'
+    if isinstance(want, bool):
+        return "json_type(p.kv_tags, ?) = ?", [path, "true" if want else "false"]
+    if want is None:
+        return "json_type(p.kv_tags, ?) = 'null'", [path]
+    if isinstance(want, (int, float)):
+        return "json_type(p.kv_tags, ?) in ('integer', 'real') and json_extract(p.kv_tags, ?) = ?", [path, path, want]
+    if isinstance(want, str):
+        return "json_type(p.kv_tags, ?) = 'text' and json_extract(p.kv_tags, ?) = ?", [path, path, want]
+    if isinstance(want, list) and want and all(isinstance(w, (str, int, float)) and not isinstance(w, bool) for w in want):
+        # Arrays of plain values (authors, keywords): every wanted value must be an element.
+        elem = "exists (select 1 from json_each(p.kv_tags, ?) e where e.type in ({}) and e.value = ?)"
+        clauses, args = ["json_type(p.kv_tags, ?) = 'array'"], [path]
+        for w in want:
+            clauses.append(elem.format("'text'" if isinstance(w, str) else "'integer', 'real'"))
+            args += [path, w]
+        return " and ".join(clauses), args
+    kind = "object" if isinstance(want, dict) else "array"
+    return f"json_type(p.kv_tags, ?) = '{kind}' and kv_contains(p.kv_tags, ?, ?)", [path, key, json.dumps(want)]
+
+
+def _fts_text(value: Any) -> str:
+    # tags / kv_tags as plain words (keys and values both searchable).
+    if isinstance(value, dict):
+        return " ".join(f"{k} {_fts_text(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return " ".join(_fts_text(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def phrase_query(q: str) -> str:
+    # `q` as one FTS5 phrase, last word as a prefix: "causal map" also finds "causal mapping".
+    return '"' + q.strip().replace('"', '""') + '"*'
+
+
+@dataclass
+class SyncSummary:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class Hit:
+    id: str
+    score: float  # -bm25 (higher is better); 0 without a text query
+    title: str
+    created_at: str
+    tags: list[str] = field(default_factory=list)
+    snippet: str = ""
+
+
+class SearchIndex:
+    def __init__(self, root: Path):
+        require_fts5()
+        self.root = root
+        root.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(root / "search.sqlite"))
+        self.db.create_function("kv_contains", 3, _kv_contains, deterministic=True)
+        self.db.executescript(
+            """
+            pragma journal_mode = wal;
+            pragma synchronous = normal;
+            create table if not exists pages (
+              rowid integer primary key,
+              id text not null unique,
+              created_at text not null default '',
+              updated_at text not null default '',
+              thread_id text,
+              title text not null default '',
+              tags text not null default '[]',
+              kv_tags text not null default '{}'
+            );
+            create index if not exists pages_created_idx on pages (created_at desc, id desc);
+            create index if not exists pages_thread_idx on pages (thread_id);
+            create virtual table if not exists pages_fts using fts5(
+              title, content_md, tags, kv_tags,
+              tokenize = 'unicode61 remove_diacritics 2',
+              prefix = '2 3'
+            );
+            create table if not exists meta (
+              key text primary key,
+              value text not null
+            );
+            """
+        )
+        if self._get_meta("rank") != RANK:
+            with self.db:
+                self.db.execute("insert into pages_fts (pages_fts, rank) values ('rank', ?)", (RANK,))
+                self._set_meta({"rank": RANK})
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> SearchIndex:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    @property
+    def count(self) -> int:
+        return int(self.db.execute("select count(*) from pages").fetchone()[0])
+
+    # -------------------------
+    # Storage
+    # -------------------------
+
+    def _get_meta(self, key: str) -> str:
+        row = self.db.execute("select value from meta where key = ?", (key,)).fetchone()
+        return str(row[0]) if row else ""
+
+    def _set_meta(self, values: dict[str, Any]) -> None:
+        self.db.executemany(
+            "insert into meta (key, value) values (?, ?) on conflict(key) do update set value = excluded.value",
+            [(k, "" if v is None else str(v)) for k, v in values.items()],
+        )
+
+    def _put(self, page: dict[str, Any], summary: SyncSummary) -> None:
+        pid = str(page["id"])
+        updated_at = str(page.get("updated_at") or "")
+        hit = self.db.execute("select rowid, updated_at from pages where id = ?", (pid,)).fetchone()
+        if hit and hit[1] == updated_at:
+            return  # re-sent by the sync overlap window; nothing changed
+        tags = [str(t) for t in page.get("tags") or []]
+        kv = page.get("kv_tags") if isinstance(page.get("kv_tags"), dict) else {}
+        row = (
+            pid,
+            str(page.get("created_at") or ""),
+            updated_at,
+            page.get("thread_id"),
+            str(page.get("title") or ""),
+            json.dumps(tags, ensure_ascii=False),
+            json.dumps(kv, ensure_ascii=False),
+        )
+        if hit:
+            rowid = int(hit[0])
+            self.db.execute(
+                "update pages set id = ?, created_at = ?, updated_at = ?, thread_id = ?, title = ?, tags = ?, kv_tags = ? "
+                "where rowid = ?",
+                (*row, rowid),
+            )
+            self.db.execute("delete from pages_fts where rowid = ?", (rowid,))
+            summary.updated += 1
+        else:
+            cur = self.db.execute(
+                "insert into pages (id, created_at, updated_at, thread_id, title, tags, kv_tags) values (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            rowid = int(cur.lastrowid or 0)
+            summary.added += 1
+        self.db.execute(
+            "insert into pages_fts (rowid, title, content_md, tags, kv_tags) values (?, ?, ?, ?, ?)",
+            (rowid, row[4], str(page.get("content_md") or ""), " ".join(tags), _fts_text(kv)),
+        )
+
+    def _remove(self, pid: str) -> bool:
+        hit = self.db.execute("select rowid from pages where id = ?", (pid,)).fetchone()
+        if not hit:
+            return False
+        self.db.execute("delete from pages_fts where rowid = ?", (hit[0],))
+        self.db.execute("delete from pages where rowid = ?", (hit[0],))
+        return True
+
+    # -------------------------
+    # Sync
+    # -------------------------
+
+    def sync(
+        self,
+        client: EnkiduClient,
+        *,
+        base_url: str,
+        page_size: int = 500,
+        progress: Callable[[str], None] | None = print,
+    ) -> SyncSummary:
+        # Purpose: pull pages updated since the last sync, then drop pages deleted on the server.
+        started = time.perf_counter()
+        summary = SyncSummary()
+        known_base = self._get_meta("base_url")
+        if known_base and known_base != base_url:
+            raise RuntimeError(f"Index was built from {known_base}; use another --index-dir or --reset")
+
+        last_ts = self._get_meta("max_updated_at")
+        max_ts = last_ts
+        fetched = 0
+        for pages in iter_since(client, "/api/pages-export", since_cursor(last_ts), page_size=page_size):
+            with self.db:
+                for page in pages:
+                    if page.get("id"):
+                        self._put(page, summary)
+                        max_ts = later(max_ts, str(page.get("updated_at") or ""))
+                # Commit the cursor with the rows: an interrupted sync resumes where it stopped.
+                self._set_meta({"base_url": base_url, "max_updated_at": max_ts or ""})
+            fetched += len(pages)
+            if progress:
+                progress(f"Fetched {fetched} pages ({summary.added + summary.updated} new/changed, {self.count} in index)...")
+
+        # Deletions: only list ids when the server count disagrees with ours.
+        stats = client.request("GET", "/api/pages-export?stats=1") or {}
+        if int(stats.get("count") or 0) != self.count:
+            server_ids = set(iter_ids(client, "/api/pages-export"))
+            local = [r[0] for r in self.db.execute("select id from pages")]
+            with self.db:
+                for pid in local:
+                    if pid not in server_ids and self._remove(pid):
+                        summary.removed += 1
+
+        with self.db:
+            self._set_meta({"synced_at": time.time()})
+            if summary.added + summary.updated + summary.removed > 1000:
+                # Big syncs leave many small FTS segments behind; merge them so queries stay fast.
+                self.db.execute("insert into pages_fts (pages_fts) values ('optimize')")
+        summary.seconds = time.perf_counter() - started
+        return summary
+
+    # -------------------------
+    # Search
+    # -------------------------
+
+    def search(
+        self,
+        *,
+        q: str = "",
+        match: str = "",
+        tag: str = "",
+        thread_id: str = "",
+        kv_key: str = "",
+        kv_value: str = "",
+        ids: list[str] | None = None,
+        limit: int = 50,
+        offset: int = 0,
+        snippet_tokens: int = 16,
+    ) -> list[Hit]:
+        # Purpose: GET /api/pages semantics, locally. `q` is the API's plain text; `match` takes raw FTS5
+        # syntax (AND/OR/NOT, "phrases", prefix*, NEAR(), column:term). Ranked by bm25 when either is given,
+        # else newest first like the API.
+        if bool(kv_key) != bool(kv_value):
+            raise ValueError("kv_key and kv_value must be provided together")
+        where: list[str] = []
+        params: list[Any] = []
+        if tag:
+            where.append("exists (select 1 from json_each(p.tags) where value = ?)")
+            params.append(tag)
+        if thread_id:
+            where.append("p.thread_id = ?")
+            params.append(thread_id)
+        if kv_key:
+            clause, args = _kv_filter(kv_key, parse_kv_value(kv_value))
+            where.append(clause)
+            params += args
+        if ids:
+            where.append(f"p.id in ({','.join('?' * len(ids))})")
+            params += ids
+
+        fts: list[str] = []
+        if match.strip():
+            fts.append(f"({match.strip()})")
+        if q.strip():
+            if _WORD_RE.search(q):
+                fts.append(phrase_query(q))
+            else:
+                # Only punctuation: nothing to tokenize, fall back to the server's substring match.
+                where.append("(select f.content_md from pages_fts f where f.rowid = p.rowid) like ? escape '\\'")
+                params.append("%" + re.sub(r"([%_\\])", r"\\\1", q) + "%")
+
+        limit = max(1, min(MAX_LIMIT, int(limit or 50)))
+        offset = max(0, int(offset or 0))
+        snip = f"snippet(pages_fts, -1, '[', ']', '…', {max(1, min(64, int(snippet_tokens)))})"
+        cols = "p.id, p.title, p.created_at, p.tags"
+        if fts:
+            sql = (
+                f"select {cols}, -rank, {snip} from pages_fts f join pages p on p.rowid = f.rowid "
+                f"where pages_fts match ?{''.join(' and ' + w for w in where)} order by rank limit ? offset ?"
+            )
+            params = [" AND ".join(fts), *params]
+        else:
+            sql = (
+                f"select {cols}, 0.0, (select substr(f.content_md, 1, 160) from pages_fts f where f.rowid = p.rowid) "
+                "from pages p"
+                + (f" where {' and '.join(where)}" if where else "")
+                + " order by p.created_at desc, p.id desc limit ? offset ?"
+            )
+        try:
+            rows = self.db.execute(sql, (*params, limit, offset)).fetchall()
+        except sqlite3.OperationalError as e:
+            if fts:
+                # FTS5 reports query syntax problems as OperationalError (unterminated string, no such column...).
+                raise ValueError(f"Invalid search expression: {e}") from e
+            raise
+        return [
+            Hit(id=r[0], title=r[1], created_at=r[2], tags=json.loads(r[3] or "[]"), score=float(r[4]), snippet=r[5] or "")
+            for r in rows
+        ]
@@ -0,0 +1,257 @@
+"""
+Client-side secret pre-flight for bulk imports (same rules as netlify/functions/_secrets.js).
+
+Why: the server refuses a whole POST /api/pages bulk request when one page's content_md looks like it holds a
+secret (an API key pasted into a Zotero note, a long hex/base64 blob). That one entry fails its 250-page chunk
+on every attempt and the rest of the chunk goes unwritten. Scanning pages before they are chunked lets us hold
+back just the offending entries (written to a report to fix at the source) and send everything else first time.
+Only content_md is checked by the server; hits in kv_tags strings are reported as warnings, and those pages
+are sent as usual.
+
+The rules are a port of findLikelySecret(): the token patterns (AIza, sk-, ghp_, ...) in the same order, then
+long hex (>= 48) and base64-like (>= 60) runs, which are the server's "high entropy" test; reasons are the
+server's strings. A batch of texts is joined and prefiltered with bytes.find() (rule prefixes, and runs of
+hex/base64 characters in a translated copy), ~10x faster than running the regexes text by text; only the few
+flagged texts go through the exact rules.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from _pipeline import PlannedPage, batched
+
+# (name, pattern) in the order _secrets.js tries them. re.ASCII: JS \b and character classes are ASCII-only.
+TOKEN_PATTERNS: list[tuple[str, str]] = [
+    ("AIza", r"\bAIza[0-9A-Za-z\-_]{20,}\b"),
+    ("sk-", r"(?:^|[^A-Za-z0-9])sk-[A-Za-z0-9]{20,}\b"),
+    ("ghp_", r"\bghp_[A-Za-z0-9]{20,}\b"),
+    ("github_pat_", r"\bgithub_pat_[A-Za-z0-9_]{20,}\b"),
+    ("xoxb-", r"\bxoxb-[A-Za-z0-9-]{10,}\b"),
+    ("xoxa-", r"\bxoxa-[A-Za-z0-9-]{10,}\b"),
+    ("xoxp-", r"\bxoxp-[A-Za-z0-9-]{10,}\b"),
+    ("xapp-", r"\bxapp-[A-Za-z0-9-]{10,}\b"),
+]
+_LONG_HEX = r"\b[a-fA-F0-9]{48,}\b"
+_LONG_B64 = r"\b[A-Za-z0-9+/]{60,}={0,2}\b"
+
+_RULES: list[tuple[str, re.Pattern[str]]] = [
+    *((f'Found token pattern "{name}"', re.compile(rx, re.ASCII)) for name, rx in TOKEN_PATTERNS),
+    ("Found long hex-like token (>=48 chars)", re.compile(_LONG_HEX, re.ASCII)),
+    ("Found long base64-like token (>=60 chars)", re.compile(_LONG_B64, re.ASCII)),
+]
+# Batch prefilter. Every token pattern starts with one of these literals, and a long hex/base64 match needs
+# a run of that many class characters; bytes.find() over a translated copy finds both at memory speed.
+# A candidate is only a maybe (\b and "sk-"'s left edge are not checked), so flagged texts get the exact rules.
+_LITERALS = [b"AIza", b"sk-", b"ghp_", b"github_pat_", b"xoxb-", b"xoxa-", b"xoxp-", b"xapp-"]
+
+
+def _class_table(chars: str) -> bytes:
+    # bytes.translate() table: characters of the class -> 1, everything else (including UTF-8 bytes) -> 0.
+    table = bytearray(256)
+    for c in chars.encode("ascii"):
+        table[c] = 1
+    return bytes(table)
+
+
+_ALNUM = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+_RUNS = [
+    (_class_table("0123456789abcdefABCDEF"), b"\x01" * 48),
+    (_class_table(_ALNUM + "+/"), b"\x01" * 60),
+]
+# Separator for batch scans: not in any rule's class, and no literal spans it.
+_SEP = b"\n"
+
+
+@dataclass(frozen=True)
+class SecretHit:
+    reason: str  # the server's wording, e.g. 'Found token pattern "AIza"'
+    token: str  # the matched text
+
+    def masked(self) -> str:
+        # Enough to find it in the source, not enough to reuse it.
+        t = self.token if self.token[:1].isalnum() else self.token[1:]  # "sk-" matches include the char before
+        return f"{t[:6]}...({len(t)} chars)"
+
+
+def find_likely_secret(text: str) -> SecretHit | None:
+    # Same answer as findLikelySecret() in _secrets.js: the first rule (in rule order) that matches anywhere.
+    if not text:
+        return None
+    for reason, rx in _RULES:
+        m = rx.search(text)
+        if m:
+            return SecretHit(reason, m.group())
+    return None
+
+
+def _flag(haystack: bytes, needle: bytes, starts: list[int], flagged: set[int]) -> None:
+    # Mark every text containing `needle` (after a hit, carry on from the next text).
+    pos = haystack.find(needle)
+    while pos >= 0:
+        i = bisect.bisect_right(starts, pos) - 1
+        flagged.add(i)
+        if i + 1 >= len(starts):
+            return
+        pos = haystack.find(needle, starts[i + 1])
+
+
+def scan_texts(texts: list[str]) -> list[SecretHit | None]:
+    # find_likely_secret() for many texts: a few bytes.find() passes over all of them joined, then the
+    # rules themselves only for the (rare) texts the prefilter flags.
+    out: list[SecretHit | None] = [None] * len(texts)
+    if not texts:
+        return out
+    encoded = [t.encode("utf-8", errors="replace") for t in texts]
+    starts: list[int] = []
+    pos = 0
+    for b in encoded:
+        starts.append(pos)
+        pos += len(b) + len(_SEP)
+    blob = _SEP.join(encoded)
+    flagged: set[int] = set()
+    for lit in _LITERALS:
+        _flag(blob, lit, starts, flagged)
+    for table, run in _RUNS:
+        _flag(blob.translate(table), run, starts, flagged)
+    for i in flagged:
+        out[i] = find_likely_secret(texts[i])
+    return out
+
+
+def _kv_strings(value: Any, path: str) -> Iterator[tuple[str, str]]:
+    # (field path, text) for every string inside a kv_tags value (lists / nested objects included).
+    if isinstance(value, str):
+        yield path, value
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            yield from _kv_strings(v, f"{path}.{k}")
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            yield from _kv_strings(v, f"{path}[{i}]")
+
+
+def page_texts(page: dict[str, Any]) -> Iterator[tuple[str, str]]:
+    # The fields we check: content_md (what the bulk endpoint rejects; always first) and every kv_tags
+    # string value (only warned about: the server lets them through).
+    yield "content_md", str(page.get("content_md") or "")
+    for k, v in (page.get("kv_tags") or {}).items():
+        yield from _kv_strings(v, f"kv_tags.{k}")
+
+
+@dataclass
+class QuarantinedPage:
+    key: str
+    page_id: str
+    title: str
+    field: str  # where the first hit is, e.g. "content_md" or "kv_tags.note"
+    reason: str
+    token: str  # masked
+
+    @property
+    def held(self) -> bool:
+        # Only content_md hits make the server refuse the page.
+        return self.field == "content_md"
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "key": self.key,
+            "id": self.page_id,
+            "title": self.title,
+            "field": self.field,
+            "reason": self.reason,
+            "token": self.token,
+            "held": self.held,
+        }
+
+
+@dataclass
+class SecretReport:
+    checked: int = 0
+    pages: list[QuarantinedPage] = field(default_factory=list)  # held back (hit in content_md)
+    warnings: list[QuarantinedPage] = field(default_factory=list)  # sent anyway (hit in kv_tags only)
+
+    def write_jsonl(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            for q in [*self.pages, *self.warnings]:
+                f.write(json.dumps(q.to_json(), ensure_ascii=False) + "\n")
+
+
+def scan_pages(pages: list[PlannedPage]) -> list[tuple[str, SecretHit] | None]:
+    # (field, first hit) per page, or None when the page is clean. A content_md hit wins over kv_tags ones.
+    owners: list[int] = []
+    fields: list[str] = []
+    texts: list[str] = []
+    for i, pp in enumerate(pages):
+        for name, text in page_texts(pp.page):
+            if text:
+                owners.append(i)
+                fields.append(name)
+                texts.append(text)
+    out: list[tuple[str, SecretHit] | None] = [None] * len(pages)
+    for i, name, hit in zip(owners, fields, scan_texts(texts)):
+        if hit and out[i] is None:
+            out[i] = (name, hit)
+    return out
+
+
+def secret_scan_stage(
+    report: SecretReport, *, batch_size: int = 256
+) -> Callable[[Iterator[PlannedPage]], Iterator[PlannedPage]]:
+    # Pipeline stage (PlannedPage -> PlannedPage), between the diff and the chunker: pages that the server
+    # would refuse (content_md hit) are recorded in `report` and left out, so no chunk carries them. Pages
+    # with a hit in kv_tags only are recorded as warnings and passed on.
+    def _stage(pages: Iterator[PlannedPage]) -> Iterator[PlannedPage]:
+        for batch in batched(pages, batch_size):
+            report.checked += len(batch)
+            for pp, found in zip(batch, scan_pages(batch)):
+                if found is None:
+                    yield pp
+                    continue
+                name, hit = found
+                q = QuarantinedPage(
+                    key=pp.key,
+                    page_id=str(pp.page.get("id") or ""),
+                    title=str(pp.page.get("title") or ""),
+                    field=name,
+                    reason=hit.reason,
+                    token=hit.masked(),
+                )
+                if q.held:
+                    report.pages.append(q)
+                else:
+                    report.warnings.append(q)
+                    yield pp
+
+    return _stage
+
+
+def print_secret_summary(report: SecretReport, report_path: Path | None, *, limit: int = 5) -> None:
+    if not report.pages and not report.warnings:
+        return
+    if report.pages:
+        print(
+            f"WARNING: {len(report.pages)} of {report.checked} pages look like they contain a secret in content_md "
+            "and were not sent (the server would refuse them). Fix them at the source, or set "
+            "ENKIDU_ALLOW_SECRETS=1 if they are false positives:",
+            file=sys.stderr,
+        )
+        for q in report.pages[:limit]:
+            print(f"- {q.key} ({q.field}): {q.reason}: {q.token}", file=sys.stderr)
+    if report.warnings:
+        print(
+            f"WARNING: {len(report.warnings)} pages were sent with something that looks like a secret in kv_tags "
+            "(the server does not check kv_tags); you may want to remove it at the source:",
+            file=sys.stderr,
+        )
+        for q in report.warnings[:limit]:
+            print(f"- {q.key} ({q.field}): {q.reason}: {q.token}", file=sys.stderr)
+    if report_path:
+        report.write_jsonl(report_path)
+        print(f"Secret report: {report_path}")
@@ -0,0 +1,551 @@
+"""
+Local stand-in for the parts of /api/pages the import scripts use (in-memory, stdlib only).
+
+Why: importer throughput can't be measured against the deployed Netlify site (shared quotas, real data,
+network noise). This server follows the same contract as netlify/functions/pages.js:
+- GET    /api/pages  kv_key/kv_value filter, ids=, select= (incl. kv_tags->>key), stats=1,
+                     keyset ?after=<created_at>,<id> (created_at desc, id desc), limit (<= 1000 rows)
+- POST   /api/pages  bulk {pages:[...]} upsert by id (max 500 pages, needs x-enkidu-skip-embeddings: 1;
+                     x-enkidu-restore: 1 keeps created_at/thread_id/next_page_id and skips the content check;
+                     content_md that looks like a secret fails the request unless x-enkidu-allow-secrets: 1)
+- DELETE /api/pages  ?confirm=1 with kv_key/kv_value and/or ids= (bulk purge / delta deletes)
+- POST   /api/pages-diff  {kv_key, kv_value, key_field, hash_field, items:[{key, hash, id?}]} -> changed keys
+- GET    /api/pages-export  ?since=<updated_at>,<id> (updated_at asc, id asc), shard=i/n, stats=1, ids_only=1
+Responses are gzipped when the client sends accept-encoding: gzip (like the Netlify CDN).
+Like PostgREST, every row written by one bulk request shares one created_at, so cursors must break ties.
+
+Faults are injected per request (FaultConfig): fixed + per-page latency with jitter, 429 (with
+Retry-After) and 5xx answers, dropped connections, 502s *after* a write was applied (the client can't
+tell it succeeded), and a request body size limit (413).
+"""
+
+from __future__ import annotations
+
+import bisect
+import gzip
+import json
+import zlib
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from _secret_scan import find_likely_secret
+
+MAX_BULK_PAGES = 500
+MAX_INFLATED_BYTES = 64 * 1024 * 1024  # same cap as netlify/functions/_body.js
+MAX_IDS = 500
+MAX_ROWS = 1000  # PostgREST max-rows
+MAX_DIFF_ITEMS = 1000  # pages-diff.js
+MAX_EXPORT_ROWS = 500  # pages-export.js
+MAX_SHARDS = 256
+_FIELD_RE = re.compile(r"^[A-Za-z0-9_]{1,100}$")
+_UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
+_EXPORT_COLUMNS = ("id", "created_at", "updated_at", "thread_id", "next_page_id", "title", "tags", "kv_tags", "content_md")
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0  # added to every request
+    per_page_ms: float = 0.0  # added per page written by a bulk POST (embedding-free upsert cost)
+    jitter: float = 0.2  # +/- fraction applied to the latency
+    rate_429: float = 0.0  # fraction of requests answered 429 (with Retry-After)
+    rate_5xx: float = 0.0  # fraction answered 500/502/503/504 before doing anything
+    rate_drop: float = 0.0  # fraction whose connection is closed without a response
+    rate_fail_after_write: float = 0.0  # fraction of bulk POSTs that are applied, then answered 502
+    retry_after_s: float = 1.0
+    max_body_bytes: int = 6 * 1024 * 1024  # Netlify Functions request payload limit
+    seed: int | None = None
+
+
+@dataclass
+class RouteStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=dict)
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(pct / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+
+def _parse_kv_value(raw: str) -> Any:
+    # Same coercion as parseKvValueFromQuery() in pages.js (match the stored JSON type).
+    s = (raw or "").strip()
+    if s in ("true", "false"):
+        return s == "true"
+    if s == "null":
+        return None
+    try:
+        if s and (s[0] in "{[" or (s[0] == '"' and s[-1] == '"')):
+            return json.loads(s)
+        if s.lstrip("-").replace(".", "", 1).isdigit():
+            return float(s) if "." in s else int(s)
+    except ValueError:
+        pass
+    return s
+
+
+def _parse_ids(raw: str) -> list[str] | None:
+    ids = [s.strip() for s in raw.split(",") if s.strip()]
+    try:
+        return [str(uuid.UUID(s)) for s in ids] if ids else None
+    except ValueError:
+        return None
+
+
+def _json_body(body: bytes, headers: Any) -> tuple[int, Any]:
+    # (0, parsed JSON) or (error status, message); gzip bodies like netlify/functions/_body.js.
+    encoding = (headers.get("content-encoding") or "").strip().lower()
+    if encoding == "gzip":
+        try:
+            d = zlib.decompressobj(wbits=31)
+            body = d.decompress(body, MAX_INFLATED_BYTES)
+        except zlib.error as e:
+            return 400, f"Invalid gzip body: {e}"
+        if d.unconsumed_tail:
+            return 413, f"Decompressed body exceeds {MAX_INFLATED_BYTES} bytes"
+    elif encoding not in ("", "identity"):
+        return 415, f"Unsupported content-encoding: {encoding} (use gzip or none)"
+    try:
+        return 0, json.loads(body or b"{}")
+    except ValueError:
+        return 500, "Unexpected token in JSON"
+
+
+class PageStore:
+    # Thread-safe in-memory pages table, kept sorted by (created_at, id) for keyset listing.
+
+    def __init__(self) -> None:
+        self.pages: dict[str, dict[str, Any]] = {}
+        self._order: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def _now(self) -> str:
+        # Strictly increasing timestamps (one tick per statement, like now() in a Postgres transaction).
+        self._clock += timedelta(microseconds=1000)
+        return self._clock.isoformat(timespec="microseconds")
+
+    def upsert(self, rows: list[dict[str, Any]]) -> None:
+        with self._lock:
+            now = self._now()
+            for r in rows:
+                pid = str(r.get("id") or uuid.uuid4())
+                cur = self.pages.get(pid)
+                created = str(r.get("created_at") or (cur["created_at"] if cur else now))  # restores keep it
+                if cur:
+                    del self._order[bisect.bisect_left(self._order, (cur["created_at"], pid))]
+                    cur.update({k: v for k, v in r.items() if k != "id"}, created_at=created, updated_at=now)
+                else:
+                    self.pages[pid] = {**r, "id": pid, "created_at": created, "updated_at": now}
+                bisect.insort(self._order, (created, pid))
+
+    def delete(self, pids: list[str]) -> int:
+        with self._lock:
+            n = 0
+            for pid in pids:
+                page = self.pages.pop(pid, None)
+                if page:
+                    i = bisect.bisect_left(self._order, (page["created_at"], pid))
+                    del self._order[i]
+                    n += 1
+            return n
+
+    def select(self, match: Any, *, after: tuple[str, str] | None, limit: int) -> list[dict[str, Any]]:
+        # Newest first; `after` continues strictly after that (created_at, id).
+        with self._lock:
+            end = bisect.bisect_left(self._order, after) if after else len(self._order)
+            out: list[dict[str, Any]] = []
+            for i in range(end - 1, -1, -1):
+                page = self.pages[self._order[i][1]]
+                if match(page):
+                    out.append(dict(page))
+                    if len(out) >= limit:
+                        break
+            return out
+
+    def matching(self, match: Any) -> list[dict[str, Any]]:
+        with self._lock:
+            return [p for p in self.pages.values() if match(p)]
+
+
+class StandInServer:
+    """ThreadingHTTPServer around a PageStore; `start()` serves from a daemon thread."""
+
+    def __init__(self, *, host: str = "127.0.0.1", port: int = 0, admin_token: str = "standin", faults: FaultConfig | None = None):
+        self.store = PageStore()
+        self.faults = faults or FaultConfig()
+        self.admin_token = admin_token
+        self.stats: dict[str, RouteStats] = {}
+        self.injected: dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._rng = random.Random(self.faults.seed)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> StandInServer:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="standin-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.stats = {}
+            self.injected = {}
+
+    def _record(self, route: str, status: int, ms: float, bytes_in: int, bytes_out: int) -> None:
+        with self._stats_lock:
+            st = self.stats.setdefault(route, RouteStats())
+            st.latencies_ms.append(ms)
+            st.statuses[status] = st.statuses.get(status, 0) + 1
+            st.bytes_in += bytes_in
+            st.bytes_out += bytes_out
+
+    def _inject(self, kind: str) -> None:
+        with self._stats_lock:
+            self.injected[kind] = self.injected.get(kind, 0) + 1
+
+    def _roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._stats_lock:
+            return self._rng.random() < rate
+
+    def _sleep(self, ms: float) -> None:
+        if ms > 0:
+            j = self.faults.jitter
+            with self._stats_lock:
+                f = 1 + self._rng.uniform(-j, j) if j else 1
+            time.sleep(ms * f / 1000.0)
+
+    # -------------------------
+    # Request handling (mirrors pages.js)
+    # -------------------------
+
+    def _pages_get(self, qs: dict[str, str]) -> tuple[int, Any]:
+        kv_key, kv_value = qs.get("kv_key"), qs.get("kv_value")
+        if bool(kv_key) != bool(kv_value):
+            return 400, "kv_key and kv_value must be provided together"
+        want = _parse_kv_value(kv_value or "")
+        ids: set[str] | None = None
+        if "ids" in qs:
+            parsed = _parse_ids(qs["ids"])
+            if parsed is None:
+                return 400, "ids must be a comma-separated list of page ids"
+            if len(parsed) > MAX_IDS:
+                return 400, f"ids: max {MAX_IDS} per request"
+            ids = set(parsed)
+
+        def match(p: dict[str, Any]) -> bool:
+            if ids is not None and p["id"] not in ids:
+                return False
+            return not kv_key or (p.get("kv_tags") or {}).get(kv_key) == want
+
+        if qs.get("stats") == "1":
+            rows = self.store.matching(match)
+            return 200, {"count": len(rows), "max_updated_at": max((r["updated_at"] for r in rows), default=None)}
+
+        after = None
+        if "after" in qs:
+            ts, _, pid = qs["after"].replace(" ", "+").rpartition(",")
+            if not ts or not pid:
+                return 400, "after must be <created_at>,<id> from a previous next_cursor"
+            after = (ts, pid)
+        try:
+            limit = int(qs.get("limit") or 50)
+        except ValueError:
+            limit = 50
+        limit = min(limit if limit > 0 else 50, 5000, MAX_ROWS)
+        rows = self.store.select(match, after=after, limit=limit)
+
+        light = qs.get("light") == "1"
+        if "select" in qs:
+            cols = [c.strip() for c in qs["select"].split(",") if c.strip()]
+            for c in ("created_at", "id"):
+                if c not in cols:
+                    cols.insert(0, c)
+            rows = [
+                {(c.split("->>", 1)[1] if "->>" in c else c): (
+                    (r.get("kv_tags") or {}).get(c.split("->>", 1)[1]) if "->>" in c else r.get(c)
+                ) for c in cols}
+                for r in rows
+            ]
+        elif light:
+            rows = [{k: v for k, v in r.items() if k != "content_md"} for r in rows]
+        last = rows[-1] if rows else None
+        return 200, {"pages": rows, "next_cursor": f"{last['created_at']},{last['id']}" if last else None}
+
+    def _pages_post(self, body: bytes, headers: Any) -> tuple[int, Any]:
+        status, data = _json_body(body, headers)
+        if status:
+            return status, data
+        pages = data.get("pages") if isinstance(data, dict) else None
+        if not isinstance(pages, list):
+            return 400, "The stand-in only implements bulk upserts ({pages:[...]})"
+        if (headers.get("x-enkidu-skip-embeddings") or "").strip() != "1":
+            return 400, "Bulk import requires x-enkidu-skip-embeddings: 1"
+        if len(pages) > MAX_BULK_PAGES:
+            return 400, f"Bulk import max {MAX_BULK_PAGES} pages per request"
+        restore = (headers.get("x-enkidu-restore") or "").strip() == "1"
+        allow_secrets = (headers.get("x-enkidu-allow-secrets") or "").strip() == "1"
+        if restore and any(not _UUID_RE.match(str(p.get("id") or "")) for p in pages):
+            return 400, "Restore needs the page id of every page"
+        rows = []
+        for p in pages:
+            row = {
+                **({"id": str(p["id"])} if p.get("id") else {}),
+                "title": p.get("title"),
+                "content_md": str(p.get("content_md") or ""),
+                "tags": [str(t) for t in p.get("tags") or []],
+                "kv_tags": p.get("kv_tags") if isinstance(p.get("kv_tags"), dict) else {},
+            }
+            if restore:
+                row.update(
+                    created_at=p.get("created_at") or None,
+                    thread_id=p.get("thread_id"),
+                    next_page_id=p.get("next_page_id"),
+                )
+            elif not row["content_md"].strip():
+                return 400, "content_md is required (bulk)"
+            if not allow_secrets and (hit := find_likely_secret(row["content_md"])):
+                # pages.js answers with the thrown error (500), and the whole request is refused.
+                return 500, f"Refusing to save content: possible secret detected. ({hit.reason})"
+            rows.append(row)
+        self._sleep(self.faults.per_page_ms * len(rows))
+        self.store.upsert(rows)
+        return 200, {"ok": True, "processed": len(rows)}
+
+    def _pages_diff(self, body: bytes, headers: Any) -> tuple[int, Any]:
+        # Mirrors pages-diff.js + the diff_page_hashes RPC (newest page per key wins).
+        status, data = _json_body(body, headers)
+        if status:
+            return status, data
+        if not isinstance(data, dict) or not data.get("kv_key") or "kv_value" not in data:
+            return 400, "kv_key and kv_value are required"
+        key_field, hash_field = str(data.get("key_field") or ""), str(data.get("hash_field") or "")
+        if not _FIELD_RE.match(key_field) or not _FIELD_RE.match(hash_field):
+            return 400, "key_field and hash_field must be kv_tags keys ([A-Za-z0-9_])"
+        items = data.get("items")
+        if not isinstance(items, list):
+            return 400, "items must be an array of {key, hash}"
+        if len(items) > MAX_DIFF_ITEMS:
+            return 400, f"items: max {MAX_DIFF_ITEMS} per request"
+        kv_key, want = data["kv_key"], data["kv_value"]
+        newest: dict[str, dict[str, Any]] = {}
+        copies: dict[str, int] = {}
+        for p in self.store.matching(lambda p: (p.get("kv_tags") or {}).get(kv_key) == want):
+            key = (p.get("kv_tags") or {}).get(key_field)
+            if not isinstance(key, str):
+                continue
+            copies[key] = copies.get(key, 0) + 1
+            cur = newest.get(key)
+            if cur is None or (p["created_at"], p["id"]) > (cur["created_at"], cur["id"]):
+                newest[key] = p
+        changed, duplicates = [], []
+        for it in items:
+            key = it.get("key") if isinstance(it, dict) else None
+            if not isinstance(key, str) or not key:
+                return 400, "every item needs a non-empty string key"
+            if copies.get(key, 0) > 1:
+                duplicates.append(key)
+            page = newest.get(key)
+            stored = str((page.get("kv_tags") or {}).get(hash_field) or "") if page else None
+            if not page or stored != str(it.get("hash") or "") or (it.get("id") and page["id"] != str(it["id"])):
+                changed.append({"key": key, "id": page["id"] if page else None, "hash": stored})
+        return 200, {"changed": changed, "duplicates": duplicates}
+
+    def _pages_export(self, qs: dict[str, str]) -> tuple[int, Any]:
+        # Mirrors pages-export.js (ordering by (updated_at, id); shards are uuid ranges).
+        lo, hi = "", "g"
+        if "shard" in qs:
+            m = re.match(r"^(\d{1,3})/(\d{1,3})$", qs["shard"].strip())
+            i, n = (int(m.group(1)), int(m.group(2))) if m else (0, 0)
+            if not m or n < 1 or n > MAX_SHARDS or i >= n:
+                return 400, f"shard must be <i>/<n> with 0 <= i < n <= {MAX_SHARDS}"
+
+            def at(k: int) -> str:
+                return str(uuid.UUID(int=(k << 128) // n)) if k < n else "g"
+
+            lo, hi = (at(i) if i else ""), at(i + 1)
+        rows = self.store.matching(lambda p: lo <= p["id"].lower() < hi)
+
+        if qs.get("stats") == "1":
+            return 200, {"count": len(rows), "max_updated_at": max((r["updated_at"] for r in rows), default=None)}
+
+        def limit_of(default: int, cap: int) -> int:
+            try:
+                n = int(qs.get("limit") or default)
+            except ValueError:
+                n = default
+            return min(n if n > 0 else default, cap)
+
+        if qs.get("ids_only") == "1":
+            after = qs.get("after", "")
+            ids = sorted(r["id"] for r in rows if r["id"] > after)[: limit_of(1000, 1000)]
+            return 200, {"ids": ids, "next_cursor": ids[-1] if ids else None}
+
+        if "since" in qs:
+            ts, _, pid = qs["since"].replace(" ", "+").rpartition(",")
+            if not ts or not _UUID_RE.match(pid):
+                return 400, "since must be <updated_at>,<id> from a previous next_cursor"
+            since = (datetime.fromisoformat(ts), pid)
+            rows = [r for r in rows if (datetime.fromisoformat(r["updated_at"]), r["id"]) > since]
+        rows = sorted(rows, key=lambda r: (r["updated_at"], r["id"]))[: limit_of(200, MAX_EXPORT_ROWS)]
+        pages = [{k: r.get(k) for k in _EXPORT_COLUMNS} for r in rows]
+        last = pages[-1] if pages else None
+        return 200, {
+            "pages": pages,
+            "next_cursor": f"{last['updated_at']},{last['id']}" if last else None,
+            "truncated": False,
+        }
+
+    def _pages_delete(self, qs: dict[str, str]) -> tuple[int, Any]:
+        if qs.get("confirm") != "1":
+            return 400, "Missing confirm=1"
+        kv_key = qs.get("kv_key")
+        has_kv = bool(kv_key) and "kv_value" in qs
+        if not has_kv and "ids" not in qs:
+            return 400, "kv_key and kv_value (or ids) are required"
+        want = _parse_kv_value(qs.get("kv_value") or "")
+        ids = None
+        if "ids" in qs:
+            ids = _parse_ids(qs["ids"])
+            if ids is None:
+                return 400, "ids must be a comma-separated list of page ids"
+            if len(ids) > MAX_IDS:
+                return 400, f"ids: max {MAX_IDS} per request"
+        id_set = set(ids or [])
+
+        def match(p: dict[str, Any]) -> bool:
+            if ids is not None and p["id"] not in id_set:
+                return False
+            return not has_kv or (p.get("kv_tags") or {}).get(kv_key) == want
+
+        victims = [p["id"] for p in self.store.matching(match)]
+        before = len(victims)
+        self.store.delete(victims)
+        return 200, {"ok": True, "before": before, "after": 0, "deleted": before}
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def handle(self) -> None:
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client went away mid-request (e.g. a killed importer)
+
+            def _reply(self, status: int, payload: Any, extra: dict[str, str] | None = None) -> int:
+                if isinstance(payload, (dict, list)):
+                    data, ctype = json.dumps(payload).encode("utf-8"), "application/json"
+                else:
+                    data, ctype = str(payload).encode("utf-8"), "text/plain; charset=utf-8"
+                gz = len(data) >= 1024 and "gzip" in (self.headers.get("accept-encoding") or "")
+                if gz:
+                    data = gzip.compress(data, compresslevel=5, mtime=0)
+                self.send_response(status)
+                self.send_header("content-type", ctype)
+                if gz:
+                    self.send_header("content-encoding", "gzip")
+                self.send_header("content-length", str(len(data)))
+                for k, v in (extra or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+                return len(data)
+
+            def _handle(self) -> None:
+                started = time.perf_counter()
+                u = urllib.parse.urlsplit(self.path)
+                qs = {k: v[0] for k, v in urllib.parse.parse_qs(u.query, keep_blank_values=True).items()}
+                route = f"{self.command} {u.path}"
+                length = int(self.headers.get("content-length") or 0)
+                f = server.faults
+                status, out = 0, 0
+
+                if length > f.max_body_bytes:
+                    # Read (and discard) the body so the connection stays usable, like a proxy would.
+                    self.rfile.read(length)
+                    status = 413
+                    out = self._reply(413, "Payload Too Large")
+                    server._record(route, status, (time.perf_counter() - started) * 1000, length, out)
+                    return
+                body = self.rfile.read(length) if length else b""
+                server._sleep(f.latency_ms)
+
+                if server._roll(f.rate_drop):
+                    server._inject("drop")
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    server._record(route, 0, (time.perf_counter() - started) * 1000, length, 0)
+                    return
+                if server._roll(f.rate_429):
+                    server._inject("429")
+                    status = 429
+                    out = self._reply(429, "Too Many Requests", {"retry-after": f"{f.retry_after_s:g}"})
+                elif server._roll(f.rate_5xx):
+                    with server._stats_lock:
+                        status = server._rng.choice((500, 502, 503, 504))
+                    server._inject(str(status))
+                    out = self._reply(status, "injected failure")
+                else:
+                    expected = f"Bearer {server.admin_token}"
+                    if " ".join((self.headers.get("authorization") or "").split()) != expected:
+                        status, payload = 401, "Unauthorized"
+                    elif u.path.rstrip("/") == "/api/pages-diff":
+                        if self.command == "POST":
+                            status, payload = server._pages_diff(body, self.headers)
+                        else:
+                            status, payload = 405, "Method Not Allowed"
+                    elif u.path.rstrip("/") == "/api/pages-export":
+                        if self.command == "GET":
+                            status, payload = server._pages_export(qs)
+                        else:
+                            status, payload = 405, "Method Not Allowed"
+                    elif u.path.rstrip("/") != "/api/pages":
+                        status, payload = 404, "Not Found"
+                    elif self.command == "GET":
+                        status, payload = server._pages_get(qs)
+                    elif self.command == "POST":
+                        status, payload = server._pages_post(body, self.headers)
+                        if status == 200 and server._roll(f.rate_fail_after_write):
+                            server._inject("502-after-write")
+                            status, payload = 502, "injected failure (write was applied)"
+                    elif self.command == "DELETE":
+                        status, payload = server._pages_delete(qs)
+                    else:
+                        status, payload = 405, "Method Not Allowed"
+                    out = self._reply(status, payload)
+                server._record(route, status, (time.perf_counter() - started) * 1000, length, out)
+
+            do_GET = do_POST = do_DELETE = do_PUT = _handle
+
+        return Handler
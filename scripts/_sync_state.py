@@ -0,0 +1,261 @@
+"""
+Local sync-state store for the import scripts (SQLite, stdlib only).
+
+Why: rebuilding "what is already on the server" means paging through every imported page on each
+run. Instead we remember key -> (page id, source hash, last synced) locally, plus a cheap server
+fingerprint (row count + max(updated_at)) so we can tell when the local copy is still trustworthy.
+
+The same file doubles as a write-ahead journal for uploads: before a chunk is sent, its pages are
+recorded with their page id and an empty source hash ("may or may not be on the server"); the
+acknowledgement stores the real hash in the same transaction that marks the chunk done. After a crash,
+the store still knows every page id the server may have, and the unconfirmed ones (empty hash) are
+simply rewritten by the next run. Replaying is safe because pages are upserted by their fixed id.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable
+
+
+@dataclass(frozen=True)
+class SyncedPage:
+    key: str
+    page_id: str
+    source_hash: str
+    synced_at: float
+
+
+@dataclass(frozen=True)
+class ImportRun:
+    run_id: int
+    started_at: float
+    status: str  # running | incomplete | done | failed | superseded
+    chunks_planned: int
+    chunks_acked: int
+    pages_acked: int
+    partial: bool  # the store holds only the keys the run had checked with POST /api/pages-diff
+
+
+# runs.seeded: the store mirrors the server from a full listing (or a matching fingerprint), or holds a
+# trustworthy subset of it, rebuilt key by key from POST /api/pages-diff answers.
+SEEDED_LISTING = 1
+SEEDED_DIFF = 2
+
+
+# Journal rows kept for old runs (only the latest unfinished run matters for --resume).
+_KEEP_RUNS = 20
+
+
+def _now() -> float:
+    return time.time()
+
+
+class SyncState:
+    def __init__(self, path: Path):
+        self.path = path
+        # Pipelined imports seed the store from a background listing thread, journal chunks from the
+        # pipeline thread and acknowledge them from the main thread; writes are serialized by _lock.
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.executescript(
+            """
+            pragma journal_mode = wal;
+            pragma synchronous = normal;
+            create table if not exists pages (
+              key text primary key,
+              page_id text not null,
+              source_hash text not null default '',
+              synced_at real not null
+            );
+            create table if not exists meta (
+              key text primary key,
+              value text not null
+            );
+            create table if not exists runs (
+              run_id integer primary key autoincrement,
+              started_at real not null,
+              finished_at real,
+              base_url text not null,
+              seeded integer not null default 0,
+              status text not null default 'running'
+            );
+            create table if not exists chunks (
+              run_id integer not null,
+              idx integer not null,
+              pages integer not null,
+              status text not null,
+              planned_at real not null,
+              acked_at real,
+              primary key (run_id, idx)
+            );
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> SyncState:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    # -------------------------
+    # Meta (server fingerprint)
+    # -------------------------
+
+    def get_meta(self, key: str) -> str:
+        row = self.db.execute("select value from meta where key = ?", (key,)).fetchone()
+        return str(row[0]) if row else ""
+
+    def set_meta(self, values: dict[str, Any]) -> None:
+        with self._lock, self.db:
+            self.db.executemany(
+                "insert into meta (key, value) values (?, ?) on conflict(key) do update set value = excluded.value",
+                [(k, "" if v is None else str(v)) for k, v in values.items()],
+            )
+
+    def matches_fingerprint(self, *, base_url: str, fingerprint: dict[str, Any]) -> bool:
+        # Purpose: trust the local store only if it was last synced against this backend and nothing changed since.
+        if self.get_meta("base_url") != base_url:
+            return False
+        return (
+            self.get_meta("server_count") == str(fingerprint.get("count"))
+            and self.get_meta("server_max_updated_at") == str(fingerprint.get("max_updated_at") or "")
+        )
+
+    def save_fingerprint(self, *, base_url: str, fingerprint: dict[str, Any]) -> None:
+        self.set_meta(
+            {
+                "base_url": base_url,
+                "server_count": fingerprint.get("count"),
+                "server_max_updated_at": fingerprint.get("max_updated_at") or "",
+                "fingerprint_saved_at": _now(),
+            }
+        )
+
+    def invalidate(self) -> None:
+        self.set_meta({"server_count": "", "server_max_updated_at": ""})
+
+    # -------------------------
+    # Pages
+    # -------------------------
+
+    def load(self) -> dict[str, SyncedPage]:
+        rows = self.db.execute("select key, page_id, source_hash, synced_at from pages")
+        return {r[0]: SyncedPage(key=r[0], page_id=r[1], source_hash=r[2], synced_at=r[3]) for r in rows}
+
+    def replace_all(self, items: Iterable[tuple[str, str, str]]) -> None:
+        # Purpose: rebuild the store from a full server listing (key, page_id, source_hash).
+        ts = _now()
+        with self._lock, self.db:
+            self.db.execute("delete from pages")
+            self.db.executemany(
+                "insert or replace into pages (key, page_id, source_hash, synced_at) values (?, ?, ?, ?)",
+                ((k, pid, h or "", ts) for k, pid, h in items),
+            )
+
+    def _upsert(self, items: Iterable[tuple[str, str, str]]) -> None:
+        ts = _now()
+        self.db.executemany(
+            "insert into pages (key, page_id, source_hash, synced_at) values (?, ?, ?, ?) "
+            "on conflict(key) do update set page_id = excluded.page_id, "
+            "source_hash = excluded.source_hash, synced_at = excluded.synced_at",
+            ((k, pid, h or "", ts) for k, pid, h in items),
+        )
+
+    def upsert(self, items: Iterable[tuple[str, str, str]]) -> None:
+        with self._lock, self.db:
+            self._upsert(items)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock, self.db:
+            self.db.executemany("delete from pages where key = ?", ((k,) for k in keys))
+
+    def clear(self) -> None:
+        with self._lock, self.db:
+            self.db.execute("delete from pages")
+        self.invalidate()
+
+    def count(self) -> int:
+        return int(self.db.execute("select count(*) from pages").fetchone()[0])
+
+    def count_unconfirmed(self) -> int:
+        # Pages journaled by an upload that was never acknowledged (rewritten by the next run).
+        return int(self.db.execute("select count(*) from pages where source_hash = ''").fetchone()[0])
+
+    # -------------------------
+    # Upload journal
+    # -------------------------
+
+    def begin_run(self, *, base_url: str) -> int:
+        with self._lock, self.db:
+            # An earlier unfinished run is picked up by this one (its unconfirmed pages live in `pages`).
+            self.db.execute("update runs set status = 'superseded' where status in ('running', 'incomplete')")
+            cur = self.db.execute("insert into runs (started_at, base_url) values (?, ?)", (_now(), base_url))
+            run_id = int(cur.lastrowid)
+            self.db.execute("delete from chunks where run_id <= ?", (run_id - _KEEP_RUNS,))
+            self.db.execute("delete from runs where run_id <= ?", (run_id - _KEEP_RUNS,))
+        return run_id
+
+    def mark_seeded(self, run_id: int, *, partial: bool = False) -> None:
+        # The store now mirrors the server (fresh listing or matching fingerprint), or with partial=True a
+        # subset of it (diff answers + journaled chunks): a crash after this point leaves a store that
+        # --resume can trust for the keys it holds.
+        with self._lock, self.db:
+            self.db.execute(
+                "update runs set seeded = ? where run_id = ?", (SEEDED_DIFF if partial else SEEDED_LISTING, run_id)
+            )
+
+    def plan_chunk(self, run_id: int, idx: int, items: Iterable[tuple[str, str]]) -> None:
+        # Write-ahead: (key, page id) pages are about to be sent; their hash stays unknown until acked.
+        items = list(items)
+        with self._lock, self.db:
+            self.db.execute(
+                "insert or replace into chunks (run_id, idx, pages, status, planned_at) values (?, ?, ?, 'planned', ?)",
+                (run_id, idx, len(items), _now()),
+            )
+            self._upsert((k, pid, "") for k, pid in items)
+
+    def ack_chunk(self, run_id: int, idx: int, items: Iterable[tuple[str, str, str]]) -> None:
+        with self._lock, self.db:
+            self.db.execute(
+                "update chunks set status = 'acked', acked_at = ? where run_id = ? and idx = ?", (_now(), run_id, idx)
+            )
+            self._upsert(items)
+
+    def fail_chunk(self, run_id: int, idx: int) -> None:
+        with self._lock, self.db:
+            self.db.execute("update chunks set status = 'failed' where run_id = ? and idx = ?", (run_id, idx))
+
+    def finish_run(self, run_id: int, status: str) -> None:
+        with self._lock, self.db:
+            self.db.execute("update runs set status = ?, finished_at = ? where run_id = ?", (status, _now(), run_id))
+
+    def interrupted_run(self, *, base_url: str) -> ImportRun | None:
+        # The latest run against this backend, if it never finished cleanly and its store can be trusted.
+        row = self.db.execute(
+            "select run_id, started_at, status, seeded from runs where base_url = ? order by run_id desc limit 1",
+            (base_url,),
+        ).fetchone()
+        if not row or row[2] not in ("running", "incomplete") or not row[3]:
+            return None
+        planned, acked, pages = self.db.execute(
+            "select count(*), coalesce(sum(status = 'acked'), 0), coalesce(sum(case when status = 'acked' then pages end), 0) "
+            "from chunks where run_id = ?",
+            (row[0],),
+        ).fetchone()
+        return ImportRun(
+            run_id=int(row[0]),
+            started_at=float(row[1]),
+            status=str(row[2]),
+            chunks_planned=int(planned),
+            chunks_acked=int(acked),
+            pages_acked=int(pages),
+            partial=int(row[3]) == SEEDED_DIFF,
+        )
@@ -0,0 +1,172 @@
+"""
+Deterministic synthetic corpora for the import benchmarks (Zotero BibTeX and Raindrop HTML exports).
+
+Why: real libraries can't be checked in, and timing on whatever export happens to be lying around isn't
+comparable between runs. The same (n, seed) always produces byte-identical output, and both generators
+mix ordinary records with the shapes that have made the parsers slow or wrong before:
+- BibTeX: deeply nested braces, very long abstracts, multi-attachment `file` fields with escaped
+  Windows paths, `@string` macros + `#` concatenation, quoted values with escaped quotes, `@comment`s.
+- Raindrop: runs of consecutive link rows before a note (what clean_raindrop_export_links.py drops),
+  multi-line notes with <br>, HTML entities, links without notes.
+"""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Iterator
+
+_WORDS = (
+    "causal mapping evaluation theory systems network knowledge outcome impact qualitative quantitative "
+    "method analysis framework participatory stakeholder policy intervention programme contribution "
+    "attribution process tracing realist synthesis complexity feedback loop narrative evidence review "
+    "learning adaptive management development rural health education market resilience governance"
+).split()
+_ACCENTED = ("{\\\"u}ber", "{\\'e}tude", "Gr{\\\"o}{\\ss}e", "na{\\\"i}ve", "{\\aa}ngstr{\\\"o}m", "Pe{\\~n}a", "café", "Müller")
+_SURNAMES = ("Smith", "Doe", "Ackermann", "Eden", "Powell", "Davies", "Nguyen", "O'Brien", "van der Berg", "Müller")
+_GIVEN = ("John", "Jane", "Fran", "Colin", "Steve", "Ana", "Li", "Kwame", "Ines", "Rosa")
+_ENTRY_TYPES = ("article", "book", "incollection", "report", "inproceedings", "thesis", "online")
+_MIME = (("pdf", "application/pdf"), ("html", "text/html"), ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
+
+
+def _words(r: random.Random, n: int) -> str:
+    return " ".join(r.choice(_WORDS) for _ in range(n))
+
+
+def _deep_braces(r: random.Random, depth: int) -> str:
+    # e.g. {causal {mapping {of DNA}}}: protected words nested `depth` levels deep.
+    inner = r.choice(("DNA", "NGO", "UK", "COVID-19", "R"))
+    for _ in range(depth):
+        inner = "{" + f"{r.choice(_WORDS)} {inner}" + "}"
+    return inner
+
+
+def _title(r: random.Random) -> str:
+    parts = [_words(r, r.randint(2, 8)).capitalize()]
+    if r.random() < 0.3:
+        parts.append(r.choice(_ACCENTED))
+    if r.random() < 0.15:
+        parts.append(_deep_braces(r, r.randint(3, 12)))
+    if r.random() < 0.2:
+        parts.append("{" + _words(r, 2).upper() + "}")
+    return " ".join(parts)
+
+
+def _authors(r: random.Random) -> str:
+    n = r.choice((1, 1, 2, 2, 3, 5, 12))
+    return " and ".join(f"{r.choice(_SURNAMES)}, {r.choice(_GIVEN)}" for _ in range(n))
+
+
+def _abstract(r: random.Random) -> str:
+    x = r.random()
+    if x < 0.25:
+        return ""
+    # ~2% very long abstracts / pasted full text (tens of KB).
+    n = r.randint(3000, 8000) if x > 0.98 else r.randint(20, 300)
+    text = _words(r, n)
+    if r.random() < 0.2:
+        text += " " + r.choice(_ACCENTED) + " {" + _words(r, 3) + "} 50\\% of \\& cases"
+    return text
+
+
+def _file_field(r: random.Random, i: int) -> str:
+    # Zotero style: "C\:\\Users\\...\\file.pdf:application/pdf;..." with 0..6 attachments.
+    n = r.choice((0, 1, 1, 1, 2, 3, 6))
+    out = []
+    for _ in range(n):
+        ext, mime = r.choice(_MIME)
+        key = "".join(r.choice("ABCDEFGHJKLMNPQRSTUVWXYZ23456789") for _ in range(8))
+        name = _words(r, r.randint(1, 6)).replace(" ", "_")
+        out.append(f"C\\:\\\\Users\\\\Me\\\\Zotero\\\\storage\\\\{key}\\\\{name}_{i}.{ext}:{mime}")
+    return ";".join(out)
+
+
+def _bib_entry(r: random.Random, i: int) -> str:
+    etype = r.choice(_ENTRY_TYPES)
+    year = 1970 + r.randint(0, 55)
+    fields: list[tuple[str, str]] = [
+        ("title", "{" + _title(r) + "}"),
+        ("author", "{" + _authors(r) + "}"),
+        ("date", "{" + f"{year}-{r.randint(1, 12):02d}" + "}"),
+    ]
+    if r.random() < 0.5:
+        fields.append(("year", str(year)))
+    if r.random() < 0.3:
+        # Quoted value with an escaped quote and braces inside.
+        fields.append(("journaltitle", '"Journal of {' + _words(r, 1).capitalize() + '} \\"quoted\\""'))
+    elif r.random() < 0.3:
+        fields.append(("journaltitle", "jnl # { (" + _words(r, 1) + ")}"))
+    else:
+        fields.append(("journaltitle", "{" + _words(r, 3).title() + "}"))
+    abstract = _abstract(r)
+    if abstract:
+        fields.append(("abstract", "{" + abstract + "}"))
+    if r.random() < 0.1:
+        fields.append(("annote", "{" + _words(r, r.randint(5, 60)) + "}"))
+    ff = _file_field(r, i)
+    if ff:
+        fields.append(("file", "{" + ff + "}"))
+    if r.random() < 0.5:
+        fields.append(("doi", "{10." + str(r.randint(1000, 9999)) + "/" + str(r.randint(10**6, 10**7)) + "}"))
+    if r.random() < 0.4:
+        fields.append(("keywords", "{" + ", ".join(r.choice(_WORDS) for _ in range(r.randint(1, 8))) + "}"))
+    body = ",\n".join(f"  {k} = {v}" for k, v in fields)
+    return f"@{etype}{{key{i}_{year},\n{body}\n}}\n\n"
+
+
+def iter_bibtex_corpus(n: int, seed: int = 0) -> Iterator[str]:
+    # Yields the .bib text in pieces (one entry at a time), so 100k-entry corpora never sit in memory.
+    r = random.Random(seed)
+    yield "@comment{jabref-meta: databaseType:biblatex;}\n\n"
+    yield "@string{jnl = {Journal of Causal Things}}\n\n"
+    for i in range(n):
+        if i and i % 5000 == 0:
+            yield "@comment{ a comment block with {nested} braces and an @ sign }\n\n"
+        yield _bib_entry(r, i)
+
+
+def _raindrop_link(r: random.Random, i: int, title: str) -> str:
+    href = f"https://example.org/{r.choice(_WORDS)}/{i}?q={r.choice(_WORDS)}&amp;page={r.randint(1, 9)}"
+    return f'<DT><A HREF="{href}" ADD_DATE="{1600000000 + i}" TAGS="{r.choice(_WORDS)}">{title}</A>\n'
+
+
+def iter_raindrop_corpus(n: int, seed: int = 0) -> Iterator[str]:
+    # Netscape bookmark HTML in the shape Raindrop exports (one link row per bookmark + optional notes).
+    r = random.Random(seed)
+    yield "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n<META HTTP-EQUIV=\"Content-Type\" CONTENT=\"text/html; charset=UTF-8\">\n"
+    yield "<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n"
+    for i in range(n):
+        if i % 1000 == 0:
+            yield f"<DT><H3>{_words(r, 2).title()}</H3>\n<DL><p>\n"
+        title = _words(r, r.randint(2, 12)).capitalize()
+        if r.random() < 0.2:
+            title += " &amp; " + r.choice(("&lt;code&gt;", "&quot;quoted&quot;", "&#39;s", "&#8212; dash", "caf&#233;"))
+        x = r.random()
+        if x < 0.1:
+            # Extra consecutive link rows right before a note (the cleaner keeps only the last one).
+            for _ in range(r.randint(1, 4)):
+                yield _raindrop_link(r, i, _words(r, 3).capitalize())
+        yield _raindrop_link(r, i, title)
+        if x < 0.6:
+            for _ in range(r.choice((1, 1, 1, 2, 5))):
+                lines = [_words(r, r.randint(5, 80)) for _ in range(r.choice((1, 1, 2, 4)))]
+                if r.random() < 0.02:
+                    lines.append(_words(r, r.randint(2000, 5000)))
+                yield "<DD><blockquote>" + "<br>\n".join(lines) + "</blockquote>\n"
+        if i % 1000 == 999 or i == n - 1:
+            yield "</DL><p>\n"
+    yield "</DL><p>\n"
+
+
+def write_corpus(path: Path, kind: str, n: int, seed: int = 0) -> Path:
+    # Writes (or reuses) a generated corpus; the output only depends on (kind, n, seed).
+    gen = {"zotero": iter_bibtex_corpus, "raindrop": iter_raindrop_corpus}[kind]
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        for piece in gen(n, seed):
+            f.write(piece)
+    tmp.replace(path)
+    return path
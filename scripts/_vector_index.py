@@ -0,0 +1,424 @@
+"""
+Local, memory-mapped vector index over page embeddings (for offline related-pages lookups).
+
+Why: every related-pages lookup is a network round trip (and `match_pages` caps results at 200).
+Here we mirror `embedding` + a little page metadata into a local directory:
+- vectors.f32   float32 matrix (capacity x dim), memory-mapped; rows are kept dense (swap-remove on delete)
+- norms.f32     L2 norm per row, so one matrix-vector product serves both cosine and L2
+- meta.sqlite   page id <-> row, title/tags/timestamps, sync cursor
+- ivf.npz       optional IVF (k-means coarse quantizer): search only the `nprobe` nearest clusters
+
+Sync is incremental by `embedding_updated_at` (GET /api/embeddings). Requires numpy (optional dependency:
+the rest of the scripts do not need it).
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None  # type: ignore[assignment]
+
+from _enkidu_api import EnkiduClient
+from _keyset import iter_ids, iter_since, later, since_cursor
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("The local vector index needs numpy: pip install numpy")
+
+
+def parse_pgvector(text: str) -> Any:
+    # PostgREST returns vector columns as text: "[0.1,0.2,...]".
+    s = str(text or "").strip()
+    if s.startswith("[") and s.endswith("]"):
+        s = s[1:-1]
+    return np.array(s.split(","), dtype=np.float32)
+
+
+@dataclass
+class SyncSummary:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class Hit:
+    id: str
+    score: float  # cosine similarity (higher is closer) or L2 distance (lower is closer)
+    title: str
+
+
+class VectorIndex:
+    def __init__(self, root: Path):
+        require_numpy()
+        self.root = root
+        root.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(root / "meta.sqlite"))
+        self.db.executescript(
+            """
+            pragma journal_mode = wal;
+            pragma synchronous = normal;
+            create table if not exists rows (
+              id text primary key,
+              row integer not null unique,
+              title text not null default '',
+              tags text not null default '[]',
+              created_at text not null default '',
+              updated_at text not null default '',
+              embedding_model text not null default '',
+              embedding_updated_at text not null default ''
+            );
+            create table if not exists meta (
+              key text primary key,
+              value text not null
+            );
+            """
+        )
+        self.dim = int(self._get_meta("dim") or 0)
+        self.count = int(self._get_meta("count") or 0)
+        self.capacity = 0
+        self._vecs: Any = None
+        self._norms: Any = None
+        self._ids: list[str] | None = None
+        self._titles: list[str] | None = None
+        self._ivf: dict[str, Any] | None = None
+        if self.dim:
+            self._open_arrays(max(self.count, 1))
+
+    def close(self) -> None:
+        self._flush()
+        self.db.close()
+
+    def __enter__(self) -> VectorIndex:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    # -------------------------
+    # Storage
+    # -------------------------
+
+    def _get_meta(self, key: str) -> str:
+        row = self.db.execute("select value from meta where key = ?", (key,)).fetchone()
+        return str(row[0]) if row else ""
+
+    def _set_meta(self, values: dict[str, Any]) -> None:
+        self.db.executemany(
+            "insert into meta (key, value) values (?, ?) on conflict(key) do update set value = excluded.value",
+            [(k, "" if v is None else str(v)) for k, v in values.items()],
+        )
+
+    def _open_arrays(self, min_rows: int) -> None:
+        # Memory-map the matrices, growing the backing files (doubling) when more rows are needed.
+        vec_path = self.root / "vectors.f32"
+        norm_path = self.root / "norms.f32"
+        row_bytes = self.dim * 4
+        have = vec_path.stat().st_size // row_bytes if vec_path.exists() else 0
+        capacity = max(have, 1024)
+        while capacity < min_rows:
+            capacity *= 2
+        if capacity != have or not norm_path.exists():
+            self._flush()
+            self._vecs = self._norms = None
+            with open(vec_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            with open(norm_path, "ab") as f:
+                f.truncate(capacity * 4)
+        if self._vecs is None or capacity != self.capacity:
+            self._vecs = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            self._norms = np.memmap(norm_path, dtype=np.float32, mode="r+", shape=(capacity,))
+            self.capacity = capacity
+
+    def _flush(self) -> None:
+        if self._vecs is not None:
+            self._vecs.flush()
+            self._norms.flush()
+
+    def _row_maps(self) -> tuple[list[str], list[str]]:
+        if self._ids is None:
+            ids = [""] * self.count
+            titles = [""] * self.count
+            for pid, row, title in self.db.execute("select id, row, title from rows"):
+                ids[row] = pid
+                titles[row] = title
+            self._ids, self._titles = ids, titles
+        return self._ids, self._titles  # type: ignore[return-value]
+
+    def _put(self, page: dict[str, Any], vec: Any, summary: SyncSummary) -> None:
+        if not self.dim:
+            self.dim = int(vec.shape[0])
+            self._open_arrays(1024)
+        if vec.shape[0] != self.dim:
+            raise RuntimeError(f"Embedding dimension changed ({vec.shape[0]} != {self.dim}); rebuild with --reset")
+        pid = str(page["id"])
+        hit = self.db.execute("select row, embedding_updated_at from rows where id = ?", (pid,)).fetchone()
+        if hit:
+            if hit[1] and hit[1] == str(page.get("embedding_updated_at") or ""):
+                return  # re-sent by the sync overlap window; nothing changed
+            row = int(hit[0])
+            summary.updated += 1
+        else:
+            row = self.count
+            if row >= self.capacity:
+                self._open_arrays(row + 1)
+            self.count += 1
+            summary.added += 1
+        self._vecs[row] = vec
+        self._norms[row] = float(np.linalg.norm(vec))
+        self.db.execute(
+            "insert into rows (id, row, title, tags, created_at, updated_at, embedding_model, embedding_updated_at) "
+            "values (?, ?, ?, ?, ?, ?, ?, ?) on conflict(id) do update set title = excluded.title, tags = excluded.tags, "
+            "updated_at = excluded.updated_at, embedding_model = excluded.embedding_model, "
+            "embedding_updated_at = excluded.embedding_updated_at",
+            (
+                pid,
+                row,
+                str(page.get("title") or ""),
+                json.dumps(page.get("tags") or []),
+                str(page.get("created_at") or ""),
+                str(page.get("updated_at") or ""),
+                str(page.get("embedding_model") or ""),
+                str(page.get("embedding_updated_at") or ""),
+            ),
+        )
+
+    def _remove(self, pid: str) -> bool:
+        # Swap-remove: move the last row into the freed slot so the matrix stays dense.
+        hit = self.db.execute("select row from rows where id = ?", (pid,)).fetchone()
+        if not hit:
+            return False
+        row = int(hit[0])
+        last = self.count - 1
+        self.db.execute("delete from rows where id = ?", (pid,))
+        if row != last:
+            self._vecs[row] = self._vecs[last]
+            self._norms[row] = self._norms[last]
+            self.db.execute("update rows set row = ? where row = ?", (row, last))
+        self.count -= 1
+        return True
+
+    # -------------------------
+    # Sync
+    # -------------------------
+
+    def sync(
+        self,
+        client: EnkiduClient,
+        *,
+        base_url: str,
+        page_size: int = 200,
+        progress: Callable[[str], None] | None = print,
+    ) -> SyncSummary:
+        # Purpose: pull embeddings written since the last sync, then drop pages deleted on the server.
+        started = time.perf_counter()
+        summary = SyncSummary()
+        known_base = self._get_meta("base_url")
+        if known_base and known_base != base_url:
+            raise RuntimeError(f"Index was built from {known_base}; use another --index-dir or --reset")
+
+        last_ts = self._get_meta("max_embedding_updated_at")
+        max_ts = last_ts
+        fetched = 0
+        for pages in iter_since(client, "/api/embeddings", since_cursor(last_ts), page_size=page_size):
+            with self.db:
+                for page in pages:
+                    if page.get("id") and page.get("embedding"):
+                        self._put(page, parse_pgvector(page["embedding"]), summary)
+                        max_ts = later(max_ts, str(page.get("embedding_updated_at") or ""))
+                self._set_meta({"count": self.count, "dim": self.dim})
+                # Vectors hit the disk before the rows that point at them are committed.
+                self._flush()
+            fetched += len(pages)
+            if progress:
+                progress(f"Fetched {fetched} embeddings ({summary.added + summary.updated} new/changed, {self.count} in index)...")
+
+        # Deletions: only list ids when the server count disagrees with ours.
+        stats = client.request("GET", "/api/embeddings?stats=1") or {}
+        if int(stats.get("count") or 0) != self.count:
+            server_ids = set(iter_ids(client, "/api/embeddings"))
+            self._ids = self._titles = None
+            ids, _titles = self._row_maps()
+            with self.db:
+                for pid in [p for p in ids if p not in server_ids]:
+                    if self._remove(pid):
+                        summary.removed += 1
+                self._set_meta({"count": self.count})
+                self._flush()
+
+        with self.db:
+            self._set_meta({"base_url": base_url, "max_embedding_updated_at": max_ts or "", "synced_at": time.time()})
+        self._flush()
+        self._ids = self._titles = None
+        if summary.added or summary.updated or summary.removed:
+            self._refresh_ivf()
+        summary.seconds = time.perf_counter() - started
+        return summary
+
+    # -------------------------
+    # IVF (approximate search)
+    # -------------------------
+
+    def _unit_rows(self, rows: Any) -> Any:
+        x = np.asarray(self._vecs[rows], dtype=np.float32)
+        n = np.asarray(self._norms[rows], dtype=np.float32)
+        return x / np.maximum(n, 1e-12)[:, None]
+
+    def build_ivf(self, *, nlist: int = 0, iters: int = 10, sample: int = 50_000, seed: int = 0) -> int:
+        # Purpose: spherical k-means over unit vectors; each row is filed under its nearest centroid.
+        if self.count < 2:
+            raise RuntimeError("Not enough vectors to build an IVF index")
+        nlist = nlist or max(1, int(np.sqrt(self.count)))
+        nlist = min(nlist, self.count)
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(self.count, size=min(sample, self.count), replace=False))
+        train = self._unit_rows(train_rows)
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = train[assign == c]
+                if len(members):
+                    v = members.sum(axis=0)
+                    centroids[c] = v / max(float(np.linalg.norm(v)), 1e-12)
+        self._ivf = {"centroids": centroids.astype(np.float32), "trained_count": np.int64(self.count)}
+        self._assign_all()
+        return nlist
+
+    def _assign_all(self, block: int = 8192) -> None:
+        centroids = self._ivf["centroids"]
+        assign = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, block):
+            rows = np.arange(start, min(self.count, start + block))
+            assign[rows] = np.argmax(self._unit_rows(rows) @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64)
+        self._ivf.update({"order": order, "offsets": offsets, "count": np.int64(self.count)})
+        np.savez(self.root / "ivf.npz", **self._ivf)
+
+    def _load_ivf(self) -> dict[str, Any] | None:
+        if self._ivf is None and (self.root / "ivf.npz").exists():
+            with np.load(self.root / "ivf.npz") as z:
+                self._ivf = {k: z[k] for k in z.files}
+        return self._ivf
+
+    def _refresh_ivf(self) -> None:
+        # Keep an existing IVF usable after a sync: re-file rows under the trained centroids, and
+        # retrain once the index has doubled since training (clusters drift as the library grows).
+        ivf = self._load_ivf()
+        if ivf is None:
+            return
+        if self.count < 2:
+            (self.root / "ivf.npz").unlink(missing_ok=True)
+            self._ivf = None
+        elif self.count > 2 * int(ivf["trained_count"]):
+            self.build_ivf(nlist=0)
+        else:
+            self._assign_all()
+
+    # -------------------------
+    # Search
+    # -------------------------
+
+    def vector_for(self, page_id: str) -> Any | None:
+        hit = self.db.execute("select row from rows where id = ?", (page_id,)).fetchone()
+        return np.array(self._vecs[int(hit[0])]) if hit else None
+
+    def embedding_model(self) -> str:
+        row = self.db.execute(
+            "select embedding_model from rows group by embedding_model order by count(*) desc limit 1"
+        ).fetchone()
+        return str(row[0]) if row else ""
+
+    def search(
+        self,
+        queries: Any,
+        *,
+        k: int = 10,
+        metric: str = "cosine",
+        nprobe: int | None = None,
+        exclude: Iterable[str] = (),
+    ) -> list[list[Hit]]:
+        # Batched top-k: one (rows x dim) @ (dim x queries) product, then argpartition per query.
+        # nprobe: search only that many IVF clusters per query (None = exact scan over all rows).
+        if metric not in ("cosine", "l2"):
+            raise ValueError("metric must be 'cosine' or 'l2'")
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not self.count:
+            return [[] for _ in range(len(q))]
+        if q.shape[1] != self.dim:
+            raise ValueError(f"query dimension {q.shape[1]} != index dimension {self.dim}")
+        ids, titles = self._row_maps()
+        skip = set(exclude)
+        want = k + len(skip)
+
+        ivf = self._load_ivf() if nprobe else None
+        if ivf is not None and int(ivf["count"]) != self.count:
+            ivf = None  # stale (should not happen after sync); fall back to exact search
+
+        out: list[list[Hit]] = []
+        if ivf is None:
+            scores = self._score(np.arange(self.count), q, metric)
+            for j in range(len(q)):
+                out.append(self._top(scores[:, j], None, want, metric, ids, titles, skip, k))
+            return out
+
+        qn = q / np.maximum(np.linalg.norm(q, axis=1), 1e-12)[:, None]
+        probe = np.argsort(-(qn @ ivf["centroids"].T), axis=1)[:, :nprobe]
+        order, offsets = ivf["order"], ivf["offsets"]
+        for j in range(len(q)):
+            rows = np.concatenate([order[offsets[c] : offsets[c + 1]] for c in probe[j]])
+            if not len(rows):
+                out.append([])
+                continue
+            rows.sort()  # sequential reads from the memmap
+            scores = self._score(rows, q[j : j + 1], metric)[:, 0]
+            out.append(self._top(scores, rows, want, metric, ids, titles, skip, k))
+        return out
+
+    def _score(self, rows: Any, q: Any, metric: str) -> Any:
+        full = len(rows) == self.count
+        x = self._vecs[: self.count] if full else self._vecs[rows]
+        norms = self._norms[: self.count] if full else self._norms[rows]
+        dots = np.asarray(x @ q.T)  # (rows, queries)
+        qn = np.linalg.norm(q, axis=1)
+        if metric == "cosine":
+            return dots / np.maximum(np.outer(norms, qn), 1e-12)
+        # Squared L2 via the norms (no per-row difference vectors).
+        return np.maximum(np.asarray(norms)[:, None] ** 2 - 2 * dots + qn[None, :] ** 2, 0.0)
+
+    @staticmethod
+    def _top(
+        scores: Any,
+        rows: Any | None,
+        want: int,
+        metric: str,
+        ids: list[str],
+        titles: list[str],
+        skip: set[str],
+        k: int,
+    ) -> list[Hit]:
+        keyed = -scores if metric == "cosine" else scores
+        want = min(want, len(keyed))
+        idx = np.argpartition(keyed, want - 1)[:want]
+        idx = idx[np.argsort(keyed[idx])]
+        hits: list[Hit] = []
+        for i in idx:
+            row = int(rows[i]) if rows is not None else int(i)
+            if ids[row] in skip:
+                continue
+            score = float(scores[i]) if metric == "cosine" else float(np.sqrt(scores[i]))
+            hits.append(Hit(id=ids[row], score=score, title=titles[row]))
+            if len(hits) >= k:
+                break
+        return hits
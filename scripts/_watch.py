@@ -0,0 +1,229 @@
+"""
+Incremental re-sync support for watch mode: a debounced file poller plus a byte-offset entry index.
+
+Why: Better BibTeX rewrites the whole export on every edit in Zotero, but an edit only touches a few
+entries. EntryIndex keeps each entry's [start, end) byte span from the last parse; on a new version it
+finds the changed window (common prefix/suffix of old and new bytes, memcmp speed), re-parses only the
+entries overlapping it, shifts the spans after it, and reports just the entries whose bytes changed
+and the keys that disappeared. Anything it can't do safely (edited or mid-file @string macros, keys that
+moved across the window, invalid UTF-8) falls back to a full parse diffed entry by entry.
+
+Stdlib only; polling (os.stat) rather than OS file events, so it behaves the same on every platform and
+on synced/network folders.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+# parse(text) -> (start, end, record) with str offsets into `text`, in file order.
+ParseSpans = Callable[[str], Iterator[tuple[int, int, Any]]]
+
+_BLOCK = 64 * 1024
+_SMALL = 256
+
+
+def common_prefix(a: bytes, b: bytes) -> int:
+    # Length of the common prefix: block compares first (memcmp), then narrow down.
+    n = min(len(a), len(b))
+    i = 0
+    for step in (_BLOCK, _SMALL, 1):
+        while i + step <= n and a[i : i + step] == b[i : i + step]:
+            i += step
+    return i
+
+
+def common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    # Length of the common suffix, at most `limit` bytes (so it never overlaps the common prefix).
+    la, lb = len(a), len(b)
+    i = 0
+    for step in (_BLOCK, _SMALL, 1):
+        while i + step <= limit and a[la - i - step : la - i] == b[lb - i - step : lb - i]:
+            i += step
+    return i
+
+
+def _byte_offsets(text: str, data: bytes, offsets: list[int]) -> list[int]:
+    # str offsets (ascending) -> byte offsets in the UTF-8 `data` that `text` was decoded from.
+    if len(text) == len(data):  # pure ASCII
+        return offsets
+    out: list[int] = []
+    pos = byte = 0
+    for off in offsets:
+        byte += len(text[pos:off].encode("utf-8"))
+        pos = off
+        out.append(byte)
+    return out
+
+
+@dataclass
+class IndexDelta:
+    changed: list[Any] = field(default_factory=list)  # new or edited records, in file order
+    removed: set[str] = field(default_factory=set)  # keys no longer in the file
+    parsed_bytes: int = 0  # how much was re-parsed
+    full: bool = False  # fell back to a full parse
+
+
+class EntryIndex:
+    """Byte spans and keys of every record from the last parse of a file."""
+
+    def __init__(self, parse: ParseSpans, key_of: Callable[[Any], str], *, macros: re.Pattern[bytes] | None = None):
+        # macros: definitions that change how *later* records parse (BibTeX @string). Those in the header (before
+        # the first record) are re-read with every region; anywhere else they force a full parse.
+        self.parse = parse
+        self.key_of = key_of
+        self.macros = macros
+        self.data = b""
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        self.keys: list[str] = []
+        self._lenient = False  # last parse needed errors="replace": no spans, every update is a full one
+        self._head_macros = False
+        self._body_macros = False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _parse_region(self, data: bytes, lo: int, hi: int, prelude: bytes = b"") -> tuple[list[int], list[int], list[Any]] | None:
+        try:
+            head, text = prelude.decode("utf-8"), data[lo:hi].decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+        n = len(head)
+        spans = [(s - n, e - n, r) for s, e, r in self.parse(head + text) if s >= n]
+        flat = _byte_offsets(text, data[lo:hi], [o for s, e, _r in spans for o in (s, e)])
+        return [lo + b for b in flat[0::2]], [lo + b for b in flat[1::2]], [r for _s, _e, r in spans]
+
+    def rebuild(self, data: bytes) -> list[Any]:
+        # Full parse; returns every record. Invalid UTF-8 is parsed leniently and disables incremental updates.
+        parsed = self._parse_region(data, 0, len(data))
+        if parsed is None:
+            records = [r for _s, _e, r in self.parse(data.decode("utf-8", errors="replace"))]
+            self.starts, self.ends = [], []
+            self._lenient = True
+        else:
+            self.starts, self.ends, records = parsed
+            self._lenient = False
+        self.keys = [self.key_of(r) for r in records]
+        self.data = data
+        head = self.starts[0] if self.starts else len(data)
+        self._head_macros = bool(self.macros and self.macros.search(data, 0, head))
+        self._body_macros = bool(self.macros and self.macros.search(data, head))
+        return records
+
+    def _raw_by_key(self) -> dict[str, bytes]:
+        out: dict[str, bytes] = {}
+        for s, e, k in zip(self.starts, self.ends, self.keys):
+            out.setdefault(k, self.data[s:e])
+        return out
+
+    def _macro_context(self) -> bytes | None:
+        # What a record's parse depends on besides its own bytes: the header, if it defines macros
+        # (None: unknown, e.g. macros between records or a lenient parse).
+        if self._lenient or self._body_macros:
+            return None
+        return self.data[: self.starts[0]] if self._head_macros else b""
+
+    def _full_update(self, data: bytes) -> IndexDelta:
+        # Whole-file fallback: re-parse, then report records whose own bytes changed (first occurrence per key).
+        # If the macros may have changed, same bytes can parse differently: every record is reported.
+        old_context = self._macro_context()
+        old = self._raw_by_key()
+        old_keys = set(self.keys)
+        records = self.rebuild(data)
+        delta = IndexDelta(parsed_bytes=len(data), full=True)
+        new_keys: set[str] = set()
+        context = self._macro_context()
+        fresh = self._raw_by_key() if context is not None and context == old_context else None
+        for r in records:
+            k = self.key_of(r)
+            if k in new_keys:
+                continue
+            new_keys.add(k)
+            if fresh is None or old.get(k) != fresh.get(k):
+                delta.changed.append(r)
+        delta.removed = old_keys - new_keys
+        return delta
+
+    def update(self, data: bytes) -> IndexDelta:
+        old = self.data
+        if data == old:
+            return IndexDelta()
+        if self._lenient or not self.keys:
+            return self._full_update(data)
+        p = common_prefix(old, data)
+        sfx = common_suffix(old, data, min(len(old), len(data)) - p)
+        old_end, shift = len(old) - sfx, len(data) - len(old)
+        head = self.starts[0]
+        if self.macros and (
+            self._body_macros
+            or (p < head and (self._head_macros or self.macros.search(data, 0, head + shift)))
+            or self.macros.search(data, max(p, head))
+        ):
+            # A macro changed, or one lives between records: any record after it may now parse differently.
+            return self._full_update(data)
+
+        # Affected: entries overlapping the changed window [p, old_end). Re-parse from the end of the last
+        # entry before it to the start of the first entry after it (gaps included: new entries land there).
+        i = bisect.bisect_right(self.ends, p)
+        j = bisect.bisect_left(self.starts, old_end, lo=i)
+        if j < len(self.starts) and self.starts[j] < old_end:
+            j += 1
+        lo = self.ends[i - 1] if i else 0
+        hi_old = self.starts[j] if j < len(self.starts) else len(old)
+        hi_new = hi_old + shift
+        parsed = self._parse_region(data, lo, hi_new, old[:head] if lo and self._head_macros else b"")
+        if parsed is None:
+            return self._full_update(data)
+        starts, ends, records = parsed
+        keys = [self.key_of(r) for r in records]
+
+        # A key that also lives outside the region (moved entry, duplicate citekey) changes which copy wins.
+        old_keys = self.keys[i:j]
+        outside = set(self.keys[:i]) | set(self.keys[j:])
+        if len(set(keys)) != len(keys) or len(set(old_keys)) != len(old_keys) or outside & set(keys + old_keys):
+            return self._full_update(data)
+
+        old_raw = {k: old[s:e] for s, e, k in zip(self.starts[i:j], self.ends[i:j], old_keys)}
+        delta = IndexDelta(parsed_bytes=hi_new - lo)
+        for s, e, k, r in zip(starts, ends, keys, records):
+            if old_raw.get(k) != data[s:e]:
+                delta.changed.append(r)
+        delta.removed = set(old_raw) - set(keys)
+
+        self.starts = self.starts[:i] + starts + [s + shift for s in self.starts[j:]]
+        self.ends = self.ends[:i] + ends + [e + shift for e in self.ends[j:]]
+        self.keys = self.keys[:i] + keys + self.keys[j:]
+        self.data = data
+        return delta
+
+
+def file_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def wait_for_change(path: Path, last: tuple[int, int] | None, *, interval: float, debounce: float) -> tuple[int, int]:
+    # Block until the file differs from `last` and then stays unchanged for `debounce` seconds
+    # (exporters write in several steps; syncing a half-written file would look like mass deletions).
+    while True:
+        sig = file_signature(path)
+        if sig is not None and sig != last:
+            quiet_since = time.monotonic()
+            while time.monotonic() - quiet_since < debounce:
+                time.sleep(min(interval, debounce))
+                now = file_signature(path)
+                if now != sig:
+                    sig, quiet_since = now, time.monotonic()
+            if sig is not None and sig != last:
+                return sig
+        time.sleep(interval)
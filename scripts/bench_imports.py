@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the import scripts on deterministic synthetic corpora.
+
+What it does (minimal + targeted):
+- Generates (once, cached) synthetic Zotero .bib files and Raindrop HTML exports at the requested sizes
+  (scripts/_synthetic_corpora.py: deep braces, long abstracts, multi-attachment `file` fields...).
+- Times each stage on each corpus and records throughput (entries or lines/s, MB/s) and peak RSS:
+  - zotero/parse   parse_bibtex()
+  - zotero/render  _page_title() + _body_markdown()
+  - zotero/hash    _source_hash()
+  - zotero/transform  hash + ids + page for every entry across all cores (zotero_items_parallel())
+  - raindrop/clean clean_lines() (clean_raindrop_export_links.py)
+  - raindrop/parse iter_raindrop_items() + page build (_raindrop_source.py)
+- Each (corpus, stage) runs in a fresh process, so peak RSS is that stage's own high-water mark
+  (it includes the stage's input, e.g. the parsed entries for render/hash).
+- Compares against a stored baseline and flags regressions (exit code 1).
+
+Usage (PowerShell):
+  python scripts/bench_imports.py --save-baseline
+  python scripts/bench_imports.py
+  python scripts/bench_imports.py --sizes 1k,10k,100k --stages zotero/parse,raindrop/clean
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from _synthetic_corpora import write_corpus
+
+STAGES = ("zotero/parse", "zotero/render", "zotero/hash", "zotero/transform", "raindrop/clean", "raindrop/parse")
+_SUFFIX = {"zotero": ".bib", "raindrop": ".html"}
+
+
+def _default_dir() -> Path:
+    return Path.home() / ".enkidu" / "bench"
+
+
+def _parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = 1
+    if s.endswith("k"):
+        mult, s = 1000, s[:-1]
+    elif s.endswith("m"):
+        mult, s = 1_000_000, s[:-1]
+    return int(float(s) * mult)
+
+
+def _size_label(n: int) -> str:
+    return f"{n // 1000}k" if n % 1000 == 0 else str(n)
+
+
+def _peak_rss_bytes() -> int:
+    # High-water mark of this process's resident set (0 if the platform doesn't tell us).
+    try:
+        import resource
+    except ImportError:
+        resource = None  # type: ignore[assignment]
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        c = _Counters()
+        c.cb = ctypes.sizeof(c)
+        proc = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(proc, ctypes.byref(c), c.cb):
+            return int(c.PeakWorkingSetSize)
+    return 0
+
+
+def _run_stage(stage: str, path: str, repeat: int) -> dict[str, Any]:
+    # Runs in a child process. Input preparation is untimed; the best of `repeat` runs is reported.
+    import import_zotero_bib_to_pages as z
+    from _raindrop_source import iter_raindrop_items
+    from clean_raindrop_export_links import clean_lines
+
+    p = Path(path)
+    n_bytes = p.stat().st_size
+    timings: list[float] = []
+    items = 0
+
+    if stage.startswith("zotero/"):
+        raw = p.read_text(encoding="utf-8", errors="replace")
+        entries = z.parse_bibtex(raw) if stage != "zotero/parse" else []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            if stage == "zotero/parse":
+                items = len(z.parse_bibtex(raw))
+            elif stage == "zotero/transform":
+                items = sum(1 for it in z.zotero_items_parallel(entries, workers=os.cpu_count() or 1) if it.build())
+            elif stage == "zotero/render":
+                for e in entries:
+                    z._page_title(e.fields)
+                    z._body_markdown(e.fields)
+                items = len(entries)
+            else:
+                for e in entries:
+                    z._source_hash(e)
+                items = len(entries)
+            timings.append(time.perf_counter() - t0)
+    elif stage == "raindrop/clean":
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            with open(p, "rb", buffering=1024 * 1024) as f:
+                items = sum(1 for _ in clean_lines(f))
+            timings.append(time.perf_counter() - t0)
+    elif stage == "raindrop/parse":
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            with open(p, encoding="utf-8", errors="replace", newline="") as f:
+                items = 0
+                for item in iter_raindrop_items(f):
+                    item.build()
+                    items += 1
+            timings.append(time.perf_counter() - t0)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    best = min(timings)
+    return {
+        "items": items,
+        "unit": "lines" if stage == "raindrop/clean" else "entries",
+        "bytes": n_bytes,
+        "seconds": best,
+        "items_per_s": items / best if best > 0 else 0.0,
+        "mb_per_s": n_bytes / 1e6 / best if best > 0 else 0.0,
+        "peak_rss_mb": _peak_rss_bytes() / 1e6,
+    }
+
+
+def _compare(results: dict[str, dict[str, Any]], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    # Returns human-readable regressions (throughput down or peak RSS up by more than `tolerance`).
+    regressions: list[str] = []
+    base = baseline.get("results") or {}
+    print()
+    print(f"{'benchmark':<28} {'items/s':>12} {'vs base':>9} {'peak RSS':>10} {'vs base':>9}")
+    for key, r in results.items():
+        b = base.get(key)
+        if not b:
+            print(f"{key:<28} {r['items_per_s']:>12,.0f} {'(new)':>9} {r['peak_rss_mb']:>8.0f}MB {'(new)':>9}")
+            continue
+        speed = r["items_per_s"] / b["items_per_s"] - 1 if b.get("items_per_s") else 0.0
+        rss = r["peak_rss_mb"] / b["peak_rss_mb"] - 1 if b.get("peak_rss_mb") else 0.0
+        flag = ""
+        if speed < -tolerance:
+            regressions.append(f"{key}: throughput {speed:+.0%} ({b['items_per_s']:,.0f} -> {r['items_per_s']:,.0f} {r.get('unit', 'entries')}/s)")
+            flag = "  <-- slower"
+        if rss > tolerance:
+            regressions.append(f"{key}: peak RSS {rss:+.0%} ({b['peak_rss_mb']:.0f} -> {r['peak_rss_mb']:.0f} MB)")
+            flag += "  <-- more memory"
+        print(f"{key:<28} {r['items_per_s']:>12,.0f} {speed:>+9.0%} {r['peak_rss_mb']:>8.0f}MB {rss:>+9.0%}{flag}")
+    return regressions
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark the import scripts' parsers on synthetic corpora.")
+    p.add_argument("--sizes", default="1k,10k", help="Comma-separated corpus sizes (entries). Default: 1k,10k.")
+    p.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages. Default: all ({', '.join(STAGES)}).")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per benchmark (best one counts). Default: 3.")
+    p.add_argument("--seed", type=int, default=0, help="Corpus generator seed. Default: 0.")
+    p.add_argument("--work-dir", type=Path, default=None, help="Corpora + baseline directory. Default: ~/.enkidu/bench.")
+    p.add_argument("--baseline", type=Path, default=None, help="Baseline JSON. Default: <work-dir>/baseline.json.")
+    p.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    p.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Flag a regression when throughput drops (or peak RSS grows) by more than this fraction. Default: 0.25.",
+    )
+    p.add_argument("--json", type=Path, default=None, help="Also write this run's results to a JSON file.")
+    args = p.parse_args()
+
+    work_dir = args.work_dir or _default_dir()
+    baseline_path = args.baseline or work_dir / "baseline.json"
+    sizes = [_parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        print(f"ERROR: unknown stage(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    results: dict[str, dict[str, Any]] = {}
+    ctx = multiprocessing.get_context("spawn")
+    for n in sizes:
+        for kind in ("zotero", "raindrop"):
+            kind_stages = [s for s in stages if s.startswith(kind + "/")]
+            if not kind_stages:
+                continue
+            corpus = work_dir / "corpora" / f"{kind}-{_size_label(n)}-s{args.seed}{_SUFFIX[kind]}"
+            if not corpus.exists():
+                print(f"Generating {corpus.name}...")
+            write_corpus(corpus, kind, n, seed=args.seed)
+            for stage in kind_stages:
+                # Fresh process per benchmark: isolates peak RSS and avoids warm caches between stages.
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+                    r = ex.submit(_run_stage, stage, str(corpus), args.repeat).result()
+                key = f"{stage}/{_size_label(n)}"
+                results[key] = r
+                print(
+                    f"{key:<28} {r['items']:>8} {r['unit']:<7} in {r['seconds']:.3f}s  "
+                    f"{r['items_per_s']:>10,.0f}/s  {r['mb_per_s']:>6.1f} MB/s  peak RSS {r['peak_rss_mb']:.0f} MB"
+                )
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    exit_code = 0
+    if baseline_path.exists() and not args.save_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = _compare(results, baseline, args.tolerance)
+        meta = baseline.get("meta") or {}
+        print(f"(baseline: {baseline_path}, {meta.get('created_at', '?')}, Python {meta.get('python', '?')})")
+        if regressions:
+            print("REGRESSIONS:\n" + "\n".join(f"- {r}" for r in regressions), file=sys.stderr)
+            exit_code = 1
+    elif not args.save_baseline:
+        print(f"No baseline at {baseline_path} (run with --save-baseline to store one).")
+
+    if args.save_baseline:
+        merged = results
+        if baseline_path.exists():
+            # Keep baseline entries for sizes/stages that weren't part of this run.
+            merged = {**(json.loads(baseline_path.read_text(encoding="utf-8")).get("results") or {}), **results}
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({**report, "results": merged}, indent=2), encoding="utf-8")
+        print(f"Saved baseline: {baseline_path}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
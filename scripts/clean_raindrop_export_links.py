@@ -7,38 +7,48 @@ Rule implemented (minimal + targeted):
   pending link line (<DT><A ...>) immediately before that note block.
 - Links that are not followed by a note block are left unchanged.
 
+Streaming: works line-by-line on raw bytes (no full read/decode), so memory is bounded by one
+pending link group, not the export size. Several exports can be cleaned in parallel (--jobs).
+
 Usage (PowerShell):
   python scripts/clean_raindrop_export_links.py "C:/Users/Zoom/Downloads/c4a6e179-d08c-48c3-b36a-3e23f4a78792.html"
+  python scripts/clean_raindrop_export_links.py --jobs 4 "C:/Users/Zoom/Downloads/export1.html" "C:/Users/Zoom/Downloads/export2.html"
 """
 
 from __future__ import annotations
 
 import argparse
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
 
+LINK_RE = re.compile(rb"^\s*<DT><A\b", re.IGNORECASE)  # Raindrop link row
+NOTE_RE = re.compile(rb"^\s*<DD\b", re.IGNORECASE)    # note/description row(s)
 
-LINK_RE = re.compile(r"^\s*<DT><A\b", re.IGNORECASE)  # Raindrop link row
-NOTE_RE = re.compile(r"^\s*<DD\b", re.IGNORECASE)    # note/description row(s)
+# Read buffer for streaming (lines are still processed one at a time).
+_BUF_SIZE = 1024 * 1024
 
 
-def clean_lines(lines: list[str]) -> list[str]:
+def clean_lines(lines: Iterable[bytes]) -> Iterator[bytes]:
     # Keep a run of link lines until we know what comes next.
-    pending_links: list[str] = []
-    pending_blanks: list[str] = []  # blank lines after pending_links (preserve order)
-    out: list[str] = []
+    # Generator: yields output lines as soon as they are decided (only the pending group is buffered).
+    pending_links: list[bytes] = []
+    pending_blanks: list[bytes] = []  # blank lines after pending_links (preserve order)
 
     for line in lines:
         stripped = line.strip()
 
         is_link = bool(LINK_RE.match(line))
         is_note = bool(NOTE_RE.match(line))
-        is_blank = stripped == ""
+        is_blank = not stripped
 
         if is_link:
             # If we somehow accumulated blanks without any links, flush them.
             if not pending_links and pending_blanks:
-                out.extend(pending_blanks)
+                yield from pending_blanks
                 pending_blanks = []
             pending_links.append(line)
             continue
@@ -51,56 +61,90 @@ def clean_lines(lines: list[str]) -> list[str]:
         if is_note:
             # Note starts: keep only the last link from any run right before it.
             if pending_links:
-                out.append(pending_links[-1])
+                yield pending_links[-1]
                 pending_links = []
-                out.extend(pending_blanks)
+                yield from pending_blanks
                 pending_blanks = []
-            out.append(line)
+            yield line
             continue
 
         # Any other line: these pending links weren't followed by a note, so keep them all.
         if pending_links:
-            out.extend(pending_links)
+            yield from pending_links
             pending_links = []
         if pending_blanks:
-            out.extend(pending_blanks)
+            yield from pending_blanks
             pending_blanks = []
-        out.append(line)
+        yield line
 
     # Flush anything left at EOF.
-    if pending_links:
-        out.extend(pending_links)
-    if pending_blanks:
-        out.extend(pending_blanks)
+    yield from pending_links
+    yield from pending_blanks
+
+
+def clean_stream(src: BinaryIO, dst: BinaryIO) -> tuple[int, int]:
+    # Purpose: stream src -> dst through clean_lines. Returns (lines_in, lines_out).
+    lines_in = 0
+    lines_out = 0
+
+    def _counted(it: Iterable[bytes]) -> Iterator[bytes]:
+        nonlocal lines_in
+        for line in it:
+            lines_in += 1
+            yield line
+
+    for line in clean_lines(_counted(src)):
+        dst.write(line)
+        lines_out += 1
+    return lines_in, lines_out
+
 
-    return out
+def default_output_path(src: Path) -> Path:
+    return src.with_name(f"{src.stem}_cleaned{src.suffix}")
+
+
+def clean_file(src: Path, out_path: Path) -> tuple[Path, int, int]:
+    # Write to a temp file first so a crash never leaves a half-written output behind.
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with open(src, "rb", buffering=_BUF_SIZE) as fin, open(tmp_path, "wb", buffering=_BUF_SIZE) as fout:
+        lines_in, lines_out = clean_stream(fin, fout)
+    os.replace(tmp_path, out_path)
+    return out_path, lines_in, lines_out
 
 
 def main() -> int:
     p = argparse.ArgumentParser(
         description="Clean Raindrop HTML export by dropping extra consecutive <DT><A> lines right before notes."
     )
-    p.add_argument("input_html", type=Path, help="Path to the Raindrop HTML export")
+    p.add_argument("input_html", type=Path, nargs="+", help="Path(s) to Raindrop HTML export(s)")
     p.add_argument(
         "--output",
         type=Path,
         default=None,
-        help="Optional output path. Default: <input>_cleaned.html next to the input.",
+        help="Optional output path (single input only). Default: <input>_cleaned.html next to the input.",
+    )
+    p.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Clean this many exports in parallel (process pool). Default: 1.",
     )
     args = p.parse_args()
 
-    src: Path = args.input_html
-    if args.output is None:
-        out_path = src.with_name(f"{src.stem}_cleaned{src.suffix}")
-    else:
-        out_path = args.output
+    srcs: list[Path] = args.input_html
+    if args.output is not None and len(srcs) != 1:
+        p.error("--output can only be used with a single input file")
+
+    targets = [(src, args.output if args.output is not None else default_output_path(src)) for src in srcs]
 
-    text = src.read_text(encoding="utf-8", errors="strict")
-    lines = text.splitlines(keepends=True)
-    cleaned = clean_lines(lines)
-    out_path.write_text("".join(cleaned), encoding="utf-8", errors="strict")
+    if args.jobs <= 1 or len(targets) == 1:
+        results = [clean_file(src, out) for src, out in targets]
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(targets))) as ex:
+            results = list(ex.map(clean_file, *zip(*targets)))
 
-    print(f"Wrote: {out_path}")
+    for out_path, lines_in, lines_out in results:
+        print(f"Wrote: {out_path} ({lines_in - lines_out} extra link rows removed)")
     return 0
 
 
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Import several libraries in one run: Zotero .bib files and Raindrop HTML exports, side by side.
+
+What it does (minimal + targeted):
+- Reads a JSON manifest of sources (see below).
+- Runs every source's import pipeline at the same time (parse -> transform -> diff -> secret scan -> chunk ->
+  upload, as in import_zotero_bib_to_pages.py), so the run takes about as long as the largest source
+  instead of the sum of all of them.
+- All sources share one pool of keep-alive connections to the backend (`--connections`: at most that many
+  requests in flight in total) and one request budget (`--max-rps`; a 429 pauses every source).
+- Zotero transforms (hashing + rendering) of all .bib files share one pool of `--workers` processes.
+- Failed chunks are bisected; pages refused on their own go to `<source file>.dead-letters.ndjson` and pages
+  that look like secrets to `<source file>.secrets.jsonl` (replay / fix them as with the single importer).
+
+Manifest (JSON; relative paths are relative to the manifest file):
+  {
+    "sources": [
+      {"type": "zotero", "path": "C:/Users/Zoom/Zotero-cm/My Library.bib"},
+      {"type": "zotero", "path": "team/Team Library.bib", "name": "team"},
+      {"type": "raindrop", "path": "raindrop-export_cleaned.html"}
+    ]
+  }
+
+Not here (run import_zotero_bib_to_pages.py for these): attachments, near-dups, the local sync state,
+--delete-missing and --watch. Reruns stay cheap anyway: unchanged entries are found with POST /api/pages-diff.
+
+Requirements (env vars): same as import_zotero_bib_to_pages.py
+- ENKIDU_BASE_URL, ENKIDU_ADMIN_TOKEN
+- Optional: ENKIDU_SKIP_EMBEDDINGS="1", ENKIDU_ALLOW_SECRETS="1"
+
+Usage (PowerShell):
+  python scripts/import_sources.py sources.json
+  python scripts/import_sources.py sources.json --connections 8 --max-rps 20 --stats-json run.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from _dead_letters import DeadLetterFile
+from _dotenv import load_repo_dotenv
+from _enkidu_api import DEFAULT_CHUNK_BYTES, EnkiduClient, RateLimiter
+from _metrics import RunMetrics
+from _pipeline import (
+    ListingError,
+    PipelineStats,
+    SourceItem,
+    SourceSpec,
+    Stage,
+    SyncPlan,
+    list_existing_pages,
+    page_import_stages,
+    run_pipeline,
+    settle_chunk,
+    supports_remote_diff,
+)
+from _raindrop_source import RAINDROP_SOURCE, iter_raindrop_file
+from _secret_scan import SecretReport, print_secret_summary, secret_scan_stage
+from import_zotero_bib_to_pages import ZOTERO_SOURCE, iter_bibtex, zotero_items_parallel
+
+SOURCE_TYPES: dict[str, SourceSpec] = {"zotero": ZOTERO_SOURCE, "raindrop": RAINDROP_SOURCE}
+
+
+def _env_required(name: str) -> str:
+    v = os.environ.get(name, "").strip()
+    if not v:
+        raise RuntimeError(f"Missing {name}")
+    return v
+
+
+@dataclass(frozen=True)
+class Source:
+    name: str
+    type: str  # key of SOURCE_TYPES
+    path: Path
+
+    @property
+    def spec(self) -> SourceSpec:
+        return SOURCE_TYPES[self.type]
+
+
+def load_manifest(path: Path) -> list[Source]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        raise RuntimeError(f"Cannot read manifest {path}: {e}") from e
+    entries = data.get("sources") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise RuntimeError('The manifest needs a non-empty "sources" list')
+    sources: list[Source] = []
+    for i, e in enumerate(entries, start=1):
+        if not isinstance(e, dict) or e.get("type") not in SOURCE_TYPES or not str(e.get("path") or "").strip():
+            raise RuntimeError(f"Source #{i}: needs a type ({' or '.join(SOURCE_TYPES)}) and a path")
+        p = Path(str(e["path"])).expanduser()
+        p = p if p.is_absolute() else path.parent / p
+        if not p.is_file():
+            raise RuntimeError(f"Source #{i}: no such file: {p}")
+        sources.append(Source(name=str(e.get("name") or p.stem), type=e["type"], path=p))
+    names = [s.name for s in sources]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        raise RuntimeError(f"Source names must be unique (add a \"name\"): {', '.join(dupes)}")
+    return sources
+
+
+# "@article{citekey," -> citekey, for a quick scan of a .bib without parsing it.
+_CITEKEY_RE = re.compile(rb"@\s*([A-Za-z]+)\s*[{(]\s*([^,\s{}()]+)\s*,")
+_NOT_ENTRIES = {b"string", b"comment", b"preamble"}
+
+
+class KeyClaims:
+    # Sources of the same type share one key space on the server (two .bib files with the same citekey are
+    # the same page). Each key is written by one source only: the first in the manifest that has it, known
+    # up front from a quick citekey scan of every .bib (Raindrop keys are content hashes: same key, same page).
+    # Keys the scan missed go to whichever source reaches them first. Collisions are reported.
+
+    def __init__(self) -> None:
+        self.collisions: list[tuple[str, str, str]] = []  # (key, source that kept it, source that skipped it)
+        self._owners: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def prescan(self, sources: list[Source]) -> None:
+        for src in sources:
+            if src.type != "zotero":
+                continue
+            for m in _CITEKEY_RE.finditer(src.path.read_bytes()):
+                if m.group(1).lower() not in _NOT_ENTRIES:
+                    key = m.group(2).decode("utf-8", errors="replace")
+                    self._owners.setdefault((src.type, key), src.name)
+
+    def stage(self, source: Source) -> Callable[[Iterator[SourceItem]], Iterator[SourceItem]]:
+        def _stage(items: Iterator[SourceItem]) -> Iterator[SourceItem]:
+            for item in items:
+                with self._lock:
+                    owner = self._owners.setdefault((source.type, item.key), source.name)
+                    if owner != source.name:
+                        self.collisions.append((item.key, owner, source.name))
+                        continue
+                yield item
+
+        return _stage
+
+
+@dataclass
+class SourceRun:
+    source: Source
+    dead: DeadLetterFile
+    secrets: SecretReport | None
+    plan: SyncPlan = field(default_factory=SyncPlan)
+    stats: PipelineStats = field(default_factory=PipelineStats)
+    inserted: int = 0
+    updated: int = 0
+    unsent: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+
+def _items(source: Source, workers: int, executor: ProcessPoolExecutor | None) -> tuple[Iterable[Any], list[Stage]]:
+    # (pipeline input, stages that turn it into SourceItems).
+    if source.type == "zotero":
+        text = source.path.read_bytes().decode("utf-8", errors="replace")
+        return iter_bibtex(text), [
+            Stage("items", lambda entries: zotero_items_parallel(entries, workers=workers, executor=executor))
+        ]
+    return iter_raindrop_file(source.path), []
+
+
+def _run_source(
+    run: SourceRun,
+    client: EnkiduClient,
+    existing: Future | None,
+    claims: KeyClaims,
+    args: argparse.Namespace,
+    executor: ProcessPoolExecutor | None,
+    metrics: RunMetrics,
+) -> None:
+    src = run.source
+    tag = f"[{src.name}]"
+    started = time.perf_counter()
+    try:
+        with metrics.phase(f"source:{src.name}"):
+            source_iter, item_stages = _items(src, args.workers, executor)
+            stages = [
+                *item_stages,
+                Stage("claims", claims.stage(src)),
+                *page_import_stages(
+                    client,
+                    existing,
+                    run.plan,
+                    remote_diff=None if existing else src.spec,
+                    chunk_bytes=int(args.chunk_mb * 1024 * 1024),
+                    concurrency=args.connections,
+                    screen=secret_scan_stage(run.secrets) if run.secrets else None,
+                ),
+            ]
+            for chunk, r in run_pipeline(source_iter, stages, stats=run.stats):
+                written, retry, rejected = settle_chunk(chunk, r)
+                for pp, err in rejected:
+                    run.dead.add(pp.page, err, key=pp.key)
+                n_new = sum(1 for pp in written if pp.is_new)
+                run.inserted += n_new
+                run.updated += len(written) - n_new
+                run.unsent += len(retry)
+                if not r.ok:
+                    print(
+                        f"{tag} Bulk upsert {r.index}: wrote {len(written)} of {len(chunk)} pages "
+                        f"({len(rejected)} refused on their own, {len(retry)} not sent): {r.error}",
+                        file=sys.stderr,
+                    )
+    except (RuntimeError, ListingError, OSError) as e:
+        run.error = str(e)
+        print(f"{tag} ERROR: {e}", file=sys.stderr)
+    finally:
+        run.dead.close()
+        run.seconds = time.perf_counter() - started
+    print(
+        f"{tag} done in {run.seconds:.1f}s: {run.inserted} inserted, {run.updated} updated, "
+        f"{run.plan.unchanged} unchanged" + (f", {run.unsent} not sent" if run.unsent else "") + "."
+    )
+
+
+def _print_summary(runs: list[SourceRun], wall: float, limiter: RateLimiter | None) -> None:
+    width = max(6, *(len(r.source.name) for r in runs))
+    print(
+        f"{'source':<{width}}  {'type':<8}  {'entries':>7}  {'inserted':>8}  {'updated':>7}  {'unchanged':>9}  "
+        f"{'held':>4}  {'dead':>4}  {'unsent':>6}  {'seconds':>7}"
+    )
+    for r in runs:
+        held = len(r.secrets.pages) if r.secrets else 0
+        print(
+            f"{r.source.name:<{width}}  {r.source.type:<8}  {len(r.plan.seen_keys):>7}  {r.inserted:>8}  "
+            f"{r.updated:>7}  {r.plan.unchanged:>9}  {held:>4}  {r.dead.count:>4}  {r.unsent:>6}  "
+            f"{r.seconds:>7.1f}" + ("  FAILED" if r.error else "")
+        )
+    longest = max(r.seconds for r in runs)
+    print(
+        f"Wall time {wall:.1f}s (longest source {longest:.1f}s, sources back to back {sum(r.seconds for r in runs):.1f}s)"
+        + (f"; waited {limiter.waited:.1f}s in total for the request budget." if limiter else ".")
+    )
+
+
+def _import(args: argparse.Namespace, metrics: RunMetrics) -> int:
+    sources = load_manifest(args.manifest)
+    base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+    headers = {"authorization": f"Bearer {_env_required('ENKIDU_ADMIN_TOKEN')}"}
+    allow_secrets = os.environ.get("ENKIDU_ALLOW_SECRETS", "").strip() == "1"
+    if allow_secrets:
+        headers["x-enkidu-allow-secrets"] = "1"
+    if os.environ.get("ENKIDU_SKIP_EMBEDDINGS", "").strip() == "1":
+        headers["x-enkidu-skip-embeddings"] = "1"
+
+    limiter = RateLimiter(args.max_rps) if args.max_rps > 0 else None
+    client = EnkiduClient(
+        base_url, headers=headers, pool_size=max(1, args.connections), observer=metrics, rate_limiter=limiter
+    )
+    print(
+        f"Using ENKIDU_BASE_URL={base_url}: {len(sources)} sources, {args.connections} connections"
+        + (f", at most {args.max_rps:g} requests/s." if limiter else ".")
+    )
+
+    runs: list[SourceRun] = []
+    for src in sources:
+        # As in the single importer: the last run's dead letters are sent again, and their file is replaced once
+        # this source's pipeline got through (see below).
+        dead = DeadLetterFile(src.path.with_name(src.path.name + ".dead-letters.ndjson"), replace=True)
+        secrets = None if args.no_secret_scan or allow_secrets else SecretReport()
+        runs.append(SourceRun(source=src, dead=dead, secrets=secrets))
+
+    claims = KeyClaims()
+    started = time.perf_counter()
+    with metrics.phase("prescan"):
+        claims.prescan(sources)
+    n_zotero = sum(1 for s in sources if s.type == "zotero")
+    executor = (
+        ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+        if n_zotero and args.workers > 1
+        else None
+    )
+    try:
+        with client, ThreadPoolExecutor(max_workers=len(sources) + 2, thread_name_prefix="source") as pool:
+            # One diff strategy per source type: ask the server per batch, or (older backends) list once and share.
+            existing: dict[str, Future | None] = {}
+            for t in sorted({s.type for s in sources}):
+                spec = SOURCE_TYPES[t]
+                with metrics.phase("fingerprint"):
+                    remote = supports_remote_diff(client, spec)
+                existing[t] = None if remote else pool.submit(lambda spec=spec: list_existing_pages(client, spec)[0])
+                if not remote:
+                    print(f"NOTE: the backend has no POST /api/pages-diff; listing existing {t} pages once for all sources.")
+            with metrics.phase("pipeline"):
+                futures = [
+                    pool.submit(_run_source, run, client, existing[run.source.type], claims, args, executor, metrics)
+                    for run in runs
+                ]
+                for fut in futures:
+                    fut.result()
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+    wall = time.perf_counter() - started
+
+    for run in runs:
+        if not run.error:
+            run.dead.commit()
+        if run.secrets:
+            print_secret_summary(run.secrets, run.source.path.with_name(run.source.path.name + ".secrets.jsonl"))
+        if run.dead.count:
+            print(
+                f"WARNING: [{run.source.name}] {run.dead.count} pages were refused by the server on their own; "
+                f"see {run.dead.path} (scripts/replay_dead_letters.py sends it again).",
+                file=sys.stderr,
+            )
+    if claims.collisions:
+        print(
+            f"WARNING: {len(claims.collisions)} keys appear in more than one source (one page per key, written "
+            "from the first source in the manifest that has it), e.g.:\n"
+            + "\n".join(f"- {k}: kept from {kept}, skipped in {skipped}" for k, kept, skipped in claims.collisions[:5]),
+            file=sys.stderr,
+        )
+    _print_summary(runs, wall, limiter)
+
+    metrics.set_counts(
+        sources=len(runs),
+        inserted=sum(r.inserted for r in runs),
+        updated=sum(r.updated for r in runs),
+        unchanged=sum(r.plan.unchanged for r in runs),
+        failed=sum(r.unsent + r.dead.count for r in runs),
+        dead_letters=sum(r.dead.count for r in runs),
+        secrets_held=sum(len(r.secrets.pages) for r in runs if r.secrets),
+        key_collisions=len(claims.collisions),
+    )
+    if any(r.error for r in runs):
+        return 2
+    if any(r.unsent for r in runs):
+        print("ERROR: some pages could not be sent (see above). Rerun to retry them.", file=sys.stderr)
+    if any(r.unsent or r.dead.count for r in runs):
+        return 1
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Import several Zotero/Raindrop sources at once into Enkidu pages.")
+    p.add_argument("manifest", type=Path, help="JSON manifest: {\"sources\": [{\"type\": \"zotero\", \"path\": ...}, ...]}")
+    p.add_argument(
+        "--connections",
+        type=int,
+        default=8,
+        help="Keep-alive connections shared by all sources = most requests in flight at once. Default: 8.",
+    )
+    p.add_argument(
+        "--max-rps",
+        type=float,
+        default=20.0,
+        help="Request budget shared by all sources (requests/s, retries included; 0 = no limit). Default: 20.",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes for the Zotero transforms, shared by all .bib files. Default: CPU count.",
+    )
+    p.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+        help="Max MB of page JSON per bulk request. Default: 4.",
+    )
+    p.add_argument("--no-secret-scan", action="store_true", help="Send pages that look like secrets anyway.")
+    p.add_argument("--stats-json", type=Path, default=None, help="Write a run report (timings, requests, counts) as JSON.")
+    p.add_argument("--prom-textfile", type=Path, default=None, help="Write the same metrics in Prometheus text format.")
+    args = p.parse_args()
+
+    # Load repo `.env` so this script can be run without manually exporting vars every time.
+    load_repo_dotenv()
+
+    metrics = RunMetrics("sources")
+    exit_code = 1
+    try:
+        with metrics.phase("total"):
+            exit_code = _import(args, metrics)
+        return exit_code
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        exit_code = 2
+        return exit_code
+    finally:
+        metrics.exit_code = exit_code
+        if args.stats_json:
+            metrics.write_json(args.stats_json)
+        if args.prom_textfile:
+            metrics.write_prometheus(args.prom_textfile)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -15,7 +15,7 @@ Requirements (env vars):
 - ENKIDU_ADMIN_TOKEN (same token you paste into the UI)
 
 Optional:
-- ENKIDU_ALLOW_SECRETS="1" (passes x-enkidu-allow-secrets: 1 header)
+- ENKIDU_ALLOW_SECRETS="1" (passes x-enkidu-allow-secrets: 1 header, and turns off the secret pre-flight scan)
 
 Usage (PowerShell):
   python scripts/import_zotero_bib_to_pages.py "C:/Users/Zoom/Zotero-cm/My Library.bib"
@@ -24,19 +24,49 @@ Usage (PowerShell):
 from __future__ import annotations
 
 import argparse
+import dataclasses
+import functools
 import hashlib
 import json
 import os
 import re
 import sys
-import urllib.error
+import time
 import urllib.parse
-import urllib.request
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator
 
+from _attachments import Attachment, AttachmentCache, AttachmentStats, attachment_stage, require_pypdf
+from _dead_letters import DeadLetterFile
 from _dotenv import load_repo_dotenv
+from _embedding_backfill import BackfillResult, backfill_embeddings
+from _enkidu_api import DEFAULT_CHUNK_BYTES, ChunkResult, EnkiduClient
+from _metrics import RunMetrics
+from _near_dups import NearDupReport, near_dup_stage, print_near_dup_summary
+from _pipeline import (
+    ListingError,
+    PipelineStats,
+    PlannedPage,
+    SourceItem,
+    SourceSpec,
+    Stage,
+    SyncPlan,
+    delete_pages,
+    diff_with_server,
+    list_existing_pages,
+    page_import_stages,
+    process_map,
+    run_pipeline,
+    settle_chunk,
+    stable_page_id,
+    supports_remote_diff,
+)
+from _secret_scan import SecretReport, print_secret_summary, secret_scan_stage
+from _sync_state import SyncState
+from _watch import EntryIndex, file_signature, wait_for_change
 
 
 def _env_required(name: str) -> str:
@@ -46,49 +76,9 @@ def _env_required(name: str) -> str:
     return v
 
 
-def _http_json(
-    *,
-    url: str,
-    method: str,
-    headers: dict[str, str],
-    body_obj: dict[str, Any] | None = None,
-) -> Any:
-    return _http(url=url, method=method, headers=headers, body_obj=body_obj, parse_json=True)
-
-
-def _http_text(
-    *,
-    url: str,
-    method: str,
-    headers: dict[str, str],
-    body_obj: dict[str, Any] | None = None,
-) -> str:
-    return str(_http(url=url, method=method, headers=headers, body_obj=body_obj, parse_json=False) or "")
-
-
-def _http(
-    *,
-    url: str,
-    method: str,
-    headers: dict[str, str],
-    body_obj: dict[str, Any] | None,
-    parse_json: bool,
-) -> Any:
-    data = None
-    if body_obj is not None:
-        data = json.dumps(body_obj).encode("utf-8")
-        headers = {**headers, "content-type": "application/json"}
-
-    req = urllib.request.Request(url, data=data, method=method, headers=headers)
-    try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read().decode("utf-8", errors="replace").strip()
-            if not parse_json:
-                return raw
-            return json.loads(raw) if raw else None
-    except urllib.error.HTTPError as e:
-        err_txt = e.read().decode("utf-8", errors="replace")
-        raise RuntimeError(f"API error {e.code}: {err_txt or e.reason}") from e
+_DRIVE_PATH_RE = re.compile(r"^[A-Za-z]:/")
+_MIME_SUFFIX_RE = re.compile(r":[A-Za-z0-9.+-]+/[A-Za-z0-9.+-]+$")
+_YEAR_RE = re.compile(r"\b(\d{4})\b")
 
 
 def _file_url_from_windows_path(p: str) -> str:
@@ -97,7 +87,7 @@ def _file_url_from_windows_path(p: str) -> str:
     if not s:
         return ""
     s = s.replace("\\", "/")
-    if re.match(r"^[A-Za-z]:/", s):
+    if _DRIVE_PATH_RE.match(s):
         s = "file:///" + s
     elif s.startswith("//"):  # UNC path
         s = "file:" + s
@@ -121,7 +111,7 @@ def _split_zotero_file_field(file_field: str) -> list[str]:
     for p in parts:
         s = p.strip().strip('"').strip()
         # Strip trailing MIME suffix (but keep the Windows drive colon).
-        s = re.sub(r":[A-Za-z0-9.+-]+/[A-Za-z0-9.+-]+$", "", s)
+        s = _MIME_SUFFIX_RE.sub("", s)
         # Unescape Zotero/BibTeX Windows path encoding.
         s = s.replace("\\:", ":").replace("\\\\", "\\")
         if s:
@@ -130,7 +120,9 @@ def _split_zotero_file_field(file_field: str) -> list[str]:
 
 
 def _collapse_ws(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").replace("\r\n", "\n").replace("\r", "\n")).strip()
+    # Same result as re.sub(r"\s+", " ", s).strip() (str.split() and \s agree on every code point), several
+    # times faster; it runs on every field value during parsing and again while rendering.
+    return " ".join((s or "").split())
 
 
 def _strip_braces(s: str) -> str:
@@ -141,10 +133,10 @@ def _strip_braces(s: str) -> str:
 def _extract_year(fields: dict[str, str]) -> str:
     year = _collapse_ws(fields.get("year", ""))
     if year:
-        m = re.search(r"\b(\d{4})\b", year)
+        m = _YEAR_RE.search(year)
         return m.group(1) if m else year
     date = _collapse_ws(fields.get("date", ""))
-    m = re.search(r"\b(\d{4})\b", date)
+    m = _YEAR_RE.search(date)
     return m.group(1) if m else ""
 
 
@@ -228,135 +220,239 @@ def _body_markdown(fields: dict[str, str]) -> str:
     return out or "Imported from Zotero BibTeX."
 
 
+def _full_text_markdown(attachments: tuple[Attachment, ...]) -> str:
+    # Extracted attachment text (--attachments), so the paper itself is searchable and embedded.
+    with_text = [a for a in attachments if a.text]
+    lines = ["## Full text"]
+    for a in with_text:
+        if len(with_text) > 1:
+            lines.append(f"### {Path(a.path).name}")
+        lines.append(a.text)
+        if a.chars > len(a.text):
+            lines.append(f"_(truncated: first {len(a.text)} of {a.chars} characters)_")
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def _attachment_paths(entry: BibEntry, base_dir: Path) -> list[str]:
+    # Local attachment paths of an entry; relative paths (some exporters write them) are relative to the .bib.
+    return [p if os.path.isabs(p) else str(base_dir / p) for p in _split_zotero_file_field(entry.fields.get("file", ""))]
+
+
+# Precompiled tokens for the BibTeX scanner.
+# Purpose: jump between structural characters with regex/str.find instead of walking char-by-char.
+_AT_HEAD_RE = re.compile(r"@[ \t]*([A-Za-z0-9_\-]*)[\s,]*")
+_IDENT_RE = re.compile(r"[A-Za-z0-9_\-]+")
+_WS_COMMAS_RE = re.compile(r"[\s,]*")
+_WS_RE = re.compile(r"\s*")
+_BRACES_RE = re.compile(r"[{}]")
+_PARENS_RE = re.compile(r"[()]")
+# Quoted value body: everything up to the first unescaped `"` (backslash escapes kept verbatim).
+_QUOTED_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+# Bare values (numbers / @string macro names) stop at a comma, `#` or the entry closing char.
+_BARE_RE = {"}": re.compile(r"[^,#}]*"), ")": re.compile(r"[^,#)]*")}
+_UNTIL_COMMA_RE = {"}": re.compile(r"[^,}]*"), ")": re.compile(r"[^,)]*")}
+# Fast path for the common field shapes: `name = {v}` (up to one nested brace level), `name = "v"`
+# (no escapes) or `name = bare`, followed by `,` or the entry closing char (no `#` concatenation).
+# Anything else falls back to the general scanner below.
+_FIELD_FAST_RE = {
+    c: re.compile(
+        r"[\s,]*([A-Za-z0-9_\-]+)[\s,]*=[\s,]*"
+        r'(?:\{([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}|"([^"\\]*)"|([^\s,#{}"()]+))'
+        r"(?=\s*[," + re.escape(c) + r"])"
+    )
+    for c in ("}", ")")
+}
+
+# Entry types that are not bibliography records.
+_SKIP_BLOCK_TYPES = {"comment", "preamble"}
+
+
 @dataclass(frozen=True)
 class BibEntry:
     entry_type: str
     citekey: str
     fields: dict[str, str]
+    attachments: tuple[Attachment, ...] = ()  # filled in by the attachments stage (--attachments)
 
 
 class _BibScanner:
+    # Slice-based scanner: positions only ever move via precompiled regex matches or str.find.
     def __init__(self, s: str):
         self.s = s
         self.n = len(s)
         self.i = 0
+        # @string macros (lowercased name -> expanded value).
+        self.macros: dict[str, str] = {}
 
     def _peek(self) -> str:
         return self.s[self.i] if self.i < self.n else ""
 
-    def _next(self) -> str:
-        ch = self._peek()
-        self.i += 1
-        return ch
+    def _skip(self, rx: re.Pattern[str]) -> None:
+        self.i = rx.match(self.s, self.i).end()
 
-    def _skip_ws_and_commas(self) -> None:
-        while self.i < self.n and self.s[self.i] in " \t\r\n,":
-            self.i += 1
+    def _read(self, rx: re.Pattern[str]) -> str:
+        m = rx.match(self.s, self.i)
+        self.i = m.end()
+        return m.group(0)
 
     def _read_ident(self) -> str:
-        start = self.i
-        while self.i < self.n and re.match(r"[A-Za-z0-9_\-]", self.s[self.i]):
-            self.i += 1
-        return self.s[start:self.i]
-
-    def _read_until(self, stop_chars: str) -> str:
-        start = self.i
-        while self.i < self.n and self.s[self.i] not in stop_chars:
-            self.i += 1
-        return self.s[start:self.i]
-
-    def _read_value(self, closing_char: str) -> str:
+        m = _IDENT_RE.match(self.s, self.i)
+        if not m:
+            return ""
+        self.i = m.end()
+        return m.group(0)
+
+    def _find_balanced_end(self, opener: str) -> int:
+        # Purpose: index just past the closer matching an already-consumed opener (-1 if unbalanced).
+        rx = _BRACES_RE if opener == "{" else _PARENS_RE
+        depth = 1
+        for m in rx.finditer(self.s, self.i):
+            if m.group(0) == opener:
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return m.end()
+        return -1
+
+    def _read_piece(self, closing_char: str) -> str:
         ch = self._peek()
         if ch == "{":
-            self._next()  # consume {
-            depth = 1
+            self.i += 1  # consume {
             start = self.i
-            while self.i < self.n:
-                c = self._next()
-                if c == "{":
-                    depth += 1
-                elif c == "}":
-                    depth -= 1
-                    if depth == 0:
-                        return self.s[start : self.i - 1].strip()
-            return self.s[start:self.i].strip()
+            end = self._find_balanced_end("{")
+            if end < 0:
+                self.i = self.n
+                return self.s[start:]
+            self.i = end
+            return self.s[start : end - 1]
         if ch == '"':
-            self._next()  # consume "
-            out = []
-            while self.i < self.n:
-                c = self._next()
-                if c == "\\" and self.i < self.n:
-                    out.append(c)
-                    out.append(self._next())
-                    continue
-                if c == '"':
-                    break
-                out.append(c)
-            return "".join(out).strip()
-        # bare value: stop on comma or entry closing
-        return self._read_until("," + closing_char).strip()
+            self.i += 1  # consume "
+            body = self._read(_QUOTED_RE)
+            if self._peek() == '"':
+                self.i += 1
+            return body
+        # bare value: number or @string macro name
+        bare = self._read(_BARE_RE[closing_char]).strip()
+        return self.macros.get(bare.lower(), bare)
+
+    def _read_value(self, closing_char: str) -> str:
+        # Purpose: support `#` concatenation (pieces joined verbatim, whitespace collapsed by the caller).
+        parts = [self._read_piece(closing_char)]
+        while True:
+            self._skip(_WS_RE)
+            if self._peek() != "#":
+                break
+            self.i += 1  # consume #
+            self._skip(_WS_RE)
+            parts.append(self._read_piece(closing_char))
+        return parts[0] if len(parts) == 1 else "".join(parts)
 
 
 def parse_bibtex(text: str) -> list[BibEntry]:
+    return list(iter_bibtex(text))
+
+
+# Only @string macros make one entry's parse depend on text outside it (see _watch.EntryIndex).
+_MACRO_RE = re.compile(rb"@\s*string\s*[{(]", re.IGNORECASE)
+
+
+def iter_bibtex(text: str) -> Iterator[BibEntry]:
+    # Generator: entries are yielded as they are scanned, so the pipeline can start uploading early.
+    # Throughput target: >= 8k entries/sec (~1 KB Zotero entries with abstracts + file fields) on one core.
+    # The previous char-by-char scanner managed ~2.2k entries/sec on the same input.
+    # Note: @string macros are expanded; undefined bare names (e.g. `month = jan`) are kept verbatim.
+    for _start, _end, entry in iter_bibtex_spans(text):
+        yield entry
+
+
+def iter_bibtex_spans(text: str) -> Iterator[tuple[int, int, BibEntry]]:
+    # Same scan, plus each entry's [start, end) in `text` (from its "@" to just past its closing brace).
     s = _BibScanner(text)
-    out: list[BibEntry] = []
 
     while True:
         at = s.s.find("@", s.i)
         if at < 0:
             break
-        s.i = at + 1
+        head = _AT_HEAD_RE.match(s.s, at)
+        s.i = head.end()
 
-        entry_type = s._read_ident().lower()
+        entry_type = head.group(1).lower()
         if not entry_type:
             continue
-        s._skip_ws_and_commas()
 
         opener = s._peek()
-        if opener not in "{(":
+        if not opener or opener not in "{(":
             continue
         closing = "}" if opener == "{" else ")"
-        s._next()  # consume opener
+        s.i += 1  # consume opener
+
+        if entry_type in _SKIP_BLOCK_TYPES:
+            # @comment{...} / @preamble{...}: skip the whole balanced block in one pass.
+            end = s._find_balanced_end(opener)
+            s.i = s.n if end < 0 else end
+            continue
+
+        if entry_type == "string":
+            # @string{name = value}: define a macro for later bare values.
+            s._skip(_WS_COMMAS_RE)
+            name = s._read_ident().lower()
+            s._skip(_WS_RE)
+            if name and s._peek() == "=":
+                s.i += 1
+                s._skip(_WS_COMMAS_RE)
+                s.macros[name] = s._read_value(closing_char=closing)
+            nxt = s.s.find(closing, s.i)
+            s.i = s.n if nxt < 0 else nxt + 1
+            continue
 
-        citekey = s._read_until(",").strip()
+        citekey = s._read(_UNTIL_COMMA_RE[closing]).strip()
         if s._peek() == ",":
-            s._next()
+            s.i += 1
 
         fields: dict[str, str] = {}
+        fast_field = _FIELD_FAST_RE[closing].match
         while True:
-            s._skip_ws_and_commas()
+            m = fast_field(s.s, s.i)
+            if m:
+                braced, quoted, bare = m.group(2, 3, 4)
+                if bare is not None:
+                    val = s.macros.get(bare.lower(), bare)
+                else:
+                    val = braced if braced is not None else quoted
+                fields[m.group(1).lower()] = _collapse_ws(val)
+                s.i = m.end()
+                continue
+
+            s._skip(_WS_COMMAS_RE)
             if s._peek() == closing:
-                s._next()
+                s.i += 1
                 break
-            name = s._read_ident().strip().lower()
+            name = s._read_ident().lower()
             if not name:
                 # Try to resync to end of entry.
                 nxt = s.s.find(closing, s.i)
                 s.i = s.n if nxt < 0 else nxt + 1
                 break
-            s._skip_ws_and_commas()
+            s._skip(_WS_COMMAS_RE)
             if s._peek() != "=":
                 # Invalid field, try next comma.
-                s._read_until("," + closing)
+                s._skip(_UNTIL_COMMA_RE[closing])
                 if s._peek() == ",":
-                    s._next()
+                    s.i += 1
                 continue
-            s._next()  # consume =
-            s._skip_ws_and_commas()
+            s.i += 1  # consume =
+            s._skip(_WS_COMMAS_RE)
             val = s._read_value(closing_char=closing)
             fields[name] = _collapse_ws(val)
-            s._skip_ws_and_commas()
-            if s._peek() == ",":
-                s._next()
-                continue
+            s._skip(_WS_COMMAS_RE)
             if s._peek() == closing:
-                s._next()
+                s.i += 1
                 break
 
         if citekey:
-            out.append(BibEntry(entry_type=entry_type, citekey=citekey, fields=fields))
-
-    return out
+            yield at, s.i, BibEntry(entry_type=entry_type, citekey=citekey, fields=fields)
 
 
 def _stable_import_id(entry: BibEntry) -> str:
@@ -371,20 +467,172 @@ def _stable_import_id(entry: BibEntry) -> str:
 def _source_hash(entry: BibEntry) -> str:
     # Purpose: detect changes in the BibTeX record so reruns can UPDATE existing pages.
     # Keep this stable: canonical JSON with sorted keys.
-    payload = {
-        "entry_type": entry.entry_type,
-        "citekey": entry.citekey,
-        "fields": {k: entry.fields.get(k, "") for k in sorted(entry.fields.keys())},
-    }
+    payload: dict[str, Any] = {"entry_type": entry.entry_type, "citekey": entry.citekey, "fields": entry.fields}
+    if entry.attachments:
+        # Replacing a PDF (or changing how much of its text we keep) must rewrite the page.
+        payload["attachments"] = [[a.sha256, len(a.text)] for a in entry.attachments]
     raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8", errors="replace")
     return hashlib.sha1(raw).hexdigest()
 
 
-def _chunked(xs: list[Any], n: int) -> list[list[Any]]:
-    # Purpose: keep request size/time bounded for bulk API calls.
-    if n <= 0:
-        return [xs]
-    return [xs[i : i + n] for i in range(0, len(xs), n)]
+# Namespace for deterministic page ids of newly imported entries (uuid5 of the citekey).
+# Purpose: new pages get a known id up front, so the local sync state can record it and a resent chunk
+# updates the same rows instead of inserting duplicates.
+_PAGE_ID_NAMESPACE = uuid.UUID("0b6f4f6e-7a0c-5d8e-9a57-2f1e6c0d3b21")
+
+ZOTERO_SOURCE = SourceSpec(
+    kv_key="source",
+    kv_value="zotero",
+    key_field="zotero_citekey",
+    hash_field="zotero_source_hash",
+)
+ZOTERO_FILTER_QS = ZOTERO_SOURCE.filter_qs()
+
+
+def _new_page_id(entry: BibEntry) -> str:
+    return stable_page_id(_PAGE_ID_NAMESPACE, f"zotero:{entry.citekey}")
+
+
+def _zotero_page(entry: BibEntry, source_hash: str) -> dict[str, Any]:
+    kv_tags: dict[str, Any] = {
+        "source": "zotero",
+        "zotero_citekey": entry.citekey,
+        "zotero_type": entry.entry_type,
+        "zotero_import_id": _stable_import_id(entry),
+        "zotero_source_hash": source_hash,
+    }
+    # Store all BibTeX fields as kv_tags (as requested: author/year/journaltitle/etc).
+    for k, v in entry.fields.items():
+        if v and k not in kv_tags:
+            kv_tags[k] = v
+
+    content_md = _body_markdown(entry.fields)
+    if any(a.text for a in entry.attachments):
+        content_md += "\n\n" + _full_text_markdown(entry.attachments)
+    return {
+        "title": _page_title(entry.fields),
+        "content_md": content_md,
+        "tags": ["zotero"],
+        "kv_tags": kv_tags,
+    }
+
+
+def zotero_items(entries: Iterable[BibEntry]) -> Iterator[SourceItem]:
+    # Pipeline stage: BibEntry -> SourceItem. Title/markdown are only built for entries that will be written.
+    for entry in entries:
+        source_hash = _source_hash(entry)
+        yield SourceItem(
+            key=entry.citekey,
+            source_hash=source_hash,
+            new_id=_new_page_id(entry),
+            build=functools.partial(_zotero_page, entry, source_hash),
+        )
+
+
+def _transform_entries(entries: list[BibEntry]) -> list[tuple[str, str, str, dict[str, Any]]]:
+    # Worker-process batch: hash + ids + the full page, i.e. everything zotero_items() and build() compute.
+    out = []
+    for entry in entries:
+        source_hash = _source_hash(entry)
+        out.append((entry.citekey, source_hash, _new_page_id(entry), _zotero_page(entry, source_hash)))
+    return out
+
+
+def zotero_items_parallel(
+    entries: Iterable[BibEntry], *, workers: int, executor: ProcessPoolExecutor | None = None
+) -> Iterator[SourceItem]:
+    # Same items as zotero_items(), transformed across `workers` processes (of `executor`, if shared). Pages
+    # are built eagerly there (idle cores are cheaper than building them one by one in the diff stage);
+    # workers <= 1 without an executor stays lazy.
+    if workers <= 1 and executor is None:
+        yield from zotero_items(entries)
+        return
+    for key, source_hash, new_id, page in process_map(
+        _transform_entries, entries, workers=workers, executor=executor
+    ):
+        yield SourceItem(key=key, source_hash=source_hash, new_id=new_id, build=page.copy)
+
+
+def _default_state_path(bib_path: Path) -> Path:
+    # Keep the sync state next to the .bib (one state file per library).
+    return bib_path.with_name(bib_path.name + ".enkidu-sync.sqlite")
+
+
+def _is_unauthorized(err: RuntimeError) -> bool:
+    msg = str(err)
+    return "API error 401" in msg or "401" in msg
+
+
+def _report_unauthorized(err: RuntimeError, admin_token: str) -> None:
+    # Try to surface the server's debug hint (it appends JSON after a newline).
+    msg = str(err)
+    hint = ""
+    if "\n" in msg:
+        hint = msg.split("\n", 1)[1].strip()
+    client_len = len(f"Bearer {admin_token}".strip())
+    print(
+        "ERROR: Unauthorized (401). The ENKIDU_ADMIN_TOKEN used by this script does not match the server.\n"
+        "- If ENKIDU_BASE_URL points at your deployed site, use the SAME admin token you configured in Netlify.\n"
+        "- If you pasted the token into Netlify with extra spaces/commas, the server only uses the first segment before whitespace/comma.\n"
+        "- Ensure your PowerShell env var (or repo .env) matches exactly.\n"
+        f"- Client Authorization header length: {client_len}\n"
+        f"- Server hint (if provided): {hint or '(none)'}",
+        file=sys.stderr,
+    )
+
+
+def _fetch_fingerprint(client: EnkiduClient) -> dict[str, Any] | None:
+    # Purpose: cheap "has anything changed?" probe (count + max(updated_at) of Zotero pages).
+    # Returns None when the backend is too old to support ?stats=1 (it then returns a normal page list).
+    data = client.request("GET", f"/api/pages?stats=1&{ZOTERO_FILTER_QS}")
+    if isinstance(data, dict) and "count" in data:
+        return data
+    return None
+
+
+def _load_existing(
+    client: EnkiduClient, state: SyncState | None, from_state: bool, metrics: RunMetrics
+) -> dict[str, tuple[str, str]]:
+    # Runs in the background while the .bib is parsed: citekey -> (page id, zotero_source_hash).
+    with metrics.phase("list_existing"):
+        if from_state and state:
+            existing = {k: (sp.page_id, sp.source_hash) for k, sp in state.load().items()}
+            print(f"Using the local sync state ({state.path.name}); skipping the existing-pages download.")
+        else:
+            existing, duplicate_citekeys = list_existing_pages(client, ZOTERO_SOURCE)
+            if state:
+                state.replace_all((k, page_id, h) for k, (page_id, h) in existing.items())
+            if duplicate_citekeys:
+                # Warn loudly: duplicate citekeys mean prior imports created duplicates or citekeys changed.
+                print(
+                    "WARNING: multiple existing pages share the same zotero_citekey (keeping newest page; older duplicates ignored):\n"
+                    + "\n".join(sorted(duplicate_citekeys)),
+                    file=sys.stderr,
+                )
+    print(f"Found {len(existing)} existing Zotero pages (by zotero_citekey).")
+    return existing
+
+
+def _purge_existing(client: EnkiduClient) -> bool:
+    # Purpose: allow a clean reimport (single bulk delete; much faster than 1000s of per-page deletes).
+    print("Purging existing Zotero pages (bulk delete)...")
+    try:
+        res = client.request("DELETE", f"/api/pages?confirm=1&{ZOTERO_FILTER_QS}") or {}
+    except RuntimeError as e:
+        msg = str(e)
+        if "API error 405" in msg or "405" in msg:
+            print(
+                "ERROR: your current backend does not support bulk delete yet (DELETE /api/pages returned 405 Method Not Allowed).\n"
+                "You need to redeploy the updated Netlify Functions (or point ENKIDU_BASE_URL at your local netlify dev) and retry.",
+                file=sys.stderr,
+            )
+            return False
+        raise
+    if isinstance(res, dict) and res.get("ok") is True:
+        print(f"Purged existing Zotero pages. Deleted {res.get('deleted')} (before={res.get('before')}, after={res.get('after')}).")
+    else:
+        print(f"Purged existing Zotero pages. (Unexpected response: {res!r})")
+    return True
 
 
 def main() -> int:
@@ -395,234 +643,805 @@ def main() -> int:
         action="store_true",
         help='Delete ALL existing pages where kv_tags.source == "zotero" before importing (dangerous).',
     )
+    p.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="Delta sync: also delete Zotero pages whose citekey is no longer in the .bib file.",
+    )
+    p.add_argument(
+        "--force-deletes",
+        action="store_true",
+        help="With --delete-missing: allow deleting more than half of the existing Zotero pages in one run.",
+    )
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of bulk upsert chunks in flight at once (also the keep-alive connection pool size). Default: 4.",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes for hashing/rendering entries (1 = in-process, pages built only when needed). Default: CPU count.",
+    )
+    p.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+        help="Byte budget per bulk upsert request (compact JSON before gzip; max 500 pages). Default: 4.",
+    )
+    p.add_argument(
+        "--state-file",
+        type=Path,
+        default=None,
+        help="Local sync state (SQLite). Default: <bib_path>.enkidu-sync.sqlite next to the .bib file.",
+    )
+    p.add_argument(
+        "--backfill-embeddings",
+        action="store_true",
+        help="After the import, embed the pages just written via POST /api/backfill-embeddings (adaptive to rate limits).",
+    )
+    p.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=4,
+        help="With --backfill-embeddings: max backfill batches in flight (50 pages each). Default: 4.",
+    )
+    p.add_argument(
+        "--attachments",
+        action="store_true",
+        help="Extract text from local attachments (PDF, HTML snapshots, .txt/.md) into a '## Full text' section. "
+        "Runs on --workers processes; results are cached by file SHA-256 (PDFs need pypdf).",
+    )
+    p.add_argument(
+        "--attachment-cache",
+        type=Path,
+        default=None,
+        help="With --attachments: extraction cache (SQLite). Default: <bib_path>.enkidu-attachments.sqlite.",
+    )
+    p.add_argument(
+        "--attachment-max-chars",
+        type=int,
+        default=100_000,
+        help="With --attachments: keep at most this many characters of text per attachment. Default: 100000.",
+    )
+    p.add_argument(
+        "--near-dups",
+        choices=("report", "skip"),
+        default=None,
+        help="Detect entries that are near-copies of an earlier entry (different citekey, same paper). "
+        "report: import everything and write a CSV report; skip: also leave the later copies out (needs numpy).",
+    )
+    p.add_argument(
+        "--near-dup-threshold",
+        type=float,
+        default=0.8,
+        help="With --near-dups: minimum estimated Jaccard similarity of title + markdown. Default: 0.8.",
+    )
+    p.add_argument(
+        "--near-dup-report",
+        type=Path,
+        default=None,
+        help="With --near-dups: CSV report path. Default: <bib_path>.near-dups.csv next to the .bib file.",
+    )
+    p.add_argument(
+        "--no-secret-scan",
+        action="store_true",
+        help="Send every page as is. By default pages the server would refuse as possible secrets (same rules as "
+        "the server) are held back before upload, so they don't fail the chunk they are in.",
+    )
+    p.add_argument(
+        "--secret-report",
+        type=Path,
+        default=None,
+        help="JSONL report of possible secrets (pages held back, and kv_tags hits that were sent). Default: <bib_path>.secrets.jsonl next to the .bib file.",
+    )
+    p.add_argument(
+        "--dead-letters",
+        type=Path,
+        default=None,
+        help="NDJSON file for pages the server refused on their own (failed chunks are bisected to find them); "
+        "replay it with replay_dead_letters.py. Replaced when a run gets through. Default: <bib_path>.dead-letters.ndjson.",
+    )
+    p.add_argument("--no-state", action="store_true", help="Do not read or write the local sync state.")
+    p.add_argument(
+        "--refresh-state",
+        action="store_true",
+        help="Ignore the local sync state and rebuild it from the full existing-pages listing.",
+    )
+    p.add_argument(
+        "--full-listing",
+        action="store_true",
+        help="Download every existing Zotero page's id/citekey/hash instead of asking the server which entries "
+        "changed (POST /api/pages-diff). Always used with --delete-missing, --purge-existing and --refresh-state.",
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted import from the local sync state instead of re-listing existing pages; "
+        "chunks that were never acknowledged are sent again.",
+    )
+    p.add_argument(
+        "--watch",
+        action="store_true",
+        help="After the import, keep running: when the .bib changes (e.g. Better BibTeX auto-export), re-parse only "
+        "the entries that changed and push just those (and, with --delete-missing, delete removed ones). Ctrl+C stops.",
+    )
+    p.add_argument(
+        "--watch-interval",
+        type=float,
+        default=1.0,
+        help="With --watch: seconds between checks of the file's size and mtime. Default: 1.",
+    )
+    p.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=2.0,
+        help="With --watch: wait until the file has been unchanged this long before syncing (exports are written "
+        "in several steps). Default: 2.",
+    )
+    p.add_argument(
+        "--stats-json",
+        type=Path,
+        default=None,
+        help="Write a run report (phase timings, per-route request latency/bytes/retries, page counts) as JSON.",
+    )
+    p.add_argument(
+        "--prom-textfile",
+        type=Path,
+        default=None,
+        help="Write the same metrics in Prometheus text format (e.g. into node_exporter's textfile collector dir).",
+    )
     args = p.parse_args()
 
+    # Reports are written on every exit path (including errors), so a failing cron run still shows up.
+    metrics = RunMetrics("zotero")
+    exit_code = 1
+    try:
+        # Signature before reading: a change written while we import is picked up by the first watch check.
+        signature = file_signature(args.bib_path)
+        with metrics.phase("total"):
+            with metrics.phase("read"):
+                data = args.bib_path.read_bytes()
+            exit_code = _import(args, metrics, data)
+        if args.watch and exit_code == 0:
+            exit_code = _watch(args, metrics, data, signature)
+        elif args.watch:
+            print("Not watching: the initial import did not finish cleanly.", file=sys.stderr)
+        return exit_code
+    finally:
+        metrics.exit_code = exit_code
+        _write_reports(args, metrics)
+
+
+def _write_reports(args: argparse.Namespace, metrics: RunMetrics) -> None:
+    if args.stats_json:
+        metrics.write_json(args.stats_json)
+    if args.prom_textfile:
+        metrics.write_prometheus(args.prom_textfile)
+
+
+def _request_headers(admin_token: str) -> dict[str, str]:
+    headers = {"authorization": f"Bearer {admin_token}"}
+    if os.environ.get("ENKIDU_ALLOW_SECRETS", "").strip() == "1":
+        headers["x-enkidu-allow-secrets"] = "1"
+    if os.environ.get("ENKIDU_SKIP_EMBEDDINGS", "").strip() == "1":
+        headers["x-enkidu-skip-embeddings"] = "1"
+    return headers
+
+
+def _secret_report(args: argparse.Namespace) -> SecretReport | None:
+    # No pre-flight when the server is told to accept secrets anyway.
+    if args.no_secret_scan or os.environ.get("ENKIDU_ALLOW_SECRETS", "").strip() == "1":
+        return None
+    return SecretReport()
+
+
+def _print_secret_report(args: argparse.Namespace, report: SecretReport | None) -> None:
+    if report:
+        print_secret_summary(report, args.secret_report or args.bib_path.with_name(args.bib_path.name + ".secrets.jsonl"))
+
+
+def _dead_letter_path(args: argparse.Namespace) -> Path:
+    return args.dead_letters or args.bib_path.with_name(args.bib_path.name + ".dead-letters.ndjson")
+
+
+def _settle_chunk(
+    chunk: list[PlannedPage], r: ChunkResult, dead: DeadLetterFile
+) -> tuple[list[PlannedPage], list[PlannedPage]]:
+    # (pages written, pages to send again). Pages the server refused on their own go to the dead-letter file.
+    written, retry, rejected = settle_chunk(chunk, r)
+    for pp, err in rejected:
+        dead.add(pp.page, err, key=pp.key)
+    return written, retry
+
+
+def _report_chunk(chunk: list[PlannedPage], r: ChunkResult, written: list[PlannedPage]) -> None:
+    retry_note = f", {r.attempts} attempts" if r.attempts > 1 else ""
+    if r.ok:
+        print(f"Bulk upsert {r.index}: processed {len(chunk)} pages ({r.seconds:.1f}s{retry_note})...")
+    elif written or r.rejected:
+        print(
+            f"Bulk upsert {r.index}: bisected after {r.error}; wrote {len(written)} of {len(chunk)} pages "
+            f"({len(r.rejected)} refused on their own, {len(chunk) - len(written) - len(r.rejected)} not sent; "
+            f"{r.seconds:.1f}s{retry_note})",
+            file=sys.stderr,
+        )
+    else:
+        print(f"Bulk upsert {r.index}: FAILED after {r.attempts} attempt(s): {r.error}", file=sys.stderr)
+
+
+def _backfill_written(client: EnkiduClient, page_ids: list[str], args: argparse.Namespace) -> BackfillResult:
+    # The pages are written whatever happens here: a backfill that breaks down is reported, never fatal
+    # (the run still gets finished in the sync state; the background cron embeds what is left).
+    try:
+        return backfill_embeddings(client, page_ids, max_concurrency=args.embed_concurrency, force=True)
+    except (RuntimeError, OSError, ValueError) as e:
+        return BackfillResult(requested=len(page_ids), failed={pid: f"backfill stopped: {e}" for pid in page_ids})
+
+
+def _open_attachment_cache(args: argparse.Namespace) -> AttachmentCache:
+    return AttachmentCache(args.attachment_cache or args.bib_path.with_name(args.bib_path.name + ".enkidu-attachments.sqlite"))
+
+
+def _attachment_stages(args: argparse.Namespace, attachments: AttachmentCache | None, stats: AttachmentStats) -> list[Stage]:
+    if not attachments:
+        return []
+    base_dir = args.bib_path.resolve().parent
+    return [
+        Stage(
+            "attachments",
+            attachment_stage(
+                attachments,
+                lambda e: _attachment_paths(e, base_dir),
+                lambda e, atts: dataclasses.replace(e, attachments=atts) if atts else e,
+                workers=args.workers,
+                max_chars=args.attachment_max_chars,
+                stats=stats,
+            ),
+        )
+    ]
+
+
+def _import(args: argparse.Namespace, metrics: RunMetrics, data: bytes) -> int:
     # Load repo `.env` so this script can be run without manually exporting vars every time.
     load_repo_dotenv()
 
     base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
     admin_token = _env_required("ENKIDU_ADMIN_TOKEN")
-    allow_secrets = os.environ.get("ENKIDU_ALLOW_SECRETS", "").strip() == "1"
-    skip_embeddings = os.environ.get("ENKIDU_SKIP_EMBEDDINGS", "").strip() == "1"
 
-    raw = args.bib_path.read_text(encoding="utf-8", errors="replace")
-    entries = parse_bibtex(raw)
-    if not entries:
-        print("No BibTeX entries found.")
-        return 0
+    near_dups: NearDupReport | None = None
+    if args.near_dups:
+        near_dups = NearDupReport()
+        try:
+            dedupe = near_dup_stage(near_dups, skip=args.near_dups == "skip", threshold=args.near_dup_threshold)
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+
+    attachment_stats = AttachmentStats()
+    if args.attachments:
+        try:
+            require_pypdf()
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+
+    if args.resume and (args.no_state or args.refresh_state or args.purge_existing):
+        print("ERROR: --resume needs the local sync state (not with --no-state, --refresh-state or --purge-existing).", file=sys.stderr)
+        return 2
+
+    raw = data.decode("utf-8", errors="replace")
+    secrets = _secret_report(args)
 
     print(f"Using ENKIDU_BASE_URL={base_url}")
-    common_headers = {"authorization": f"Bearer {admin_token}"}
-    if allow_secrets:
-        common_headers["x-enkidu-allow-secrets"] = "1"
-    if skip_embeddings:
-        common_headers["x-enkidu-skip-embeddings"] = "1"
-
-    # Build a map of existing Zotero pages by citekey so reruns can update in-place.
-    # IMPORTANT: Supabase/PostgREST often caps responses at 1000 rows, regardless of requested limit,
-    # so we page using offset.
-    # Note: GET /api/pages returns newest first, so we keep the first page for any duplicate citekey.
-    existing_by_citekey: dict[str, dict[str, Any]] = {}
-    duplicate_citekeys: set[str] = set()
-
-    PAGE_SIZE = 1000
-    MAX_EXISTING = 5000
-    fetched = 0
-    offset = 0
-    seen_first_ids: set[str] = set()
-
-    while fetched < MAX_EXISTING:
+    attachments = _open_attachment_cache(args) if args.attachments else None
+    client = EnkiduClient(base_url, headers=_request_headers(admin_token), pool_size=max(1, args.concurrency), observer=metrics)
+    state = None if args.no_state else SyncState(args.state_file or _default_state_path(args.bib_path))
+
+    try:
         try:
-            data = _http_json(
-                url=(
-                    f"{base_url}/api/pages"
-                    f"?limit={PAGE_SIZE}&offset={offset}"
-                    f"&kv_key={urllib.parse.quote('source')}&kv_value={urllib.parse.quote('zotero')}"
-                ),
-                method="GET",
-                headers=common_headers,
-            )
+            with metrics.phase("fingerprint"):
+                fingerprint = _fetch_fingerprint(client)
         except RuntimeError as e:
-            msg = str(e)
-            if "API error 401" in msg or "401" in msg:
-                # Try to surface the server's debug hint (it appends JSON after a newline).
-                hint = ""
-                if "\n" in msg:
-                    hint = msg.split("\n", 1)[1].strip()
-                client_len = len(f"Bearer {admin_token}".strip())
-                print(
-                    "ERROR: Unauthorized (401). The ENKIDU_ADMIN_TOKEN used by this script does not match the server.\n"
-                    "- If ENKIDU_BASE_URL points at your deployed site, use the SAME admin token you configured in Netlify.\n"
-                    "- If you pasted the token into Netlify with extra spaces/commas, the server only uses the first segment before whitespace/comma.\n"
-                    "- Ensure your PowerShell env var (or repo .env) matches exactly.\n"
-                    f"- Client Authorization header length: {client_len}\n"
-                    f"- Server hint (if provided): {hint or '(none)'}",
-                    file=sys.stderr,
-                )
+            if _is_unauthorized(e):
+                _report_unauthorized(e, admin_token)
                 return 2
             raise
-        existing_pages = (data or {}).get("pages", []) or []
-        if not existing_pages:
-            break
 
-        # Detect "offset ignored" (common when hitting an older deployed API).
-        first_id = str(existing_pages[0].get("id") or "").strip()
-        if first_id and first_id in seen_first_ids:
+        # If the server-side fingerprint still matches what we saw after the last sync, the local state is
+        # authoritative and we can skip downloading every existing Zotero page.
+        from_state = bool(
+            state
+            and fingerprint
+            and not args.refresh_state
+            and not args.purge_existing
+            and state.matches_fingerprint(base_url=base_url, fingerprint=fingerprint)
+        )
+
+        # Crash recovery: the state journals every chunk before it is sent (see _sync_state.py), so after an
+        # interrupted run it still lists every page the server may have; unconfirmed ones get rewritten.
+        interrupted = state.interrupted_run(base_url=base_url) if state else None
+        # A run planned with POST /api/pages-diff left a store of just the keys it had checked: resume it by
+        # skipping those (acked chunks included) and asking the server about the rest.
+        resume_diff = bool(args.resume and interrupted and interrupted.partial)
+        if resume_diff and (args.full_listing or args.delete_missing or args.refresh_state):
             print(
-                "ERROR: backend appears to ignore the offset parameter (received the same first page of results again).\n"
-                "You likely need to redeploy the updated Netlify Functions (or point ENKIDU_BASE_URL at your local netlify dev).\n"
-                "Refusing to continue to avoid creating duplicates / partial purges.",
+                f"NOTE: import run #{interrupted.run_id} was planned with POST /api/pages-diff; --full-listing, "
+                "--delete-missing and --refresh-state list every existing page again instead of resuming it.",
+                file=sys.stderr,
+            )
+            resume_diff = False
+        elif resume_diff:
+            print(
+                f"Resuming import run #{interrupted.run_id} ({interrupted.chunks_acked} of {interrupted.chunks_planned} "
+                f"journaled chunks acknowledged, {interrupted.pages_acked} pages); entries it confirmed are skipped, "
+                f"the rest (including {state.count_unconfirmed()} unconfirmed pages) is checked with the server."
+            )
+        elif args.resume and interrupted:
+            print(
+                f"Resuming import run #{interrupted.run_id} ({interrupted.chunks_acked} of {interrupted.chunks_planned} "
+                f"journaled chunks acknowledged, {interrupted.pages_acked} pages); "
+                f"{state.count_unconfirmed()} unconfirmed pages will be sent again."
+            )
+            from_state = True
+        elif args.resume and not interrupted:
+            print("Nothing to resume (the last import against this backend finished, or stopped before listing existing pages).")
+        elif interrupted and not from_state:
+            print(
+                f"NOTE: import run #{interrupted.run_id} did not finish ({interrupted.chunks_acked} of "
+                f"{interrupted.chunks_planned} chunks acknowledged). --resume would continue from the local state "
+                "instead of listing every existing page again.",
+                file=sys.stderr,
+            )
+        # Without a trustworthy local state, ask the server which entries changed (kilobytes of hashes) rather than
+        # listing every existing page. Deletes and purges need the full listing: they act on pages NOT in the .bib.
+        remote_diff = False
+        if not (from_state or args.full_listing or args.delete_missing or args.purge_existing or args.refresh_state):
+            with metrics.phase("fingerprint"):
+                remote_diff = supports_remote_diff(client, ZOTERO_SOURCE)
+            if remote_diff:
+                print("Asking the server which entries changed (POST /api/pages-diff); skipping the existing-pages download.")
+            else:
+                print("NOTE: the backend has no POST /api/pages-diff yet (redeploy the Netlify Functions); listing existing pages.")
+        run_id = state.begin_run(base_url=base_url) if state else 0
+        confirmed: dict[str, tuple[str, str]] = {}
+        if state and remote_diff:
+            # Rebuilt from the diff answers as the batches go by (only keys in the .bib; see the fingerprint check below).
+            # Every key it holds is right from here on (diff answers, then the journal), so a crash can be resumed.
+            if resume_diff:
+                confirmed = {k: (sp.page_id, sp.source_hash) for k, sp in state.load().items()}
+            else:
+                state.clear()
+            state.mark_seeded(run_id, partial=True)
+
+        def _journal_chunk(idx: int, chunk: list[PlannedPage]) -> None:
+            state.plan_chunk(run_id, idx, ((pp.key, pp.page["id"]) for pp in chunk))
+
+        # Pipeline: parse -> build items -> (near-dups) -> diff -> (secret scan) -> chunk -> merge kv -> upload, each stage in its own thread
+        # with bounded queues in between. The existing-pages listing runs alongside parsing; the diff stage
+        # waits for it before classifying the first entry, so nothing is written before we know what exists.
+        plan = SyncPlan()
+        stats = PipelineStats()
+        imported = 0
+        updated = 0
+        failed_chunks = 0
+        unsent = 0
+        written_ids: list[str] = []
+        # The dead letters of the last run are sent again by this one (they never reached the server). Its file is
+        # only replaced once this run's pipeline got through (a crash before that keeps it).
+        dead = DeadLetterFile(_dead_letter_path(args), replace=True)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="existing") as loader:
+            if remote_diff:
+                existing_fut: Future = Future()
+                existing_fut.set_result(confirmed)
+            else:
+                existing_fut = loader.submit(_load_existing, client, state, from_state, metrics)
+                if state:
+                    existing_fut.add_done_callback(lambda f: f.exception() is None and state.mark_seeded(run_id))
+            try:
+                if args.purge_existing and existing_fut.result():
+                    with metrics.phase("purge"):
+                        purged = _purge_existing(client)
+                    if not purged:
+                        if state:
+                            state.finish_run(run_id, "failed")
+                        return 2
+                    existing_fut = Future()
+                    existing_fut.set_result({})
+                    if state:
+                        state.clear()
+
+                # Bulk upsert in chunks (one HTTP call per chunk, several chunks in flight on keep-alive connections).
+                # Requires backend support for POST /api/pages with {pages:[...]} and x-enkidu-skip-embeddings: 1.
+                stages = [
+                    *_attachment_stages(args, attachments, attachment_stats),
+                    Stage("items", lambda entries: zotero_items_parallel(entries, workers=args.workers)),
+                    *([Stage("near_dups", dedupe)] if near_dups else []),
+                    *page_import_stages(
+                        client,
+                        existing_fut,
+                        plan,
+                        remote_diff=ZOTERO_SOURCE if remote_diff else None,
+                        on_known=state.upsert if state and remote_diff else None,
+                        chunk_bytes=int(args.chunk_mb * 1024 * 1024),
+                        concurrency=args.concurrency,
+                        before_upload=_journal_chunk if state else None,
+                        screen=secret_scan_stage(secrets) if secrets else None,
+                    ),
+                ]
+                with metrics.phase("pipeline"):
+                    for chunk, r in run_pipeline(iter_bibtex(raw), stages, stats=stats):
+                        written, retry = _settle_chunk(chunk, r, dead)
+                        n_new = sum(1 for pp in written if pp.is_new)
+                        imported += n_new
+                        updated += len(written) - n_new
+                        written_ids.extend(pp.page["id"] for pp in written)
+                        unsent += len(retry)
+                        if state and written:
+                            state.ack_chunk(run_id, r.index, ((pp.key, pp.page["id"], pp.source_hash) for pp in written))
+                        if not r.ok:
+                            # Pages not written stay unconfirmed in the state, so the next run sends them again.
+                            failed_chunks += 1
+                            if state:
+                                state.fail_chunk(run_id, r.index)
+                        _report_chunk(chunk, r, written)
+            except ListingError as e:
+                print(f"ERROR: {e}", file=sys.stderr)
+                if state:
+                    state.finish_run(run_id, "failed")
+                return 2
+            finally:
+                dead.close()
+                metrics.set_pipeline(stats)
+                metrics.set_counts(
+                    inserted=imported,
+                    updated=updated,
+                    unchanged=plan.unchanged,
+                    duplicate_keys=plan.duplicates,
+                    failed=unsent + dead.count,
+                    dead_letters=dead.count,
+                )
+                if near_dups:
+                    metrics.set_counts(near_dups=len(near_dups.pairs), near_dups_skipped=near_dups.skipped)
+                if secrets:
+                    metrics.set_counts(secrets_held=len(secrets.pages))
+                if attachments:
+                    metrics.set_counts(
+                        attachments=attachment_stats.files,
+                        attachments_extracted=attachment_stats.extracted,
+                        attachments_cached=attachment_stats.cached,
+                        attachments_missing=attachment_stats.missing,
+                        attachment_errors=attachment_stats.errors,
+                    )
+
+        dead.commit()
+
+        if not plan.seen_keys:
+            print("No BibTeX entries found.")
+            if state:
+                state.finish_run(run_id, "done")
+            return 0
+        if attachments:
+            st = attachment_stats
+            print(
+                f"Attachments: {st.files} files, {st.extracted} extracted ({st.seconds:.1f}s of worker time), "
+                f"{st.cached} from cache, {st.missing} not found, {st.errors} unreadable."
+            )
+        if plan.duplicates:
+            print(f"WARNING: {plan.duplicates} BibTeX entries repeat an earlier citekey (first one kept).", file=sys.stderr)
+        if plan.server_duplicates:
+            print(
+                "WARNING: multiple existing pages share the same zotero_citekey (newest page updated; older duplicates ignored):\n"
+                + "\n".join(sorted(plan.server_duplicates)),
                 file=sys.stderr,
             )
-            return 2
-        if first_id:
-            seen_first_ids.add(first_id)
-
-        for page in existing_pages:
-            ck = (page.get("kv_tags") or {}).get("zotero_citekey")
-            if isinstance(ck, str) and ck.strip():
-                key = ck.strip()
-                if key in existing_by_citekey:
-                    duplicate_citekeys.add(key)
-                    continue
-                existing_by_citekey[key] = page
 
-        fetched += len(existing_pages)
-        offset += len(existing_pages)
-        if len(existing_pages) < PAGE_SIZE:
-            break
+        if near_dups:
+            print_near_dup_summary(
+                near_dups, args.near_dup_report or args.bib_path.with_name(args.bib_path.name + ".near-dups.csv")
+            )
+        _print_secret_report(args, secrets)
+
+        # Deletes (delta sync): pages we know about whose citekey disappeared from the library.
+        existing_by_citekey = existing_fut.result()
+        to_delete: dict[str, str] = {}
+        if args.delete_missing:
+            # Near-dups skipped by --near-dups skip are still in the .bib: their existing pages stay.
+            in_bib = plan.seen_keys | (near_dups.skipped_keys if near_dups else set())
+            to_delete = {k: page_id for k, (page_id, _h) in existing_by_citekey.items() if k not in in_bib}
 
-    if fetched >= MAX_EXISTING:
         print(
-            f"WARNING: stopped after fetching {MAX_EXISTING} existing Zotero pages. If you have more, reruns may create duplicates.",
-            file=sys.stderr,
+            f"Plan: {plan.inserts} inserts, {plan.updates} updates, "
+            f"{len(to_delete)} deletes, {plan.unchanged} unchanged."
+            + (f" {len(secrets.pages)} held back (possible secrets)." if secrets and secrets.pages else "")
         )
-
-    if args.purge_existing and existing_by_citekey:
-        # Purpose: allow a clean reimport (single bulk delete; much faster than 1000s of per-page deletes).
-        print("Purging existing Zotero pages (bulk delete)...")
-        try:
-            res = _http_json(
-                url=(
-                    f"{base_url}/api/pages"
-                    f"?confirm=1"
-                    f"&kv_key={urllib.parse.quote('source')}&kv_value={urllib.parse.quote('zotero')}"
-                ),
-                method="DELETE",
-                headers=common_headers,
-            ) or {}
-        except RuntimeError as e:
-            msg = str(e)
-            if "API error 405" in msg or "405" in msg:
+        exit_code = 0
+        deleted = 0
+        if to_delete and len(to_delete) * 2 > len(existing_by_citekey) and not args.force_deletes:
+            # Guard against a truncated/half-written export wiping the library (inserts/updates are already written).
+            print(
+                f"ERROR: --delete-missing would delete {len(to_delete)} of {len(existing_by_citekey)} existing Zotero pages.\n"
+                "If the .bib file really is that much smaller, rerun with --force-deletes.",
+                file=sys.stderr,
+            )
+            to_delete = {}
+            exit_code = 2
+        if to_delete:
+            with metrics.phase("deletes"):
+                deleted = delete_pages(client, ZOTERO_SOURCE, list(to_delete.values()))
+            if state:
+                state.delete(to_delete.keys())
+        metrics.set_counts(deleted=deleted)
+
+        if args.backfill_embeddings and written_ids:
+            # Embed what we just wrote so related_to search sees it now, not after many cron runs.
+            # force: updated pages still carry the embedding of their old content.
+            print(f"Backfilling embeddings for {len(written_ids)} pages...")
+            with metrics.phase("embeddings"):
+                bf = _backfill_written(client, written_ids, args)
+            metrics.set_counts(embedded=bf.embedded, embed_failed=len(bf.failed))
+            print(
+                f"Embedded {bf.embedded} pages in {bf.seconds:.0f}s"
+                + (f" ({bf.throttled} rate-limited batches retried)" if bf.throttled else "")
+                + "."
+            )
+            if bf.failed:
                 print(
-                    "ERROR: your current backend does not support bulk delete yet (DELETE /api/pages returned 405 Method Not Allowed).\n"
-                    "You need to redeploy the updated Netlify Functions (or point ENKIDU_BASE_URL at your local netlify dev) and retry.",
+                    f"WARNING: {len(bf.failed)} pages could not be embedded (the background cron will retry them), e.g.:\n"
+                    + "\n".join(f"- {pid}: {err[:200]}" for pid, err in list(bf.failed.items())[:5]),
                     file=sys.stderr,
                 )
-                return 2
-            raise
-        if isinstance(res, dict) and res.get("ok") is True:
-            print(f"Purged existing Zotero pages. Deleted {res.get('deleted')} (before={res.get('before')}, after={res.get('after')}).")
-        else:
-            print(f"Purged existing Zotero pages. (Unexpected response: {res!r})")
-        existing_by_citekey = {}
-        duplicate_citekeys = set()
-
-    print(f"Found {len(existing_by_citekey)} existing Zotero pages (by zotero_citekey).")
 
-    imported = 0
-    updated = 0
-    unchanged = 0
-    skipped_duplicates = 0
-
-    if duplicate_citekeys:
-        # Warn loudly: duplicate citekeys mean prior imports created duplicates or citekeys changed.
+        if state:
+            state.finish_run(run_id, "incomplete" if failed_chunks else "done")
+            # Remember what the server looks like now, so the next run can trust the local state.
+            if imported or updated or deleted:
+                with metrics.phase("fingerprint"):
+                    fingerprint = _fetch_fingerprint(client)
+            # A diff-built state only knows the .bib's keys: trust it next time only if that is every Zotero page.
+            complete = not remote_diff or bool(fingerprint and state.count() == fingerprint.get("count"))
+            if fingerprint and complete:
+                state.save_fingerprint(base_url=base_url, fingerprint=fingerprint)
+
+        print(f"Pipeline: {stats.summary()}")
         print(
-            "WARNING: multiple existing pages share the same zotero_citekey (keeping newest page; older duplicates ignored):\n"
-            + "\n".join(sorted(duplicate_citekeys)),
-            file=sys.stderr,
+            f"Done. Imported {imported} pages. Updated {updated} pages. Unchanged {plan.unchanged} pages."
+            + (f" Deleted {deleted} pages." if args.delete_missing else "")
         )
-
-    to_upsert: list[dict[str, Any]] = []
-
-    for entry in entries:
-        new_import_id = _stable_import_id(entry)
-        new_source_hash = _source_hash(entry)
-
-        kv_tags: dict[str, Any] = {
-            "source": "zotero",
-            "zotero_citekey": entry.citekey,
-            "zotero_type": entry.entry_type,
-            "zotero_import_id": new_import_id,
-            "zotero_source_hash": new_source_hash,
-        }
-        # Store all BibTeX fields as kv_tags (as requested: author/year/journaltitle/etc).
-        for k, v in entry.fields.items():
-            if v and k not in kv_tags:
-                kv_tags[k] = v
-
-        title = _page_title(entry.fields)
-        content_md = _body_markdown(entry.fields)
-
-        existing_page = existing_by_citekey.get(entry.citekey)
-        if not existing_page:
-            to_upsert.append(
-                {
-                    "title": title,
-                    "content_md": content_md,
-                    "tags": ["zotero"],
-                    "kv_tags": kv_tags,
-                }
+        if dead.count:
+            print(
+                f"ERROR: {dead.count} pages were refused by the server on their own (the rest of their chunks was "
+                f"written). They are in {dead.path}: fix the entries in Zotero and rerun, or replay the file with "
+                "scripts/replay_dead_letters.py once the cause is fixed.",
+                file=sys.stderr,
             )
-            continue
-
-        # Update only if the Zotero source hash changed (or is missing).
-        old_kv = existing_page.get("kv_tags") or {}
-        old_hash = old_kv.get("zotero_source_hash")
-        if isinstance(old_hash, str) and old_hash.strip() == new_source_hash:
-            unchanged += 1
-            continue
-
-        # Merge kv_tags so we don't blow away unrelated keys the user may have added manually.
-        merged_kv = dict(old_kv)
-        merged_kv.update(kv_tags)
+        if unsent:
+            print(
+                f"ERROR: {failed_chunks} chunk(s) failed ({unsent} pages not written). Rerun to retry them "
+                "(unchanged pages are skipped automatically).",
+                file=sys.stderr,
+            )
+        if unsent or dead.count:
+            return 1
+        return exit_code
+    finally:
+        if attachments:
+            attachments.close()
+        if state:
+            state.close()
+        client.close()
+
+
+def _watch(args: argparse.Namespace, metrics: RunMetrics, data: bytes, signature: tuple[int, int] | None) -> int:
+    # Purpose: keep the pages in step with a .bib that Zotero (Better BibTeX auto-export) rewrites on every edit.
+    # Each new version is compared with the previous one by byte ranges (see _watch.py): a one-entry edit in a
+    # 10k-entry library re-parses ~1 KB and sends one page. The server is asked about just those keys.
+    base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+    client = EnkiduClient(
+        base_url,
+        headers=_request_headers(_env_required("ENKIDU_ADMIN_TOKEN")),
+        pool_size=max(1, args.concurrency),
+        observer=metrics,
+    )
+    state = None if args.no_state else SyncState(args.state_file or _default_state_path(args.bib_path))
+    attachments = _open_attachment_cache(args) if args.attachments else None
+    index = EntryIndex(iter_bibtex_spans, lambda e: e.citekey, macros=_MACRO_RE)
+    # Changes not on the server yet (kept across cycles until a sync succeeds): citekey -> latest entry, removed keys.
+    pending: dict[str, BibEntry] = {}
+    pending_removed: set[str] = set()
+    retry_delay = 0.0
+    try:
+        with metrics.phase("watch_index"):
+            index.rebuild(data)
+        remote_diff = supports_remote_diff(client, ZOTERO_SOURCE)
+        if not remote_diff:
+            print("NOTE: the backend has no POST /api/pages-diff; every change will list the existing pages first.")
+        print(
+            f"Watching {args.bib_path} ({len(index)} entries; checking every {args.watch_interval:g}s). Ctrl+C to stop."
+        )
+        while True:
+            if retry_delay:
+                # Unsent changes from a failed sync: try again (with whatever the file holds by then).
+                time.sleep(retry_delay)
+            if not retry_delay or file_signature(args.bib_path) != signature:
+                signature = wait_for_change(
+                    args.bib_path, signature, interval=args.watch_interval, debounce=args.watch_debounce
+                )
+            try:
+                data = args.bib_path.read_bytes()
+            except OSError as e:
+                print(f"WARNING: could not read {args.bib_path}: {e}", file=sys.stderr)
+                continue
+            started = time.perf_counter()
+            with metrics.phase("watch_parse"):
+                delta = index.update(data)
+            for entry in delta.changed:
+                pending[entry.citekey] = entry
+                pending_removed.discard(entry.citekey)
+            for key in delta.removed:
+                pending.pop(key, None)
+                if args.delete_missing:
+                    pending_removed.add(key)
+            if not pending and not pending_removed:
+                kept = f" {len(delta.removed)} removed (pages kept without --delete-missing)." if delta.removed else ""
+                print(f"[{time.strftime('%H:%M:%S')}] File rewritten; no entry changed.{kept}")
+                continue
+            if len(pending_removed) * 2 > len(index) + len(pending_removed) and not args.force_deletes:
+                # Same guard as the one-shot run: a half-written export must not wipe the library.
+                print(
+                    f"ERROR: the .bib lost {len(pending_removed)} of {len(index) + len(pending_removed)} entries; not "
+                    "deleting their pages (restart with --force-deletes if that is intended).",
+                    file=sys.stderr,
+                )
+                pending_removed = set()
+            n_changed, n_removed = len(pending), len(pending_removed)
+            try:
+                counts, failed_keys = _watch_cycle(
+                    args, metrics, base_url, client, state, attachments, list(pending.values()), pending_removed, remote_diff
+                )
+            except (RuntimeError, ListingError) as e:
+                retry_delay = min(60.0, max(5.0, retry_delay * 2))
+                print(f"ERROR: sync failed ({e}); retrying in {retry_delay:.0f}s.", file=sys.stderr)
+                continue
+            pending = {k: e for k, e in pending.items() if k in failed_keys}
+            pending_removed = set()
+            retry_delay = min(60.0, max(5.0, retry_delay * 2)) if pending else 0.0
+            metrics.count("watch_cycles")
+            for name, n in counts.items():
+                metrics.count(name, n)
+            print(
+                f"[{time.strftime('%H:%M:%S')}] {n_changed} changed, {n_removed} removed "
+                f"(re-parsed {delta.parsed_bytes / 1024:.1f} KB{', full parse' if delta.full else ''}): "
+                f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+                f"{counts['deleted']} deleted in {time.perf_counter() - started:.1f}s."
+                + (f" {len(failed_keys)} pages failed, retrying in {retry_delay:.0f}s." if failed_keys else "")
+            )
+            _write_reports(args, metrics)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        if attachments:
+            attachments.close()
+        if state:
+            state.close()
+        client.close()
+    return 0
 
-        page_id = str(existing_page.get("id") or "").strip()
-        if not page_id:
-            skipped_duplicates += 1
-            continue
 
-        to_upsert.append(
-            {
-                "id": page_id,
-                "title": title,
-                "content_md": content_md,
-                "tags": ["zotero"],
-                "kv_tags": merged_kv,
-            }
+def _watch_cycle(
+    args: argparse.Namespace,
+    metrics: RunMetrics,
+    base_url: str,
+    client: EnkiduClient,
+    state: SyncState | None,
+    attachments: AttachmentCache | None,
+    entries: list[BibEntry],
+    removed: set[str],
+    remote_diff: bool,
+) -> tuple[dict[str, int], set[str]]:
+    # One watch-mode sync: upsert `entries`, delete the pages of `removed` citekeys.
+    # Returns page counts and the citekeys whose chunk failed (to be sent again).
+    existing_fut: Future | None = None
+    if not remote_diff:
+        existing_fut = Future()
+        with metrics.phase("list_existing"):
+            existing_fut.set_result(list_existing_pages(client, ZOTERO_SOURCE)[0])
+    run_id = state.begin_run(base_url=base_url) if state else 0
+
+    def _journal_chunk(idx: int, chunk: list[PlannedPage]) -> None:
+        state.plan_chunk(run_id, idx, ((pp.key, pp.page["id"]) for pp in chunk))
+
+    plan = SyncPlan()
+    attachment_stats = AttachmentStats()
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    failed_keys: set[str] = set()
+    written_ids: list[str] = []
+    secrets = _secret_report(args)
+    stages = [
+        *_attachment_stages(args, attachments, attachment_stats),
+        Stage("items", zotero_items),
+        *page_import_stages(
+            client,
+            existing_fut,
+            plan,
+            remote_diff=ZOTERO_SOURCE if remote_diff else None,
+            on_known=state.upsert if state and remote_diff else None,
+            chunk_bytes=int(args.chunk_mb * 1024 * 1024),
+            concurrency=args.concurrency,
+            before_upload=_journal_chunk if state else None,
+            screen=secret_scan_stage(secrets) if secrets else None,
+        ),
+    ]
+    # Dead letters of every cycle are appended to the file the initial import started.
+    with metrics.phase("pipeline"), DeadLetterFile(_dead_letter_path(args)) as dead:
+        for chunk, r in run_pipeline(iter(entries), stages):
+            written, retry = _settle_chunk(chunk, r, dead)
+            n_new = sum(1 for pp in written if pp.is_new)
+            counts["inserted"] += n_new
+            counts["updated"] += len(written) - n_new
+            written_ids.extend(pp.page["id"] for pp in written)
+            if state and written:
+                state.ack_chunk(run_id, r.index, ((pp.key, pp.page["id"], pp.source_hash) for pp in written))
+            if not r.ok:
+                # Only pages caught in a chunk-wide failure are retried; refused ones wait for the entry to change.
+                failed_keys.update(pp.key for pp in retry)
+                if state:
+                    state.fail_chunk(run_id, r.index)
+                _report_chunk(chunk, r, written)
+    if dead.count:
+        metrics.count("dead_letters", dead.count)
+        print(f"WARNING: {dead.count} pages were refused by the server on their own; see {dead.path}.", file=sys.stderr)
+    counts["unchanged"] = plan.unchanged
+    # Held-back pages are not retried: the entry has to change first (and then it is a new change anyway).
+    _print_secret_report(args, secrets)
+    if secrets and secrets.pages:
+        metrics.count("secrets_held", len(secrets.pages))
+    if plan.server_duplicates:
+        print(
+            "WARNING: multiple existing pages share the same zotero_citekey (newest page updated):\n"
+            + "\n".join(sorted(plan.server_duplicates)),
+            file=sys.stderr,
         )
 
-    # Bulk upsert in chunks (one HTTP call per chunk).
-    # Requires backend support for POST /api/pages with {pages:[...]} and x-enkidu-skip-embeddings: 1.
-    if to_upsert:
-        chunks = _chunked(to_upsert, 250)
-        for idx, chunk in enumerate(chunks, start=1):
-            _http_json(
-                url=f"{base_url}/api/pages",
-                method="POST",
-                headers=common_headers,
-                body_obj={"pages": chunk},
-            )
-            # Best-effort progress: count inserts vs updates in the chunk.
-            imported += sum(1 for p in chunk if not p.get("id"))
-            updated += sum(1 for p in chunk if p.get("id"))
-            print(f"Bulk upsert {idx}/{len(chunks)}: processed {len(chunk)} pages...")
-
-    print(f"Done. Imported {imported} pages. Updated {updated} pages. Unchanged {unchanged} pages.")
-    return 0
+    if removed:
+        # Page ids of the removed citekeys: ask the server (an empty hash never matches, so each key that still
+        # has a page comes back with its id), or look them up in the listing.
+        if remote_diff:
+            stubs = [SourceItem(key=k, source_hash="", new_id="", build=dict) for k in sorted(removed)]
+            found = diff_with_server(client, ZOTERO_SOURCE, stubs)[0]
+            page_ids = [prev[0] for prev in found.values() if prev]
+        else:
+            known = existing_fut.result()
+            page_ids = [known[k][0] for k in removed if k in known]
+        if page_ids:
+            with metrics.phase("deletes"):
+                counts["deleted"] = delete_pages(client, ZOTERO_SOURCE, page_ids)
+        if state:
+            state.delete(removed)
+
+    if args.backfill_embeddings and written_ids:
+        with metrics.phase("embeddings"):
+            bf = _backfill_written(client, written_ids, args)
+        metrics.count("embedded", bf.embedded)
+        if bf.failed:
+            print(f"WARNING: {len(bf.failed)} pages could not be embedded (the background cron will retry them).", file=sys.stderr)
+
+    if state:
+        state.finish_run(run_id, "incomplete" if failed_keys else "done")
+        if counts["inserted"] or counts["updated"] or counts["deleted"]:
+            # Keep the next one-shot run able to skip the listing, if the state still covers every Zotero page.
+            with metrics.phase("fingerprint"):
+                fingerprint = _fetch_fingerprint(client)
+            if fingerprint and state.count() == fingerprint.get("count"):
+                state.save_fingerprint(base_url=base_url, fingerprint=fingerprint)
+            else:
+                state.invalidate()
+    if attachments and attachment_stats.files:
+        metrics.count("attachments_extracted", attachment_stats.extracted)
+    return counts, failed_keys
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
-
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: run full Zotero imports against a local stand-in for /api/pages.
+
+What it does (minimal + targeted):
+- Starts the in-memory stand-in API (scripts/_standin_api.py) on localhost.
+- Generates (once, cached) a synthetic .bib (scripts/_synthetic_corpora.py).
+- Per scenario, runs the real importer (scripts/import_zotero_bib_to_pages.py) twice against a fresh store:
+  a first import, then a rerun that should find nothing to do.
+- Reports pages/s, per-route request latency percentiles, statuses, injected faults, and checks the
+  store afterwards (one page per citekey, nothing missing, no duplicates).
+
+Scenarios:
+- clean:  latency only
+- faults: latency + 429s + 5xx + dropped connections + 502s after an applied write
+- resume: latency only, with the local sync state; the first import is killed (SIGKILL) once --kill-after
+          chunks are acknowledged, then `--resume` must finish it without resending the acknowledged pages
+- custom: whatever --latency-ms / --rate-* flags say
+
+Usage (PowerShell):
+  python scripts/load_test_import.py
+  python scripts/load_test_import.py --entries 100k --scenarios faults --concurrency 8
+  python scripts/load_test_import.py --scenarios resume --kill-after 3
+  python scripts/load_test_import.py --serve-only --port 8787   # just run the stand-in
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any
+
+from _standin_api import FaultConfig, StandInServer, percentile
+from _synthetic_corpora import write_corpus
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+IMPORTER = SCRIPTS_DIR / "import_zotero_bib_to_pages.py"
+
+SCENARIOS = {
+    "clean": FaultConfig(latency_ms=30, per_page_ms=0.2),
+    "faults": FaultConfig(
+        latency_ms=30,
+        per_page_ms=0.2,
+        rate_429=0.05,
+        rate_5xx=0.05,
+        rate_drop=0.02,
+        rate_fail_after_write=0.03,
+        retry_after_s=0.5,
+    ),
+    "resume": FaultConfig(latency_ms=30, per_page_ms=0.2),
+}
+
+
+def _parse_size(s: str) -> int:
+    s = s.strip().lower()
+    return int(float(s[:-1]) * 1000) if s.endswith("k") else int(s)
+
+
+def _importer(base_url: str, token: str, bib: Path, concurrency: int, extra: list[str]) -> tuple[list[str], dict[str, str]]:
+    env = {
+        **os.environ,
+        "ENKIDU_BASE_URL": base_url,
+        "ENKIDU_ADMIN_TOKEN": token,
+        # Bulk upserts require this header (pages.js rejects bulk imports with inline embeddings).
+        "ENKIDU_SKIP_EMBEDDINGS": "1",
+        "ENKIDU_ALLOW_SECRETS": "",
+        "PYTHONUNBUFFERED": "1",
+    }
+    extra = extra if "--state-file" in extra else ["--no-state", *extra]
+    return [sys.executable, str(IMPORTER), str(bib), "--concurrency", str(concurrency), *extra], env
+
+
+def _run_importer(base_url: str, token: str, bib: Path, concurrency: int, extra: list[str], log) -> tuple[int, float]:
+    cmd, env = _importer(base_url, token, bib, concurrency, extra)
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    seconds = time.perf_counter() - t0
+    log.write(f"$ {' '.join(cmd)}\n{proc.stdout}\n(exit {proc.returncode}, {seconds:.1f}s)\n\n")
+    return proc.returncode, seconds
+
+
+_ACKED_RE = re.compile(r"^Bulk upsert \d+: processed (\d+) pages")
+
+
+def _kill_importer(
+    base_url: str, token: str, bib: Path, concurrency: int, extra: list[str], after_chunks: int, log
+) -> tuple[int, float, int]:
+    # A crash mid-import: SIGKILL once `after_chunks` chunks are acknowledged. -> (exit, seconds, pages acked).
+    cmd, env = _importer(base_url, token, bib, concurrency, extra)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    lines: list[str] = []
+    chunks = pages = 0
+    for line in proc.stdout:
+        lines.append(line)
+        m = _ACKED_RE.match(line)
+        if m:
+            chunks += 1
+            pages += int(m.group(1))
+            if chunks >= after_chunks:
+                proc.kill()
+                break
+    lines.extend(proc.stdout)
+    rc = proc.wait()
+    seconds = time.perf_counter() - t0
+    log.write(f"$ {' '.join(cmd)}\n{''.join(lines)}\n(exit {rc}, killed after {chunks} chunks, {seconds:.1f}s)\n\n")
+    return rc, seconds, pages
+
+
+def _expected_citekeys(bib: Path) -> set[str]:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    from import_zotero_bib_to_pages import iter_bibtex
+
+    return {e.citekey for e in iter_bibtex(bib.read_text(encoding="utf-8", errors="replace"))}
+
+
+def _verify(server: StandInServer, expected: set[str]) -> dict[str, Any]:
+    # One page per citekey, none missing, nothing extra.
+    keys = Counter(str((p.get("kv_tags") or {}).get("zotero_citekey") or "") for p in server.store.pages.values())
+    dupes = sum(n - 1 for n in keys.values() if n > 1)
+    missing = len(expected - set(keys))
+    extra = len(set(keys) - expected)
+    return {"pages": len(server.store.pages), "duplicates": dupes, "missing": missing, "extra": extra, "ok": not (dupes or missing or extra)}
+
+
+def _route_report(server: StandInServer) -> dict[str, Any]:
+    out: dict[str, Any] = {}
+    for route, st in sorted(server.stats.items()):
+        lat = st.latencies_ms
+        out[route] = {
+            "requests": len(lat),
+            "p50_ms": percentile(lat, 50),
+            "p90_ms": percentile(lat, 90),
+            "p99_ms": percentile(lat, 99),
+            "max_ms": max(lat, default=0.0),
+            "statuses": {str(k): v for k, v in sorted(st.statuses.items())},
+            "mb_in": st.bytes_in / 1e6,
+            "mb_out": st.bytes_out / 1e6,
+        }
+    return out
+
+
+def _print_run(label: str, rc: int, seconds: float, pages: int, server: StandInServer, check: dict[str, Any]) -> None:
+    rate = pages / seconds if seconds > 0 else 0.0
+    print(f"  {label}: exit {rc}, {seconds:.1f}s" + (f", {rate:,.0f} pages/s" if pages else ""))
+    for route, r in _route_report(server).items():
+        statuses = " ".join(f"{k}x{v}" for k, v in r["statuses"].items())
+        print(
+            f"    {route:<20} {r['requests']:>6} req  p50 {r['p50_ms']:>7.1f}ms  p90 {r['p90_ms']:>7.1f}ms  "
+            f"p99 {r['p99_ms']:>7.1f}ms  max {r['max_ms']:>7.1f}ms  [{statuses}]"
+        )
+    if server.injected:
+        print("    injected: " + ", ".join(f"{k} x{v}" for k, v in sorted(server.injected.items())))
+    print(
+        f"    store: {check['pages']} pages, {check['missing']} missing, {check['duplicates']} duplicates, "
+        f"{check['extra']} unexpected -> {'OK' if check['ok'] else 'INCONSISTENT'}"
+    )
+
+
+def _written_since(server: StandInServer, mark: str) -> int:
+    return sum(1 for p in server.store.pages.values() if p["updated_at"] > mark)
+
+
+def _resume_scenario(
+    server: StandInServer, token: str, bib: Path, expected: set[str], args: argparse.Namespace, work_dir: Path, log
+) -> tuple[dict[str, Any], bool]:
+    # import (killed) -> --resume -> rerun, sharing one sync-state file. The resume must skip what the killed
+    # run got acknowledged, and leave the store consistent.
+    state_file = work_dir / "load-test.sync-state.sqlite"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{state_file}{suffix}").unlink(missing_ok=True)
+    extra = ["--state-file", str(state_file)]
+    runs: dict[str, Any] = {}
+
+    rc, seconds, acked = _kill_importer(server.base_url, token, bib, args.concurrency, extra, args.kill_after, log)
+    killed = rc != 0
+    print(
+        f"  import: {'killed' if killed else f'finished (exit {rc}) before it could be killed'} after {seconds:.1f}s, "
+        f"{acked} pages acknowledged, {len(server.store.pages)} in the store"
+    )
+    runs["import"] = {"exit_code": rc, "seconds": seconds, "pages_acked": acked, "killed": killed}
+    failed = not killed
+
+    for label, flags in (("resume", ["--resume"]), ("rerun", [])):
+        server.reset_stats()
+        mark = max((p["updated_at"] for p in server.store.pages.values()), default="")
+        rc, seconds = _run_importer(server.base_url, token, bib, args.concurrency, [*extra, *flags], log)
+        written = _written_since(server, mark)
+        check = _verify(server, expected)
+        _print_run(label, rc, seconds, written, server, check)
+        # Only what the killed run did not get acknowledged may be sent again (nothing at all on the rerun).
+        budget = len(expected) - acked if label == "resume" else 0
+        print(f"    wrote {written} pages (at most {budget} expected)")
+        runs[label] = {"exit_code": rc, "seconds": seconds, "pages_written": written, "routes": _route_report(server), "store": check}
+        failed = failed or rc != 0 or not check["ok"] or written > budget
+    return runs, failed
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Load-test the Zotero importer against a local stand-in API.")
+    p.add_argument("--entries", default="10k", help="Synthetic .bib size (e.g. 1k, 10k, 100k). Default: 10k.")
+    p.add_argument("--bib", type=Path, default=None, help="Use this .bib instead of a synthetic one.")
+    p.add_argument("--scenarios", default="clean,faults", help="Comma-separated: clean, faults, resume, custom. Default: clean,faults.")
+    p.add_argument("--concurrency", type=int, default=4, help="Importer --concurrency. Default: 4.")
+    p.add_argument("--seed", type=int, default=0, help="Corpus and fault RNG seed. Default: 0.")
+    p.add_argument("--work-dir", type=Path, default=None, help="Corpora + logs directory. Default: ~/.enkidu/bench.")
+    p.add_argument("--json", type=Path, default=None, help="Write the results as JSON.")
+    p.add_argument("--kill-after", type=int, default=3, help="resume scenario: chunks acknowledged before the kill. Default: 3.")
+    p.add_argument("--port", type=int, default=0, help="Stand-in port (default: any free port).")
+    p.add_argument("--serve-only", action="store_true", help="Only run the stand-in server (Ctrl+C to stop).")
+    g = p.add_argument_group("custom scenario / --serve-only faults")
+    g.add_argument("--latency-ms", type=float, default=30.0)
+    g.add_argument("--per-page-ms", type=float, default=0.2)
+    g.add_argument("--rate-429", type=float, default=0.0)
+    g.add_argument("--rate-5xx", type=float, default=0.0)
+    g.add_argument("--rate-drop", type=float, default=0.0)
+    g.add_argument("--rate-fail-after-write", type=float, default=0.0)
+    g.add_argument("--max-body-mb", type=float, default=6.0, help="Request body limit (413 above). Default: 6 (Netlify).")
+    args = p.parse_args()
+
+    custom = FaultConfig(
+        latency_ms=args.latency_ms,
+        per_page_ms=args.per_page_ms,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        rate_drop=args.rate_drop,
+        rate_fail_after_write=args.rate_fail_after_write,
+        max_body_bytes=int(args.max_body_mb * 1024 * 1024),
+        seed=args.seed,
+    )
+    token = "standin"
+
+    if args.serve_only:
+        server = StandInServer(port=args.port, admin_token=token, faults=custom).start()
+        print(f"Stand-in API on {server.base_url} (ENKIDU_ADMIN_TOKEN={token}). Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+
+    work_dir = args.work_dir or Path.home() / ".enkidu" / "bench"
+    if args.bib:
+        bib = args.bib
+    else:
+        n = _parse_size(args.entries)
+        bib = work_dir / "corpora" / f"zotero-{args.entries}-s{args.seed}.bib"
+        if not bib.exists():
+            print(f"Generating {bib.name}...")
+        write_corpus(bib, "zotero", n, seed=args.seed)
+    expected = _expected_citekeys(bib)
+    log_path = work_dir / "load-test.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    print(f"Corpus: {bib} ({len(expected)} citekeys). Importer output: {log_path}")
+
+    results: dict[str, Any] = {}
+    failed = False
+    with open(log_path, "w", encoding="utf-8") as log:
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in SCENARIOS and name != "custom":
+                print(f"ERROR: unknown scenario {name!r}", file=sys.stderr)
+                return 2
+            faults = replace(SCENARIOS.get(name, custom), seed=args.seed, max_body_bytes=custom.max_body_bytes)
+            server = StandInServer(port=args.port, admin_token=token, faults=faults).start()
+            print(f"\nScenario {name}: {faults}")
+            runs: dict[str, Any] = {}
+            try:
+                if name == "resume":
+                    runs, scenario_failed = _resume_scenario(server, token, bib, expected, args, work_dir, log)
+                    failed = failed or scenario_failed
+                for label in ("import", "rerun") if name != "resume" else ():
+                    server.reset_stats()
+                    rc, seconds = _run_importer(server.base_url, token, bib, args.concurrency, [], log)
+                    posts = server.stats.get("POST /api/pages")
+                    pages = len(expected) if label == "import" else 0
+                    check = _verify(server, expected)
+                    _print_run(label, rc, seconds, pages, server, check)
+                    runs[label] = {
+                        "exit_code": rc,
+                        "seconds": seconds,
+                        "pages_per_s": pages / seconds if pages and seconds > 0 else 0.0,
+                        "bulk_posts_ok": posts.statuses.get(200, 0) if posts else 0,
+                        "routes": _route_report(server),
+                        "injected": dict(server.injected),
+                        "store": check,
+                    }
+                    failed = failed or rc != 0 or not check["ok"]
+            finally:
+                server.stop()
+            results[name] = {"faults": asdict(faults), "runs": runs}
+
+    if args.json:
+        args.json.write_text(json.dumps({"corpus": str(bib), "citekeys": len(expected), "scenarios": results}, indent=2), encoding="utf-8")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
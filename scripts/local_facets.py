@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Explore tags and kv_tags offline: value counts, co-occurrence and filtered drill-downs, in milliseconds.
+
+What it does (minimal + targeted):
+- `build`: turns a page dump into a columnar facet snapshot (integer-coded values in NumPy arrays). The dump
+  is a backup archive chain from pages_archive.py, or the server itself (GET /api/pages-export, streamed).
+- `fields`: every facet field with its number of distinct values and of pages that have one.
+- `count FIELD`: pages per value (e.g. per journaltitle), optionally within --where filters.
+- `cooc FIELD_A FIELD_B`: pages per pair of values (e.g. keywords x year, or keywords x keywords).
+- `pages`: how many pages match the --where filters, and which.
+
+Filters (--where, repeatable, all must hold): field=value, field=a|b (any of), field!=value, field=* (has a
+value), field>=2015 / < / <= / > (numeric values, e.g. year).
+
+Requirements:
+- numpy (pip install numpy)
+- `build --from-server`: ENKIDU_BASE_URL + ENKIDU_ADMIN_TOKEN
+
+Usage (PowerShell):
+  python scripts/local_facets.py build D:\\enkidu-backups
+  python scripts/local_facets.py build --from-server
+  python scripts/local_facets.py count journaltitle --where source=zotero --where "year>=2015"
+  python scripts/local_facets.py cooc keywords year --top 30
+  python scripts/local_facets.py pages --where "keywords=process tracing" --where year=2021
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, Iterator
+
+from _dotenv import load_repo_dotenv
+from _enkidu_api import EnkiduClient
+from _facets import FacetSnapshot, Where
+from _page_archive import iter_restore_pages, plan_restore, resolve_chain
+
+
+def _env_required(name: str) -> str:
+    v = os.environ.get(name, "").strip()
+    if not v:
+        raise RuntimeError(f"Missing {name}")
+    return v
+
+
+def _default_snapshot_dir() -> Path:
+    return Path(os.environ.get("ENKIDU_FACETS_DIR", "").strip() or Path.home() / ".enkidu" / "facets")
+
+
+def _iter_server_pages(client: EnkiduClient, page_size: int = 500) -> Iterator[dict[str, Any]]:
+    # One keyset cursor over every page (updated_at order); pages are consumed as they arrive.
+    since = ""
+    while True:
+        data = client.request(
+            "GET",
+            f"/api/pages-export?limit={page_size}" + (f"&since={urllib.parse.quote(since, safe='')}" if since else ""),
+        ) or {}
+        pages = data.get("pages") or []
+        yield from pages
+        next_cursor = str(data.get("next_cursor") or "")
+        if (len(pages) < page_size and not data.get("truncated")) or not next_cursor or next_cursor == since:
+            return
+        since = next_cursor
+
+
+def _cmd_build(args: argparse.Namespace) -> int:
+    t0 = time.perf_counter()
+    if args.from_server:
+        base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+        admin_token = _env_required("ENKIDU_ADMIN_TOKEN")
+        with EnkiduClient(base_url, headers={"authorization": f"Bearer {admin_token}"}, accept_gzip=True) as client:
+            snap = FacetSnapshot.build(
+                _iter_server_pages(client), max_value_chars=args.max_value_chars, source=base_url
+            )
+    else:
+        if not args.archives:
+            raise RuntimeError("Give backup archive(s) / a backup directory, or --from-server")
+        chain = resolve_chain(args.archives)
+        snap = FacetSnapshot.build(
+            iter_restore_pages(plan_restore(chain)),
+            max_value_chars=args.max_value_chars,
+            source=", ".join(i.path.name for i in chain),
+        )
+    snap.save(args.snapshot_dir)
+    print(
+        f"Built {len(snap.columns)} facet fields over {snap.n} pages in {time.perf_counter() - t0:.1f}s "
+        f"-> {args.snapshot_dir}"
+    )
+    return 0
+
+
+def _mask(snap: FacetSnapshot, args: argparse.Namespace) -> Any:
+    return snap.mask(Where.parse(w) for w in args.where or [])
+
+
+def _matched(mask: Any, snap: FacetSnapshot) -> str:
+    return f"{snap.n if mask is None else int(mask.sum())} of {snap.n} pages"
+
+
+def _cmd_query(args: argparse.Namespace) -> int:
+    snap = FacetSnapshot.load(args.snapshot_dir)
+    t0 = time.perf_counter()
+    if args.cmd == "fields":
+        rows = [(f.name, f.distinct, f.pages) for f in snap.fields()]
+        ms = (time.perf_counter() - t0) * 1000
+        width = max((len(r[0]) for r in rows), default=5)
+        print(f"{'field':<{width}}  {'values':>8}  {'pages':>8}")
+        for name, distinct, pages in rows:
+            print(f"{name:<{width}}  {distinct:>8}  {pages:>8}")
+        print(f"({len(rows)} fields over {snap.n} pages in {ms:.1f} ms)")
+        return 0
+
+    mask = _mask(snap, args)
+    if args.cmd == "count":
+        hits = snap.counts(args.field, mask, top=args.top)
+        ms = (time.perf_counter() - t0) * 1000
+        for value, n in hits:
+            print(f"{n:>8}  {value}")
+    elif args.cmd == "cooc":
+        pairs = snap.cooccurrence(args.field_a, args.field_b, mask, top=args.top)
+        ms = (time.perf_counter() - t0) * 1000
+        for a, b, n in pairs:
+            print(f"{n:>8}  {a}  |  {b}")
+    else:
+        total, pages = snap.pages(mask, limit=args.top)
+        ms = (time.perf_counter() - t0) * 1000
+        for pid, title in pages:
+            print(f"{pid}  {title}")
+        if total > len(pages):
+            print(f"... and {total - len(pages)} more")
+    print(f"({_matched(mask, snap)} in {ms:.1f} ms)")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Columnar facet snapshot of Enkidu tags/kv_tags (counts, co-occurrence, drill-down).")
+    p.add_argument(
+        "--snapshot-dir",
+        type=Path,
+        default=None,
+        help="Snapshot directory. Default: $ENKIDU_FACETS_DIR or ~/.enkidu/facets.",
+    )
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    pb = sub.add_parser("build", help="Build the snapshot from backup archives or from the server.")
+    pb.add_argument("archives", nargs="*", type=Path, help="A backup directory, or a full archive + its incrementals.")
+    pb.add_argument("--from-server", action="store_true", help="Stream all pages from the server instead.")
+    pb.add_argument(
+        "--max-value-chars", type=int, default=200, help="Longer values (abstracts, notes) are not facets. Default: 200."
+    )
+
+    sub.add_parser("fields", help="List facet fields.")
+    where = argparse.ArgumentParser(add_help=False)
+    where.add_argument("--where", action="append", metavar="FILTER", help="field=value, field=a|b, field!=v, field=*, field>=n")
+    where.add_argument("--top", type=int, default=20, help="Rows to show. Default: 20.")
+    pc = sub.add_parser("count", parents=[where], help="Pages per value of a field.")
+    pc.add_argument("field")
+    po = sub.add_parser("cooc", parents=[where], help="Pages per pair of values of two fields.")
+    po.add_argument("field_a")
+    po.add_argument("field_b")
+    sub.add_parser("pages", parents=[where], help="Pages matching the filters.")
+
+    args = p.parse_args()
+    args.snapshot_dir = args.snapshot_dir or _default_snapshot_dir()
+
+    # Load repo `.env` so this script can be run without manually exporting vars every time.
+    load_repo_dotenv()
+
+    try:
+        if args.cmd == "build":
+            return _cmd_build(args)
+        return _cmd_query(args)
+    except (RuntimeError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
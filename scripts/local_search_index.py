@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Keep a local full-text index of pages and search it offline.
+
+What it does (minimal + targeted):
+- `sync`: pulls pages updated since the last sync (GET /api/pages-export) into a SQLite FTS5 index of
+  title, content_md, tags and kv_tags, and drops pages deleted on the server.
+- `search`: ranked, snippeted results in milliseconds, with the filters of GET /api/pages
+  (q, tag, thread_id, kv_key/kv_value, ids, limit, offset), or raw FTS5 syntax via --match.
+
+Requirements:
+- `sync`: ENKIDU_BASE_URL + ENKIDU_ADMIN_TOKEN
+- `search`: nothing (fully offline)
+
+Usage (PowerShell):
+  python scripts/local_search_index.py sync
+  python scripts/local_search_index.py search "causal map"
+  python scripts/local_search_index.py search --q evaluation --tag zotero --kv-key year --kv-value 2021
+  python scripts/local_search_index.py search --match "title:theory AND (change OR impact) NOT draft"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from _dotenv import load_repo_dotenv
+from _enkidu_api import EnkiduClient
+from _search_index import SearchIndex
+
+
+def _env_required(name: str) -> str:
+    v = os.environ.get(name, "").strip()
+    if not v:
+        raise RuntimeError(f"Missing {name}")
+    return v
+
+
+def _default_index_dir() -> Path:
+    return Path(os.environ.get("ENKIDU_SEARCH_INDEX_DIR", "").strip() or Path.home() / ".enkidu" / "search-index")
+
+
+def _cmd_sync(args: argparse.Namespace) -> int:
+    base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+    admin_token = _env_required("ENKIDU_ADMIN_TOKEN")
+    if args.reset and args.index_dir.exists():
+        shutil.rmtree(args.index_dir)
+    with EnkiduClient(base_url, headers={"authorization": f"Bearer {admin_token}"}, accept_gzip=True) as client:
+        with SearchIndex(args.index_dir) as index:
+            s = index.sync(client, base_url=base_url)
+            print(
+                f"Done. Added {s.added}, updated {s.updated}, removed {s.removed} in {s.seconds:.1f}s "
+                f"({index.count} pages in {index.root})."
+            )
+    return 0
+
+
+def _cmd_search(args: argparse.Namespace) -> int:
+    q = " ".join(x for x in (args.q, *args.text) if x)
+    with SearchIndex(args.index_dir) as index:
+        if not index.count:
+            print("ERROR: the local index is empty (run sync first).", file=sys.stderr)
+            return 2
+        t0 = time.perf_counter()
+        try:
+            hits = index.search(
+                q=q,
+                match=args.match or "",
+                tag=args.tag or "",
+                thread_id=args.thread_id or "",
+                kv_key=args.kv_key or "",
+                kv_value=args.kv_value or "",
+                ids=[s.strip() for s in args.ids.split(",") if s.strip()] if args.ids else None,
+                limit=args.limit,
+                offset=args.offset,
+            )
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+        ms = (time.perf_counter() - t0) * 1000
+
+        if args.json:
+            print(json.dumps([h.__dict__ for h in hits], ensure_ascii=False, indent=2))
+            return 0
+        for h in hits:
+            tags = f"  [{', '.join(h.tags)}]" if h.tags else ""
+            print(f"{h.score:7.2f}  {h.id}  {h.title or '(untitled)'}{tags}")
+            snippet = " ".join(h.snippet.split())
+            if snippet:
+                print(f"         {snippet}")
+        print(f"({len(hits)} results from {index.count} pages in {ms:.1f} ms)")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Local SQLite FTS5 index over Enkidu pages (offline keyword search).")
+    p.add_argument(
+        "--index-dir",
+        type=Path,
+        default=None,
+        help="Index directory. Default: $ENKIDU_SEARCH_INDEX_DIR or ~/.enkidu/search-index.",
+    )
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    ps = sub.add_parser("sync", help="Pull new/changed pages and drop deleted pages.")
+    ps.add_argument("--reset", action="store_true", help="Delete the local index and download everything again.")
+
+    pq = sub.add_parser("search", help="Ranked keyword search (same parameters as GET /api/pages).")
+    pq.add_argument("text", nargs="*", help="Search text (same as --q).")
+    pq.add_argument("--q", default="", help="Search text: a phrase, the last word may be a prefix.")
+    pq.add_argument("--match", help="Raw FTS5 query (AND/OR/NOT, \"phrases\", prefix*, NEAR(), title:term).")
+    pq.add_argument("--tag", help="Only pages with this tag.")
+    pq.add_argument("--thread-id", help="Only pages in this thread.")
+    pq.add_argument("--kv-key", help="With --kv-value: only pages whose kv_tags contain this key/value.")
+    pq.add_argument("--kv-value", help="Parsed like the API: numbers, true/false/null, JSON, else a string.")
+    pq.add_argument("--ids", help="Comma-separated page ids to search within.")
+    pq.add_argument("--limit", type=int, default=50, help="Default: 50 (like the API).")
+    pq.add_argument("--offset", type=int, default=0)
+    pq.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    args = p.parse_args()
+    args.index_dir = args.index_dir or _default_index_dir()
+
+    # Load repo `.env` so this script can be run without manually exporting vars every time.
+    load_repo_dotenv()
+
+    try:
+        if args.cmd == "sync":
+            return _cmd_sync(args)
+        return _cmd_search(args)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
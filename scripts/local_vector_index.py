@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Keep a local copy of page embeddings and answer related-pages queries offline.
+
+What it does (minimal + targeted):
+- `sync`: pulls embeddings written since the last sync (GET /api/embeddings) into a memory-mapped
+  float32 matrix + SQLite metadata, and drops pages deleted on the server.
+- `query`: top-k nearest pages by cosine (default) or L2, exact or via the optional IVF index.
+- `build-ivf`: clusters the vectors (k-means) so queries only scan the nearest clusters.
+
+Requirements:
+- numpy (pip install numpy)
+- `sync`: ENKIDU_BASE_URL + ENKIDU_ADMIN_TOKEN
+- `query --text`: GEMINI_API_KEY (the query text is embedded with the same model as the pages)
+
+Usage (PowerShell):
+  python scripts/local_vector_index.py sync
+  python scripts/local_vector_index.py query --like 3f0c2d9e-0000-4000-8000-000000000000 -k 10
+  python scripts/local_vector_index.py query --text "causal mapping in evaluation"
+  python scripts/local_vector_index.py build-ivf
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from _dotenv import load_repo_dotenv
+from _enkidu_api import EnkiduClient
+from _vector_index import VectorIndex
+
+
+def _env_required(name: str) -> str:
+    v = os.environ.get(name, "").strip()
+    if not v:
+        raise RuntimeError(f"Missing {name}")
+    return v
+
+
+def _default_index_dir() -> Path:
+    return Path(os.environ.get("ENKIDU_VECTOR_INDEX_DIR", "").strip() or Path.home() / ".enkidu" / "vector-index")
+
+
+def _embed_query_text(text: str, model: str) -> list[float]:
+    # Same call as geminiEmbed() in netlify/functions/_gemini.js, as a RETRIEVAL_QUERY.
+    api_key = _env_required("GEMINI_API_KEY")
+    url = (
+        "https://generativelanguage.googleapis.com/v1beta/models/"
+        f"{urllib.parse.quote(model)}:embedContent?key={urllib.parse.quote(api_key)}"
+    )
+    body = json.dumps({"content": {"parts": [{"text": text}]}, "taskType": "RETRIEVAL_QUERY"}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"content-type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=20) as resp:
+        data = json.loads(resp.read().decode("utf-8"))
+    values = (data.get("embedding") or {}).get("values")
+    if not values:
+        raise RuntimeError("Gemini embed error: missing embedding.values")
+    return values
+
+
+def _cmd_sync(args: argparse.Namespace) -> int:
+    base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+    admin_token = _env_required("ENKIDU_ADMIN_TOKEN")
+    if args.reset and args.index_dir.exists():
+        shutil.rmtree(args.index_dir)
+    with EnkiduClient(base_url, headers={"authorization": f"Bearer {admin_token}"}) as client:
+        with VectorIndex(args.index_dir) as index:
+            s = index.sync(client, base_url=base_url)
+            print(
+                f"Done. Added {s.added}, updated {s.updated}, removed {s.removed} in {s.seconds:.1f}s "
+                f"({index.count} pages in {index.root})."
+            )
+    return 0
+
+
+def _cmd_build_ivf(args: argparse.Namespace) -> int:
+    with VectorIndex(args.index_dir) as index:
+        t0 = time.perf_counter()
+        nlist = index.build_ivf(nlist=args.nlist)
+        print(f"Built IVF with {nlist} clusters over {index.count} vectors in {time.perf_counter() - t0:.1f}s.")
+    return 0
+
+
+def _cmd_query(args: argparse.Namespace) -> int:
+    with VectorIndex(args.index_dir) as index:
+        exclude: list[str] = []
+        if args.like:
+            vecs = []
+            for pid in args.like:
+                v = index.vector_for(pid)
+                if v is None:
+                    print(f"ERROR: page {pid} is not in the local index (run sync first?).", file=sys.stderr)
+                    return 2
+                vecs.append(v)
+            exclude = list(args.like)
+        else:
+            model = index.embedding_model() or os.environ.get("GEMINI_EMBED_MODEL", "") or "text-embedding-004"
+            vecs = [_embed_query_text(t, model) for t in args.text]
+
+        t0 = time.perf_counter()
+        results = index.search(
+            vecs,
+            k=args.k,
+            metric=args.metric,
+            nprobe=None if args.exact else args.nprobe,
+            exclude=exclude,
+        )
+        ms = (time.perf_counter() - t0) * 1000
+
+        labels = args.like or args.text
+        for label, hits in zip(labels, results):
+            print(f"# {label}")
+            for h in hits:
+                print(f"{h.score:.4f}  {h.id}  {h.title}")
+        print(f"({len(labels)} queries over {index.count} pages in {ms:.1f} ms)")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Local memory-mapped vector index over Enkidu page embeddings.")
+    p.add_argument(
+        "--index-dir",
+        type=Path,
+        default=None,
+        help="Index directory. Default: $ENKIDU_VECTOR_INDEX_DIR or ~/.enkidu/vector-index.",
+    )
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    ps = sub.add_parser("sync", help="Pull new/changed embeddings and drop deleted pages.")
+    ps.add_argument("--reset", action="store_true", help="Delete the local index and download everything again.")
+
+    pb = sub.add_parser("build-ivf", help="Build the approximate (IVF) index used by query --nprobe.")
+    pb.add_argument("--nlist", type=int, default=0, help="Number of clusters. Default: sqrt(number of pages).")
+
+    pq = sub.add_parser("query", help="Top-k related pages.")
+    g = pq.add_mutually_exclusive_group(required=True)
+    g.add_argument("--like", nargs="+", metavar="PAGE_ID", help="Pages related to these page(s) (fully offline).")
+    g.add_argument("--text", nargs="+", metavar="TEXT", help="Pages related to this text (embeds the text via Gemini).")
+    pq.add_argument("-k", type=int, default=10, help="Results per query. Default: 10.")
+    pq.add_argument("--metric", choices=("cosine", "l2"), default="cosine")
+    pq.add_argument(
+        "--nprobe",
+        type=int,
+        default=8,
+        help="With an IVF index: clusters to scan per query (more = slower, more exact). Default: 8.",
+    )
+    pq.add_argument("--exact", action="store_true", help="Ignore the IVF index and scan every vector.")
+
+    args = p.parse_args()
+    args.index_dir = args.index_dir or _default_index_dir()
+
+    # Load repo `.env` so this script can be run without manually exporting vars every time.
+    load_repo_dotenv()
+
+    try:
+        if args.cmd == "sync":
+            return _cmd_sync(args)
+        if args.cmd == "build-ivf":
+            return _cmd_build_ivf(args)
+        return _cmd_query(args)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
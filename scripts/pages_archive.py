@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Back up every page to a compressed NDJSON archive, and restore or verify from one.
+
+What it does (minimal + targeted):
+- `export`: streams all pages (GET /api/pages-export) into a .ndjson.gz archive, several uuid-range shards
+  at once, in constant memory. With `--dir`, the first run writes a full archive and later runs write
+  incremental ones (pages updated since the previous archive + the current list of page ids).
+- `restore`: replays an archive (or a full archive + its incrementals) through the bulk POST /api/pages path,
+  keeping page ids, created_at and threading, then checks every page by id and content hash.
+- `verify`: the same check without writing anything (e.g. after a migration or a restore elsewhere).
+
+Notes:
+- updated_at is set by the database: restored pages get the time of the restore.
+- Embeddings are not archived; `restore --backfill-embeddings` recomputes them (or leave it to the cron).
+- Restores upsert: pages on the server that the archive doesn't have are left alone (verify reports them).
+
+Requirements:
+- ENKIDU_BASE_URL + ENKIDU_ADMIN_TOKEN
+- Optional (restore): ENKIDU_ALLOW_SECRETS="1" (passes x-enkidu-allow-secrets: 1; the server's secret check
+  applies to restores too)
+
+Usage (PowerShell):
+  python scripts/pages_archive.py export --dir D:\\enkidu-backups
+  python scripts/pages_archive.py export --out pages.ndjson.gz
+  python scripts/pages_archive.py restore D:\\enkidu-backups
+  python scripts/pages_archive.py verify pages.ndjson.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from _dotenv import load_repo_dotenv
+from _embedding_backfill import backfill_embeddings
+from _enkidu_api import DEFAULT_CHUNK_BYTES, MAX_BULK_PAGES, ApiError, EnkiduClient, encode_json, upload_chunks_iter
+from _page_archive import (
+    CONTENT_FIELDS,
+    ArchiveInfo,
+    ArchiveWriter,
+    RestorePlan,
+    archive_path,
+    iter_restore_pages,
+    list_archives,
+    page_hash,
+    plan_restore,
+    read_info,
+    resolve_chain,
+)
+from _keyset import iter_ids, iter_since, since_cursor
+from _pipeline import batched, batched_by_size
+
+VERIFY_BATCH = 500  # MAX_IDS in pages.js
+
+
+def _env_required(name: str) -> str:
+    v = os.environ.get(name, "").strip()
+    if not v:
+        raise RuntimeError(f"Missing {name}")
+    return v
+
+
+def _client(args: argparse.Namespace, headers: dict[str, str] | None = None) -> tuple[str, EnkiduClient]:
+    base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+    admin_token = _env_required("ENKIDU_ADMIN_TOKEN")
+    client = EnkiduClient(
+        base_url,
+        headers={"authorization": f"Bearer {admin_token}", **(headers or {})},
+        pool_size=max(4, args.concurrency),
+        accept_gzip=True,
+    )
+    return base_url, client
+
+
+def _export_get(client: EnkiduClient, **params: Any) -> Any:
+    try:
+        return client.request("GET", "/api/pages-export?" + urllib.parse.urlencode(params))
+    except ApiError as e:
+        if e.status == 404:
+            raise RuntimeError("The backend has no /api/pages-export (redeploy the Netlify Functions).") from e
+        raise
+
+
+def _parallel(shards: int, produce: Callable[[str], Iterator[Any]]) -> Iterator[Any]:
+    # Run `produce(shard)` for every shard on its own thread and yield items as they arrive. The queue is
+    # bounded, so slow consumers (the gzip writer) throttle the downloads instead of buffering them.
+    q: queue.Queue[Any] = queue.Queue(maxsize=2 * shards)
+    done = object()
+    stop = threading.Event()
+
+    def _run(i: int) -> None:
+        try:
+            for item in produce(f"{i}/{shards}"):
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            q.put(done)
+        except BaseException as e:  # noqa: BLE001 - re-raised on the consumer side
+            q.put(e)
+
+    threads = [threading.Thread(target=_run, args=(i,), daemon=True) for i in range(shards)]
+    for t in threads:
+        t.start()
+    remaining = shards
+    try:
+        while remaining:
+            item = q.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+
+
+def _cmd_export(args: argparse.Namespace) -> int:
+    base: ArchiveInfo | None = None
+    if args.dir:
+        if not args.full:
+            found = list_archives(args.dir) if args.dir.exists() else []
+            base = found[-1] if found else None
+        out = archive_path(args.dir, incremental=base is not None)
+    else:
+        out = args.out
+        if args.base:
+            base = read_info(args.base)
+            if not base.complete:
+                raise RuntimeError(f"{args.base} is incomplete (the export did not finish)")
+
+    base_url, client = _client(args)
+    # Re-read SYNC_OVERLAP before the base archive's newest updated_at (slow transactions commit late).
+    since = since_cursor(base.max_updated_at) if base else ""
+    started = time.perf_counter()
+    shards = max(1, min(256, args.concurrency))
+    page_size = max(1, min(500, args.page_size))
+    with client:
+        total = (_export_get(client, stats=1) or {}).get("count", 0)
+        kind = f"incremental since {base.path.name}" if base else "full"
+        print(f"Exporting {kind} from {base_url} ({total} pages on the server) to {out}...")
+        writer = ArchiveWriter(out, base_url=base_url, base=base, since=since)
+        try:
+            raw = 0
+            next_report = time.monotonic() + 5
+            for pages in _parallel(shards, lambda s: iter_since(client, "/api/pages-export", since, page_size=page_size, shard=s)):
+                for p in pages:
+                    raw += writer.page(p)
+                if time.monotonic() >= next_report:
+                    print(f"  {writer.pages} pages ({raw / 1e6:.0f} MB of JSON)...")
+                    next_report = time.monotonic() + 5
+            if base is not None:
+                # Which pages still exist: lets a restore drop pages deleted since the base archive.
+                writer.page_ids(sorted(_parallel(shards, lambda s: iter_ids(client, "/api/pages-export", shard=s))))
+            writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+    seconds = time.perf_counter() - started
+    size = out.stat().st_size
+    print(
+        f"Done. {writer.pages} pages ({raw / 1e6:.1f} MB of JSON, {size / 1e6:.1f} MB on disk) in {seconds:.1f}s"
+        + (f"; {writer.ids} page ids listed" if base else "")
+        + f" -> {out}"
+    )
+    return 0
+
+
+def _verify(client: EnkiduClient, expected: dict[str, str], concurrency: int) -> tuple[int, list[str], list[str]]:
+    # Re-read the pages by id; returns (matching, missing ids, ids whose content differs).
+    select = ",".join(("id", *CONTENT_FIELDS))
+
+    def _check(ids: list[str]) -> tuple[int, list[str], list[str]]:
+        rows = client.request("GET", f"/api/pages?ids={','.join(ids)}&limit={len(ids)}&select={select}") or {}
+        got = {r["id"]: page_hash(r) for r in rows.get("pages") or []}
+        missing = [i for i in ids if i not in got]
+        differ = [i for i in ids if i in got and got[i] != expected[i]]
+        return len(ids) - len(missing) - len(differ), missing, differ
+
+    ok, missing, differ = 0, [], []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        for n, m, d in ex.map(_check, batched(sorted(expected), VERIFY_BATCH)):
+            ok += n
+            missing += m
+            differ += d
+    return ok, missing, differ
+
+
+def _report_verify(client: EnkiduClient, expected: dict[str, str], concurrency: int) -> int:
+    started = time.perf_counter()
+    ok, missing, differ = _verify(client, expected, concurrency)
+    server_count = (_export_get(client, stats=1) or {}).get("count", 0)
+    extra = max(0, server_count - ok - len(differ))
+    print(
+        f"Verified {ok}/{len(expected)} pages in {time.perf_counter() - started:.1f}s: "
+        f"{len(missing)} missing, {len(differ)} different"
+        + (f"; the server also has {extra} pages that are not in the archive" if extra else "")
+        + "."
+    )
+    for label, ids in (("missing", missing), ("different", differ)):
+        if ids:
+            print(f"  {label}, e.g.: " + ", ".join(ids[:5]), file=sys.stderr)
+    return 0 if not missing and not differ else 1
+
+
+def _load_plan(paths: list[Path]) -> tuple[list[ArchiveInfo], RestorePlan]:
+    chain = resolve_chain(paths)
+    for info in chain:
+        print(f"  {info.path.name}: {'incremental' if info.incremental else 'full'}, {info.pages} pages, {info.created_at}")
+    plan = plan_restore(chain)
+    return chain, plan
+
+
+def _cmd_verify(args: argparse.Namespace) -> int:
+    _chain, plan = _load_plan(args.archives)
+    _base_url, client = _client(args)
+    with client:
+        return _report_verify(client, {k: v[2] for k, v in plan.winners.items()}, args.concurrency)
+
+
+def _cmd_restore(args: argparse.Namespace) -> int:
+    chain, plan = _load_plan(args.archives)
+    headers = {"x-enkidu-skip-embeddings": "1", "x-enkidu-restore": "1"}
+    if os.environ.get("ENKIDU_ALLOW_SECRETS", "").strip() == "1":
+        headers["x-enkidu-allow-secrets"] = "1"
+    base_url, client = _client(args, headers)
+    if chain[0].base_url and chain[0].base_url != base_url:
+        print(f"Restoring pages from {chain[0].base_url} into {base_url}.")
+    started = time.perf_counter()
+    failed: dict[str, str] = {}
+
+    def _upload(pages: Iterator[dict[str, Any]]) -> None:
+        chunks = batched_by_size(
+            pages,
+            lambda p: len(encode_json(p)),
+            max_bytes=int(args.chunk_mb * 1024 * 1024),
+            max_items=MAX_BULK_PAGES,
+        )
+        sent: dict[int, list[str]] = {}
+
+        def _tracked() -> Iterator[list[dict[str, Any]]]:
+            for i, chunk in enumerate(chunks, start=1):
+                sent[i] = [p["id"] for p in chunk]
+                yield chunk
+
+        written, next_report = 0, time.monotonic() + 5
+        # Bisected on failure: a page the server refuses doesn't keep the rest of its chunk out.
+        for r in upload_chunks_iter(client, _tracked(), concurrency=args.concurrency, bisect=True):
+            ids = sent.pop(r.index)
+            lost = r.failed_positions()
+            for i, pid in enumerate(ids):
+                if i in lost:
+                    failed[pid] = lost[i]
+                else:
+                    failed.pop(pid, None)
+            written += len(ids)
+            if time.monotonic() >= next_report:
+                print(f"  {written} pages sent...")
+                next_report = time.monotonic() + 5
+
+    with client:
+        # Pass 1 without links (next_page_id references a page that may not exist yet), pass 2 adds them.
+        print(f"Restoring {len(plan)} pages to {base_url}...")
+        _upload({**p, "next_page_id": None} for p in iter_restore_pages(plan))
+        if plan.linked:
+            print(f"Linking {plan.linked} threaded pages...")
+            _upload(iter_restore_pages(plan, linked_only=True))
+        print(f"Wrote {len(plan) - len(failed)} pages in {time.perf_counter() - started:.1f}s.")
+        if failed:
+            print(
+                f"ERROR: {len(failed)} pages could not be written, e.g.:\n"
+                + "\n".join(f"- {pid}: {err[:200]}" for pid, err in list(failed.items())[:5]),
+                file=sys.stderr,
+            )
+            if any("possible secret detected" in err for err in failed.values()):
+                print(
+                    "Pages refused as possible secrets can be restored with ENKIDU_ALLOW_SECRETS=1.", file=sys.stderr
+                )
+
+        code = 0
+        if not args.no_verify:
+            code = _report_verify(client, {k: v[2] for k, v in plan.winners.items()}, args.concurrency)
+
+        if args.backfill_embeddings:
+            ids = [pid for pid in plan.winners if pid not in failed]
+            print(f"Backfilling embeddings for {len(ids)} pages...")
+            bf = backfill_embeddings(client, ids, max_concurrency=args.concurrency, force=True)
+            print(f"Embedded {bf.embedded} pages in {bf.seconds:.0f}s.")
+            if bf.failed:
+                print(f"WARNING: {len(bf.failed)} pages could not be embedded (the background cron will retry them).", file=sys.stderr)
+    return 2 if failed else code
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Back up, restore and verify Enkidu pages (compressed NDJSON archives).")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--concurrency", type=int, default=4, help="Parallel requests (and export shards). Default: 4.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    pe = sub.add_parser("export", parents=[common], help="Write a full or incremental archive.")
+    dest = pe.add_mutually_exclusive_group(required=True)
+    dest.add_argument("--dir", type=Path, help="Backup directory: incremental on top of its newest archive, else full.")
+    dest.add_argument("--out", type=Path, help="Archive file to write (full unless --base is given).")
+    pe.add_argument("--full", action="store_true", help="With --dir: write a full archive even if there is a base.")
+    pe.add_argument("--base", type=Path, help="With --out: only pages updated since this archive.")
+    pe.add_argument("--page-size", type=int, default=500, help="Pages per request (max 500). Default: 500.")
+
+    for name, helptext in (
+        ("restore", "Write an archive (chain) back to the server, then verify it."),
+        ("verify", "Compare the server with an archive (chain) by page id and content hash."),
+    ):
+        sp = sub.add_parser(name, parents=[common], help=helptext)
+        sp.add_argument(
+            "archives",
+            nargs="+",
+            type=Path,
+            help="A backup directory (newest chain), or a full archive followed by its incrementals.",
+        )
+        if name == "restore":
+            sp.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024), help="Max MB per request.")
+            sp.add_argument("--no-verify", action="store_true", help="Skip the read-back check.")
+            sp.add_argument("--backfill-embeddings", action="store_true", help="Recompute embeddings of restored pages.")
+
+    args = p.parse_args()
+    if args.cmd == "export" and args.base and not args.out:
+        p.error("--base needs --out")
+
+    # Load repo `.env` so this script can be run without manually exporting vars every time.
+    load_repo_dotenv()
+
+    try:
+        if args.cmd == "export":
+            return _cmd_export(args)
+        if args.cmd == "restore":
+            return _cmd_restore(args)
+        return _cmd_verify(args)
+    except (RuntimeError, ValueError, ApiError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
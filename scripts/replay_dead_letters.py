@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Replay a dead-letter file: send the pages an import could not write, on their own.
+
+What it does (minimal + targeted):
+- Reads the NDJSON dead-letter file an import wrote (e.g. `<your library>.bib.dead-letters.ndjson`): the exact
+  page bodies the server refused, with their page ids.
+- Upserts them through the bulk POST /api/pages path (chunks bisected again on failure).
+- Rewrites the file with only the pages that still fail (and their new error), or removes it when all went in.
+
+Use it once the cause is fixed on the server side (a deploy, a raised limit, an outage), or after editing a
+record in the file by hand. Entries fixed at the source are simply sent by the next import run instead.
+
+Requirements:
+- ENKIDU_BASE_URL + ENKIDU_ADMIN_TOKEN
+- Optional: ENKIDU_ALLOW_SECRETS="1" (passes x-enkidu-allow-secrets: 1)
+
+Usage (PowerShell):
+  python scripts/replay_dead_letters.py "C:/Users/Zoom/Zotero-cm/My Library.bib.dead-letters.ndjson"
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from _dead_letters import read_dead_letters, rewrite_dead_letters
+from _dotenv import load_repo_dotenv
+from _embedding_backfill import backfill_embeddings
+from _enkidu_api import DEFAULT_CHUNK_BYTES, MAX_BULK_PAGES, EnkiduClient, encode_json, upload_chunks_iter
+from _pipeline import batched_by_size
+
+
+def _env_required(name: str) -> str:
+    v = os.environ.get(name, "").strip()
+    if not v:
+        raise RuntimeError(f"Missing {name}")
+    return v
+
+
+def _replay(args: argparse.Namespace) -> int:
+    if not args.path.exists():
+        raise RuntimeError(f"No dead-letter file at {args.path}")
+    records = list(read_dead_letters(args.path))
+    if not records:
+        print(f"Nothing to replay in {args.path}.")
+        rewrite_dead_letters(args.path, [])
+        return 0
+    if any(not str(r["page"].get("id") or "").strip() for r in records):
+        raise RuntimeError("Every dead letter needs its page id (resending pages without one would duplicate them).")
+
+    base_url = _env_required("ENKIDU_BASE_URL").rstrip("/")
+    headers = {"authorization": f"Bearer {_env_required('ENKIDU_ADMIN_TOKEN')}", "x-enkidu-skip-embeddings": "1"}
+    if os.environ.get("ENKIDU_ALLOW_SECRETS", "").strip() == "1":
+        headers["x-enkidu-allow-secrets"] = "1"
+
+    print(f"Replaying {len(records)} pages from {args.path} to {base_url}...")
+    started = time.perf_counter()
+    chunks = list(
+        batched_by_size(
+            records,
+            lambda r: len(encode_json(r["page"])) + 1,
+            max_bytes=int(args.chunk_mb * 1024 * 1024),
+            max_items=MAX_BULK_PAGES,
+        )
+    )
+    still_failing: list[dict[str, Any]] = []
+    written: list[str] = []
+    with EnkiduClient(base_url, headers=headers, pool_size=max(1, args.concurrency)) as client:
+        bodies = ([r["page"] for r in chunk] for chunk in chunks)
+        for r in upload_chunks_iter(client, bodies, concurrency=args.concurrency, bisect=True):
+            chunk = chunks[r.index - 1]
+            lost = r.failed_positions()
+            for i, rec in enumerate(chunk):
+                if i in lost:
+                    still_failing.append({**rec, "error": lost[i]})
+                else:
+                    written.append(str(rec["page"]["id"]))
+
+        rewrite_dead_letters(args.path, still_failing)
+        print(f"Wrote {len(written)} of {len(records)} pages in {time.perf_counter() - started:.1f}s.")
+
+        if args.backfill_embeddings and written:
+            print(f"Backfilling embeddings for {len(written)} pages...")
+            bf = backfill_embeddings(client, written, max_concurrency=args.concurrency, force=True)
+            print(f"Embedded {bf.embedded} pages in {bf.seconds:.0f}s.")
+            if bf.failed:
+                print(f"WARNING: {len(bf.failed)} pages could not be embedded (the background cron will retry them).", file=sys.stderr)
+
+    if still_failing:
+        print(
+            f"ERROR: {len(still_failing)} pages still fail (kept in {args.path}), e.g.:\n"
+            + "\n".join(f"- {r.get('key') or r['page']['id']}: {r['error'][:200]}" for r in still_failing[:5]),
+            file=sys.stderr,
+        )
+        return 1
+    print(f"All pages written; removed {args.path}.")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Send the pages of an import's dead-letter file again.")
+    p.add_argument("path", type=Path, help="Dead-letter NDJSON file (e.g. <bib_path>.dead-letters.ndjson).")
+    p.add_argument("--concurrency", type=int, default=4, help="Requests in flight. Default: 4.")
+    p.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024), help="Max MB per request.")
+    p.add_argument("--backfill-embeddings", action="store_true", help="Embed the written pages straight away.")
+    args = p.parse_args()
+
+    # Load repo `.env` so this script can be run without manually exporting vars every time.
+    load_repo_dotenv()
+
+    try:
+        return _replay(args)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
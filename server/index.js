@@ -57,6 +57,8 @@ function toNetlifyEvent(req) {
   // Netlify function `event` shape subset used in this repo.
   const headers = {};
   for (const [k, v] of Object.entries(req.headers || {})) headers[String(k).toLowerCase()] = String(v);
+  // express.text() has already inflated gzip/deflate bodies; the handler sees plain text.
+  delete headers["content-encoding"];
 
   const queryStringParameters = {};
   for (const [k, v] of Object.entries(req.query || {})) {
@@ -185,22 +187,28 @@ app.get("/healthz", (_req, res) => res.status(200).type("text/plain").send("ok")
 // Wire existing handlers.
 const chat = require("../netlify/functions/chat").handler;
 const pages = require("../netlify/functions/pages").handler;
+const pagesDiff = require("../netlify/functions/pages-diff").handler;
+const pagesExport = require("../netlify/functions/pages-export").handler;
 const page = require("../netlify/functions/page").handler;
 const tags = require("../netlify/functions/tags").handler;
 const threads = require("../netlify/functions/threads").handler;
 const dream = require("../netlify/functions/dream").handler;
 const backfillEmbeddings = require("../netlify/functions/backfill-embeddings").handler;
 const embeddingsStatus = require("../netlify/functions/embeddings-status").handler;
+const embeddings = require("../netlify/functions/embeddings").handler;
 const runTaskBackground = require("../netlify/functions/run-task-background").handler;
 
 app.all("/api/chat", (req, res) => runNetlifyHandler(chat, req, res));
 app.all("/api/pages", (req, res) => runNetlifyHandler(pages, req, res));
+app.all("/api/pages-diff", (req, res) => runNetlifyHandler(pagesDiff, req, res));
+app.all("/api/pages-export", (req, res) => runNetlifyHandler(pagesExport, req, res));
 app.all("/api/page", (req, res) => runNetlifyHandler(page, req, res));
 app.all("/api/tags", (req, res) => runNetlifyHandler(tags, req, res));
 app.all("/api/threads", (req, res) => runNetlifyHandler(threads, req, res));
 app.all("/api/dream", (req, res) => runNetlifyHandler(dream, req, res));
 app.all("/api/backfill-embeddings", (req, res) => runNetlifyHandler(backfillEmbeddings, req, res));
 app.all("/api/embeddings-status", (req, res) => runNetlifyHandler(embeddingsStatus, req, res));
+app.all("/api/embeddings", (req, res) => runNetlifyHandler(embeddings, req, res));
 app.all("/api/run-task-background", (req, res) => runNetlifyHandler(runTaskBackground, req, res));
 
 // -------------------------
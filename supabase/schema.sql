@@ -40,7 +40,8 @@ alter table public.pages add column if not exists embedding vector(768);
 alter table public.pages add column if not exists embedding_model text;
 alter table public.pages add column if not exists embedding_updated_at timestamptz;
 
--- Keep updated_at fresh on updates
+-- Keep updated_at fresh on content updates. Embedding writes (cron, /api/backfill-embeddings) leave it alone:
+-- the import fingerprint, the incremental exports and the search index all read updated_at as "content changed".
 create or replace function public.set_updated_at()
 returns trigger
 language plpgsql
@@ -53,12 +54,20 @@ $$;
 
 drop trigger if exists trg_pages_set_updated_at on public.pages;
 create trigger trg_pages_set_updated_at
-before update on public.pages
+before update of title, content_md, tags, kv_tags, thread_id, next_page_id on public.pages
 for each row
+when (
+  (old.title, old.content_md, old.tags, old.kv_tags, old.thread_id, old.next_page_id)
+  is distinct from (new.title, new.content_md, new.tags, new.kv_tags, new.thread_id, new.next_page_id)
+)
 execute function public.set_updated_at();
 
 -- Minimal indexes for speed (keep it small)
 create index if not exists pages_created_at_idx on public.pages (created_at desc);
+create index if not exists pages_updated_at_idx on public.pages (updated_at desc);
+-- Incremental embedding export (GET /api/embeddings?since=...): keyset on (embedding_updated_at, id).
+create index if not exists pages_embedding_updated_at_idx
+on public.pages (embedding_updated_at, id) where embedding is not null;
 create index if not exists pages_thread_created_at_idx on public.pages (thread_id, created_at desc);
 create index if not exists pages_tags_gin_idx on public.pages using gin (tags);
 create index if not exists pages_kv_tags_gin_idx on public.pages using gin (kv_tags);
@@ -106,3 +115,47 @@ as $$
 $$;
 
 
+-- Hash diff for import scripts (POST /api/pages-diff).
+-- Given [{key, hash, id?}] for one source (`source` = {"kv_key": kv_value}), return only the keys whose newest
+-- page is missing, carries another hash or another id, or that more than one page shares (copies > 1).
+-- Each key is one kv_tags containment lookup (pages_kv_tags_gin_idx), so cost follows the batch, not the table.
+create or replace function public.diff_page_hashes(
+  source jsonb,
+  key_field text,
+  hash_field text,
+  items jsonb
+)
+returns table (
+  key text,
+  id uuid,
+  hash text,
+  copies int
+)
+language sql
+stable
+as $$
+  select w.key, p.id, p.hash, coalesce(p.copies, 0)::int
+  from (
+    select distinct on (i->>'key')
+      i->>'key' as key,
+      coalesce(i->>'hash', '') as hash,
+      nullif(i->>'id', '') as want_id
+    from jsonb_array_elements(items) i
+    where coalesce(i->>'key', '') <> ''
+  ) w
+  left join lateral (
+    select
+      x.id,
+      coalesce(x.kv_tags->>hash_field, '') as hash,
+      count(*) over () as copies
+    from public.pages x
+    where x.kv_tags @> (source || jsonb_build_object(key_field, w.key))
+    order by x.created_at desc, x.id desc
+    limit 1
+  ) p on true
+  where p.id is null
+    or p.hash <> w.hash
+    or p.id::text <> coalesce(w.want_id, p.id::text)
+    or p.copies > 1;
+$$;
+